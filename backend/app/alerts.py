@@ -0,0 +1,320 @@
+# app/alerts.py
+"""
+Streaming alert engine.
+
+Alerts are declared like health rules (DEFAULT_ALERTS below, or a JSON list
+pointed to by KONPANION_ALERT_RULES_FILE) and evaluated per device as samples
+arrive; a periodic tick handles the time-based parts.
+
+Kinds:
+  threshold  field <op> value; `clear` gives hysteresis (raise below 10 %,
+             clear only at/above 15 %)
+  absence    no sample for `timeout_s` (hub receive time)
+  fall       fall_event with fall_confidence >= min_confidence; clears
+             `auto_clear_s` after the last fall, or (auto_clear_s null) when
+             acknowledged
+
+After an alert clears it cannot re-raise for `cooldown_s`, so a value
+hovering around a level doesn't flap. Only transitions (raised / cleared /
+acknowledged) are emitted; each gets an engine-wide seq and is kept in a
+bounded log so clients can ask for everything after the last seq they saw.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Deque, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter, model_validator
+
+from .series import FIELD_RE, field_getter
+from .thresholds import OPS, check_format, check_hysteresis
+
+log = logging.getLogger(__name__)
+
+RAISED = "raised"
+CLEARED = "cleared"
+ACKNOWLEDGED = "acknowledged"
+
+
+# placeholders each kind's message gets (example values, used to validate specs)
+_MESSAGE_ARGS = {
+    "threshold": {"value": 0.0},
+    "absence": {"timeout_s": 0.0},
+    "fall": {"confidence": 0.0},
+}
+
+
+class AlertSpec(BaseModel):
+    id: str
+    kind: Literal["threshold", "absence", "fall"]
+    message: str                    # str.format() with {value} / {timeout_s} / {confidence}
+    severity: Literal["info", "warning", "critical"] = "warning"
+    device_types: List[str] = []    # empty = all device types
+    cooldown_s: float = 60.0
+
+    # threshold
+    field: Optional[str] = None
+    op: Literal["<", "<=", ">", ">="] = "<"
+    value: Optional[float] = None
+    clear: Optional[float] = None
+
+    # absence
+    timeout_s: float = 30.0
+
+    # fall
+    min_confidence: float = 0.0
+    auto_clear_s: Optional[float] = 300.0
+
+    @model_validator(mode="after")
+    def _check_kind(self) -> "AlertSpec":
+        # fail when alerts are loaded, not inside observe() on every sample
+        if self.kind == "threshold":
+            if self.field is None or self.value is None:
+                raise ValueError(f"alert {self.id!r}: threshold alerts need 'field' and 'value'")
+            if not FIELD_RE.match(self.field):
+                raise ValueError(f"alert {self.id!r}: invalid field path {self.field!r}")
+            check_hysteresis(f"alert {self.id!r}", self.op, self.value, self.clear)
+        check_format(self.message, **_MESSAGE_ARGS[self.kind])
+        return self
+
+
+DEFAULT_ALERTS: List[dict] = [
+    {
+        "id": "battery_critical", "kind": "threshold", "field": "battery_pct",
+        "op": "<", "value": 10, "clear": 15, "severity": "critical",
+        "message": "Battery critical ({value:.0f}%).",
+    },
+    {
+        "id": "offline", "kind": "absence", "timeout_s": 30,
+        "message": "No telemetry for {timeout_s:.0f} s.",
+    },
+    {
+        "id": "fall", "kind": "fall", "device_types": ["NOOH"], "min_confidence": 0.6,
+        "severity": "critical", "cooldown_s": 0,
+        "message": "Fall detected (confidence {confidence:.2f}).",
+    },
+]
+
+
+@dataclass
+class Alert:
+    id: str                 # "<device_id>:<rule>"
+    device_id: str
+    device_type: str
+    rule: str
+    severity: str
+    message: str
+    state: str              # raised | acknowledged
+    raised_at: float
+    acked_at: Optional[float] = None
+    acked_by: Optional[str] = None
+
+
+@dataclass
+class _RuleState:
+    active: Optional[Alert] = None
+    cleared_at: float = float("-inf")
+    suppressed: int = 0
+    last_fall_at: float = 0.0
+
+
+class AlertEngine:
+    def __init__(self, specs: List[AlertSpec], log_size: int = 500):
+        self.specs = specs
+        self._specs = {s.id: s for s in specs}
+        self._getters = {s.id: field_getter(s.field) for s in specs if s.kind == "threshold" and s.field}
+        self._state: Dict[Tuple[str, str], _RuleState] = {}
+        self._seen: Dict[str, Tuple[str, float]] = {}     # device_id -> (device_type, hub receive time)
+        self.active: Dict[str, Alert] = {}
+        self.seq = 0
+        self.log: Deque[dict] = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+
+    def _applies(self, spec: AlertSpec, device_type: str) -> bool:
+        return not spec.device_types or device_type in spec.device_types
+
+    def _st(self, device_id: str, rule: str) -> _RuleState:
+        st = self._state.get((device_id, rule))
+        if st is None:
+            st = self._state[(device_id, rule)] = _RuleState()
+        return st
+
+    def _emit(self, transition: str, alert: Alert, now: float) -> dict:
+        self.seq += 1
+        evt = {"type": "alert", "seq": self.seq, "transition": transition, "ts": now, "alert": asdict(alert)}
+        self.log.append(evt)
+        return evt
+
+    def _raise(self, spec: AlertSpec, st: _RuleState, device_id: str, device_type: str,
+               message: str, now: float, out: List[dict]) -> None:
+        if st.active is not None:
+            return
+        if now - st.cleared_at < spec.cooldown_s:
+            st.suppressed += 1
+            return
+        alert = Alert(
+            id=f"{device_id}:{spec.id}", device_id=device_id, device_type=device_type, rule=spec.id,
+            severity=spec.severity, message=message, state=RAISED, raised_at=now,
+        )
+        st.active = self.active[alert.id] = alert
+        out.append(self._emit(RAISED, alert, now))
+
+    def _clear(self, st: _RuleState, now: float, out: List[dict]) -> None:
+        alert = st.active
+        if alert is None:
+            return
+        st.active = None
+        st.cleared_at = now
+        self.active.pop(alert.id, None)
+        out.append(self._emit(CLEARED, alert, now))
+
+    def observe(self, device_id: str, device_type: str, sample: dict, now: Optional[float] = None) -> List[dict]:
+        """Feed one accepted sample; returns the transitions it caused (usually none)."""
+        now = time.time() if now is None else now
+        out: List[dict] = []
+        with self._lock:
+            self._seen[device_id] = (device_type, now)
+            for spec in self.specs:
+                if not self._applies(spec, device_type):
+                    continue
+                if spec.kind == "absence":
+                    st = self._state.get((device_id, spec.id))
+                    if st is not None:
+                        self._clear(st, now, out)
+                elif spec.kind == "threshold":
+                    v = self._getters[spec.id](sample)
+                    if not isinstance(v, (int, float)):
+                        continue
+                    st = self._st(device_id, spec.id)
+                    raise_if = OPS[spec.op]
+                    if st.active is None:
+                        if raise_if(v, spec.value):
+                            self._raise(spec, st, device_id, device_type, spec.message.format(value=v), now, out)
+                    elif not raise_if(v, spec.clear if spec.clear is not None else spec.value):
+                        self._clear(st, now, out)
+                elif spec.kind == "fall":
+                    conf = sample.get("fall_confidence")
+                    if sample.get("fall_event") and (conf is None or conf >= spec.min_confidence):
+                        st = self._st(device_id, spec.id)
+                        st.last_fall_at = now
+                        msg = spec.message.format(confidence=conf if conf is not None else 1.0)
+                        self._raise(spec, st, device_id, device_type, msg, now, out)
+        return out
+
+    def tick(self, now: Optional[float] = None) -> List[dict]:
+        """Time-based transitions: absence raises and fall auto-clears."""
+        now = time.time() if now is None else now
+        out: List[dict] = []
+        with self._lock:
+            for spec in self.specs:
+                if spec.kind == "absence":
+                    for device_id, (device_type, seen) in self._seen.items():
+                        if self._applies(spec, device_type) and now - seen >= spec.timeout_s:
+                            st = self._st(device_id, spec.id)
+                            msg = spec.message.format(timeout_s=spec.timeout_s)
+                            self._raise(spec, st, device_id, device_type, msg, now, out)
+                elif spec.kind == "fall" and spec.auto_clear_s is not None:
+                    for (device_id, rule), st in self._state.items():
+                        if rule == spec.id and st.active is not None and now - st.last_fall_at >= spec.auto_clear_s:
+                            self._clear(st, now, out)
+        return out
+
+    def acknowledge(self, alert_id: str, user: Optional[str], now: Optional[float] = None) -> List[dict]:
+        """
+        Mark an active alert acknowledged; returns the transitions (none if it
+        was already acked). KeyError if it isn't active. Alerts that only end
+        by acknowledgement (fall with auto_clear_s null) are cleared as well.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            alert = self.active[alert_id]
+            if alert.state == ACKNOWLEDGED:
+                return []
+            alert.state = ACKNOWLEDGED
+            alert.acked_at = now
+            alert.acked_by = user
+            out = [self._emit(ACKNOWLEDGED, alert, now)]
+            spec = self._specs.get(alert.rule)
+            if spec is not None and spec.kind == "fall" and spec.auto_clear_s is None:
+                self._clear(self._st(alert.device_id, alert.rule), now, out)
+            return out
+
+    def since(self, seq: int) -> Optional[List[dict]]:
+        """Transitions after `seq`, or None if some were already evicted from the log (resync)."""
+        with self._lock:
+            if seq >= self.seq:
+                return []
+            if not self.log or self.log[0]["seq"] > seq + 1:
+                return None
+            return [e for e in self.log if e["seq"] > seq]
+
+    def state(self) -> dict:
+        with self._lock:
+            return {"seq": self.seq, "active": [asdict(a) for a in self.active.values()]}
+
+    def export_state(self) -> dict:
+        """
+        Active alerts, per-rule cooldown/fall state and last-seen times, for
+        checkpoints. The transition log is not kept: clients resync from state().
+        """
+        with self._lock:
+            return {
+                "seq": self.seq,
+                "rules": [
+                    {"device_id": d, "rule": r, **asdict(st)}
+                    for (d, r), st in self._state.items()
+                ],
+                "seen": dict(self._seen),
+            }
+
+    def restore_state(self, state: dict) -> None:
+        with self._lock:
+            self.seq = state.get("seq", 0)
+            self.log.clear()
+            self._state, self.active = {}, {}
+            for x in state.get("rules", []):
+                x = dict(x)
+                key = (x.pop("device_id"), x.pop("rule"))
+                if key[1] not in self._specs:
+                    continue    # rule removed since the checkpoint
+                active = x.pop("active")
+                st = self._state[key] = _RuleState(**x)
+                if active is not None:
+                    st.active = self.active[active["id"]] = Alert(**active)
+            self._seen = {k: tuple(v) for k, v in state.get("seen", {}).items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": len(self.active),
+                "transitions": self.seq,
+                "suppressed": sum(st.suppressed for st in self._state.values()),
+            }
+
+
+def load_alerts(path: str = "") -> List[AlertSpec]:
+    raw = json.loads(Path(path).read_text(encoding="utf-8")) if path else DEFAULT_ALERTS
+    return TypeAdapter(List[AlertSpec]).validate_python(raw)
+
+
+async def alert_loop(interval_s: float) -> None:
+    from .state import alert_engine, change_feed, ws_broker
+
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            transitions = alert_engine.tick()
+        except Exception:
+            log.exception("Alert tick failed")
+            continue
+        for t in transitions:
+            await ws_broker.broadcast(t)
+        if transitions:
+            change_feed.notify()
@@ -1,4 +1,6 @@
 from __future__ import annotations
+import hmac
+from typing import Any
 from fastapi import Request
 from fastapi.responses import RedirectResponse
 from itsdangerous import URLSafeSerializer, BadSignature
@@ -25,5 +27,13 @@ def require_auth(request: Request) -> str | None:
     token = request.cookies.get(COOKIE_NAME)
     return read_session(token)
 
+def ingest_token_ok(token: Any) -> bool:
+    """Device ingest token check (constant time); always true when no token is configured."""
+    if not settings.ingest_token:
+        return True
+    if not isinstance(token, str):
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.ingest_token.encode("utf-8"))
+
 def redirect_to_login():
     return RedirectResponse(url="/login", status_code=302)
@@ -0,0 +1,177 @@
+# app/checkpoint.py
+"""
+Warm-restart checkpoints of in-memory hub state.
+
+File layout (little-endian):
+    header  = magic(8s) version(H) flags(H) created(d) payload_len(Q) crc32(I)
+    payload = pickle (protocol 5) of plain dicts/lists + datetimes
+
+The file is written to a temp path and atomically renamed, so a crash mid-write
+never leaves a torn snapshot. Loading memory-maps the file and unpickles straight
+out of the mapping (no intermediate read() copy).
+
+What a warm restart keeps:
+  - device status (issues included; health rules re-check them on the next
+    sample) and buffered telemetry; compressed history is saved as the
+    encoded blocks, never decoded for a checkpoint
+  - the last event, the discovered-device registry
+  - ingest replay windows and per-device admission counters, so retries of
+    samples accepted before the restart are still dropped as duplicates
+  - today's event/byte counters and the recent-event log
+  - active alerts, per-rule cooldown/fall state and last-seen times
+    (absence alerts keep counting across the restart), the alert seq
+  - per-device clock offset/drift models
+
+What it doesn't: rate-limit token buckets (start full), events/sec windows,
+ring-buffer late/duplicate counters, the alert transition log (clients
+resync from the active set), the change-feed seq (a new epoch, so SSE
+clients get a fresh snapshot), query caches and tracing/profiling stats.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as _dt
+import logging
+import mmap
+import os
+import pickle
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic_core import TzInfo
+
+from .compression import _slot
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"KHUBSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sHHdQI")
+
+# Only these globals may appear in a checkpoint payload.
+_ALLOWED_GLOBALS = {
+    ("datetime", "datetime"): _dt.datetime,
+    ("datetime", "timezone"): _dt.timezone,
+    ("datetime", "timedelta"): _dt.timedelta,
+    # pydantic parses "...Z" timestamps into its own tzinfo type
+    ("pydantic_core._pydantic_core", "TzInfo"): TzInfo,
+    # compressed blocks: template placeholders, and `float` as the tz of epoch-second timestamps
+    (_slot.__module__, "_slot"): _slot,
+    ("builtins", "float"): float,
+}
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> Any:
+        try:
+            return _ALLOWED_GLOBALS[(module, name)]
+        except KeyError:
+            raise CheckpointError(f"Disallowed global in checkpoint: {module}.{name}")
+
+
+def write_checkpoint(path: str, state: dict) -> int:
+    """Serialize `state` to `path` atomically. Returns bytes written."""
+    payload = pickle.dumps(state, protocol=5)
+    header = HEADER.pack(MAGIC, VERSION, 0, time.time(), len(payload), zlib.crc32(payload))
+
+    p = Path(path)
+    tmp = p.with_name(p.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+    return HEADER.size + len(payload)
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    """Load a checkpoint via mmap. Returns None if the file doesn't exist."""
+    p = Path(path)
+    if not p.exists() or p.stat().st_size < HEADER.size:
+        return None
+
+    with open(p, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, version, _flags, _created, length, crc = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise CheckpointError(f"Unsupported checkpoint format ({magic!r} v{version})")
+        if HEADER.size + length > len(mm):
+            raise CheckpointError("Truncated checkpoint")
+
+        view = memoryview(mm)[HEADER.size:HEADER.size + length]
+        try:
+            if zlib.crc32(view) != crc:
+                raise CheckpointError("Checkpoint CRC mismatch")
+        finally:
+            view.release()
+
+        mm.seek(HEADER.size)
+        return _SafeUnpickler(mm).load()
+
+
+def collect_state() -> dict:
+    """Gather every piece of in-memory state that should survive a restart."""
+    from .state import store, ingest_guard, alert_engine, clocks
+    from .device_registry import registry
+
+    return {
+        "store": store.export_state(),
+        "registry": registry.export_state(),
+        "ingest_guard": ingest_guard.export_state(),
+        "alerts": alert_engine.export_state(),
+        "clocks": clocks.export_state(),
+    }
+
+
+def apply_state(state: dict) -> None:
+    from .state import store, ingest_guard, alert_engine, clocks
+    from .device_registry import registry
+
+    hub_state = state.get("store") or {}
+    if hub_state.get("hub_id") != store.hub_id:
+        log.warning("Checkpoint belongs to hub %r, not %r; ignoring", hub_state.get("hub_id"), store.hub_id)
+        return
+    store.restore_state(hub_state)
+    registry.restore_state(state.get("registry") or [])
+    # absent in checkpoints from older versions
+    ingest_guard.restore_state(state.get("ingest_guard") or {})
+    alert_engine.restore_state(state.get("alerts") or {})
+    clocks.restore_state(state.get("clocks") or {})
+
+
+def restore(path: str) -> bool:
+    """Restore state on startup. Never raises: a bad checkpoint means a cold start."""
+    t0 = time.perf_counter()
+    try:
+        state = read_checkpoint(path)
+        if state is None:
+            return False
+        apply_state(state)
+    except Exception:
+        log.exception("Failed to restore checkpoint %s; starting cold", path)
+        return False
+    log.info("Restored checkpoint %s in %.1f ms", path, (time.perf_counter() - t0) * 1000)
+    return True
+
+
+async def save(path: str) -> None:
+    # collect on the event loop (consistent view; only copies references, nothing
+    # is decoded or serialized here), pickle and write from a worker thread
+    state = collect_state()
+    await asyncio.to_thread(write_checkpoint, path, state)
+
+
+async def checkpoint_loop(path: str, interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await save(path)
+        except Exception:
+            log.exception("Periodic checkpoint failed")
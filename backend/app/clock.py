@@ -0,0 +1,135 @@
+# app/clock.py
+"""
+Per-device clock offset/drift, estimated from hub receive times.
+
+For every accepted sample the hub sees (device ts, hub receive time). The
+difference hub - device is modelled as offset + drift * device_time and fitted
+by an exponentially time-weighted least-squares regression (time constant
+`tau_s` of device time), so the fit follows slow changes (temperature, NTP
+steps on the hub) without storing samples. Transport and batching latency
+are part of the offset; what matters for lining streams up is that it is
+the same correction for every sample of the device.
+
+A batch (WebSocket/UDP, or a device catching up after an outage) delivers
+many device timestamps at one hub instant, which would read as a steep
+drift. So each device contributes at most one point per `min_interval_s` of
+hub time, and only when its device time moved forward.
+
+Timestamps are centered on the first sample seen to keep the sums well
+conditioned; drift is clamped to MAX_DRIFT so a short, jittery fit can't
+stretch a series.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAX_DRIFT = 1e-3   # 1000 ppm; real crystals are within ~100 ppm
+
+
+class ClockModel:
+    __slots__ = ("tau_s", "min_interval_s", "x0", "last_x", "last_hub", "n", "w", "sx", "sy", "sxx", "sxy")
+
+    def __init__(self, tau_s: float, min_interval_s: float = 0.5):
+        self.tau_s = tau_s
+        self.min_interval_s = min_interval_s
+        self.x0: Optional[float] = None
+        self.last_x = 0.0
+        self.last_hub = float("-inf")
+        self.n = 0
+        self.w = self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def observe(self, device_ts: float, hub_ts: float) -> bool:
+        """Add a point; returns False if it was skipped (too soon / not newer)."""
+        if self.x0 is None:
+            self.x0 = device_ts
+        x = device_ts - self.x0
+        if hub_ts - self.last_hub < self.min_interval_s or (self.n and x <= self.last_x):
+            return False
+        self.last_hub = hub_ts
+        y = hub_ts - device_ts
+        if x > self.last_x:
+            decay = math.exp(-(x - self.last_x) / self.tau_s)
+            self.w *= decay
+            self.sx *= decay
+            self.sy *= decay
+            self.sxx *= decay
+            self.sxy *= decay
+            self.last_x = x
+        self.n += 1
+        self.w += 1.0
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+        return True
+
+    def fit(self) -> tuple:
+        """(offset at the weighted mean device time, drift s/s, weighted mean device time)."""
+        if self.w <= 0:
+            return 0.0, 0.0, 0.0
+        mx, my = self.sx / self.w, self.sy / self.w
+        var = self.sxx / self.w - mx * mx
+        drift = 0.0
+        if var > 1.0:  # need at least ~a second of spread before trusting a slope
+            drift = (self.sxy / self.w - mx * my) / var
+            drift = max(-MAX_DRIFT, min(MAX_DRIFT, drift))
+        return my, drift, mx
+
+    def correction(self, device_ts: np.ndarray) -> np.ndarray:
+        """Seconds to add to device timestamps to put them on the hub clock."""
+        my, drift, mx = self.fit()
+        return my + drift * ((device_ts - self.x0) - mx)
+
+
+class ClockTracker:
+    def __init__(self, tau_s: float = 600.0):
+        self.tau_s = tau_s
+        self._models: Dict[str, ClockModel] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, device_id: str, device_ts: float, hub_ts: float) -> None:
+        with self._lock:
+            m = self._models.get(device_id)
+            if m is None:
+                m = self._models[device_id] = ClockModel(self.tau_s)
+            m.observe(device_ts, hub_ts)
+
+    def to_hub(self, device_id: str, device_ts: np.ndarray) -> np.ndarray:
+        """Map device timestamps onto the hub clock (unchanged if the device is unknown)."""
+        with self._lock:
+            m = self._models.get(device_id)
+            if m is None or m.n == 0:
+                return device_ts
+            return device_ts + m.correction(device_ts)
+
+    def export_state(self) -> Dict[str, dict]:
+        with self._lock:
+            return {k: {a: getattr(m, a) for a in ClockModel.__slots__} for k, m in self._models.items()}
+
+    def restore_state(self, state: Dict[str, dict]) -> None:
+        models = {}
+        for device_id, fields in state.items():
+            m = models[device_id] = ClockModel(self.tau_s)
+            for a in ClockModel.__slots__:
+                if a not in ("tau_s", "min_interval_s"):
+                    setattr(m, a, fields[a])
+        with self._lock:
+            self._models = models
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for device_id, m in self._models.items():
+                my, drift, mx = m.fit()
+                out[device_id] = {
+                    "samples": m.n,
+                    # offset extrapolated to the newest sample
+                    "offset_ms": round(1000 * (my + drift * (m.last_x - mx)), 3),
+                    "drift_ppm": round(drift * 1e6, 3),
+                }
+            return out
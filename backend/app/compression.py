@@ -0,0 +1,467 @@
+# app/compression.py
+"""
+Compressed telemetry series (Gorilla-style).
+
+Samples are buffered uncompressed in a small time-ordered head (a RingBuffer,
+so reordering works exactly as for uncompressed buffers). Once samples are
+older than the reorder window they can no longer change, and are sealed into
+immutable blocks:
+
+  - timestamps: microseconds, delta-of-delta with variable-width buckets
+  - numeric leaves (floats, ints, bools): XOR against the previous value,
+    storing only the meaningful bits
+  - everything else (ids, fw_version, None, list lengths): a per-block
+    "template"; a change of template simply starts a new block
+
+Each column is its own bit stream, so reading decodes all columns in lockstep
+and yields one sample dict at a time without materialising the block.
+"""
+from __future__ import annotations
+
+import struct
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .store import RingBuffer, ts_epoch
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MASK64 = (1 << 64) - 1
+
+_f2i = struct.Struct("<d")
+_i2f = struct.Struct("<Q")
+
+
+def _float_bits(x: float) -> int:
+    return _i2f.unpack(_f2i.pack(x))[0]
+
+
+def _bits_float(b: int) -> float:
+    return _f2i.unpack(_i2f.pack(b))[0]
+
+
+# ---------------------------------------------------------------------
+# Bit streams
+# ---------------------------------------------------------------------
+class BitWriter:
+    __slots__ = ("_buf", "_acc", "_n")
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._acc = 0
+        self._n = 0
+
+    def write(self, value: int, nbits: int) -> None:
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self._n += nbits
+        if self._n >= 64:
+            extra = self._n & 7
+            nbytes = self._n >> 3
+            self._buf += (self._acc >> extra).to_bytes(nbytes, "big")
+            self._acc &= (1 << extra) - 1
+            self._n = extra
+
+    def getvalue(self) -> bytes:
+        if self._n:
+            pad = (8 - self._n % 8) % 8
+            tail = (self._acc << pad).to_bytes((self._n + pad) >> 3, "big")
+            return bytes(self._buf) + tail
+        return bytes(self._buf)
+
+
+class BitReader:
+    __slots__ = ("_data", "_pos")
+
+    def __init__(self, data: bytes):
+        # 8 bytes of padding so a 64-bit read near the end never runs short
+        self._data = data + b"\x00" * 9
+        self._pos = 0
+
+    def read(self, nbits: int) -> int:
+        pos = self._pos
+        byte, bit = pos >> 3, pos & 7
+        chunk = int.from_bytes(self._data[byte:byte + 9], "big")
+        self._pos = pos + nbits
+        return (chunk >> (72 - bit - nbits)) & ((1 << nbits) - 1)
+
+
+# ---------------------------------------------------------------------
+# Column codecs
+# ---------------------------------------------------------------------
+# delta-of-delta buckets for microsecond timestamps: (prefix, prefix_bits, value_bits)
+_DOD_BUCKETS = ((0b10, 2, 14), (0b110, 3, 20), (0b1110, 4, 32))
+
+
+class TimestampEncoder:
+    __slots__ = ("w", "_prev", "_delta", "_n")
+
+    def __init__(self):
+        self.w = BitWriter()
+        self._prev = 0
+        self._delta = 0
+        self._n = 0
+
+    def add(self, us: int) -> None:
+        w = self.w
+        if self._n == 0:
+            w.write(us & _MASK64, 64)
+        else:
+            delta = us - self._prev
+            dod = delta - self._delta
+            self._delta = delta
+            if dod == 0:
+                w.write(0, 1)
+            else:
+                for prefix, pbits, vbits in _DOD_BUCKETS:
+                    if -(1 << (vbits - 1)) <= dod < (1 << (vbits - 1)):
+                        w.write(prefix, pbits)
+                        w.write(dod, vbits)
+                        break
+                else:
+                    w.write(0b1111, 4)
+                    w.write(dod & _MASK64, 64)
+        self._prev = us
+        self._n += 1
+
+
+def _signed(v: int, bits: int) -> int:
+    return v - (1 << bits) if v >= (1 << (bits - 1)) else v
+
+
+def decode_timestamps(data: bytes, count: int) -> Iterator[int]:
+    r = BitReader(data)
+    if count <= 0:
+        return
+    prev = _signed(r.read(64), 64)
+    yield prev
+    delta = 0
+    for _ in range(count - 1):
+        if r.read(1) == 0:
+            dod = 0
+        elif r.read(1) == 0:
+            dod = _signed(r.read(14), 14)
+        elif r.read(1) == 0:
+            dod = _signed(r.read(20), 20)
+        elif r.read(1) == 0:
+            dod = _signed(r.read(32), 32)
+        else:
+            dod = _signed(r.read(64), 64)
+        delta += dod
+        prev += delta
+        yield prev
+
+
+class FloatEncoder:
+    __slots__ = ("w", "_prev", "_lead", "_trail", "_n")
+
+    def __init__(self):
+        self.w = BitWriter()
+        self._prev = 0
+        self._lead = -1
+        self._trail = 0
+        self._n = 0
+
+    def add(self, x: float) -> None:
+        w = self.w
+        bits = _float_bits(x)
+        if self._n == 0:
+            w.write(bits, 64)
+        else:
+            xor = bits ^ self._prev
+            if xor == 0:
+                w.write(0, 1)
+            else:
+                lead = min(64 - xor.bit_length(), 31)
+                trail = (xor & -xor).bit_length() - 1
+                if self._lead >= 0 and lead >= self._lead and trail >= self._trail:
+                    # fits in the previous meaningful-bit window
+                    w.write(0b10, 2)
+                    w.write(xor >> self._trail, 64 - self._lead - self._trail)
+                else:
+                    sig = 64 - lead - trail
+                    w.write(0b11, 2)
+                    w.write(lead, 5)
+                    w.write(sig - 1, 6)  # sig is 1..64
+                    w.write(xor >> trail, sig)
+                    self._lead, self._trail = lead, trail
+        self._prev = bits
+        self._n += 1
+
+
+def decode_floats(data: bytes, count: int) -> Iterator[float]:
+    r = BitReader(data)
+    if count <= 0:
+        return
+    prev = r.read(64)
+    yield _bits_float(prev)
+    lead = trail = 0
+    for _ in range(count - 1):
+        if r.read(1) == 1:
+            if r.read(1) == 1:
+                lead = r.read(5)
+                sig = r.read(6) + 1
+                trail = 64 - lead - sig
+            prev ^= r.read(64 - lead - trail) << trail
+        yield _bits_float(prev)
+
+
+# ---------------------------------------------------------------------
+# Sample <-> (template, numeric values)
+# ---------------------------------------------------------------------
+class _Slot:
+    __slots__ = ("kind",)
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def __repr__(self) -> str:
+        return f"<{self.kind}>"
+
+    def __reduce__(self):
+        # templates are checkpointed as they are; unpickle back to the singletons
+        return (_slot, (self.kind,))
+
+
+# singletons so that template equality is plain ==
+_FLOAT, _INT, _BOOL = _Slot("f"), _Slot("i"), _Slot("b")
+# keeps "ts" in its original key position; filled from the timestamp stream
+_TS = _Slot("ts")
+_SLOTS = {s.kind: s for s in (_FLOAT, _INT, _BOOL, _TS)}
+
+
+def _slot(kind: str) -> _Slot:
+    return _SLOTS[kind]
+
+
+def _split(x: Any, out: List[float]) -> Any:
+    if isinstance(x, bool):
+        out.append(1.0 if x else 0.0)
+        return _BOOL
+    if isinstance(x, int) and -(1 << 53) <= x <= (1 << 53):
+        out.append(float(x))
+        return _INT
+    if isinstance(x, float):
+        out.append(x)
+        return _FLOAT
+    if isinstance(x, dict):
+        return {k: _split(v, out) for k, v in x.items()}
+    if isinstance(x, list):
+        return [_split(v, out) for v in x]
+    return x
+
+
+def _fill(t: Any, it: Iterator[float]) -> Any:
+    if t is _FLOAT:
+        return next(it)
+    if t is _INT:
+        return int(next(it))
+    if t is _BOOL:
+        return next(it) != 0.0
+    if isinstance(t, dict):
+        return {k: _fill(v, it) for k, v in t.items()}
+    if isinstance(t, list):
+        return [_fill(v, it) for v in t]
+    return t
+
+
+def _ts_micros(ts: Any) -> Tuple[int, Any]:
+    if isinstance(ts, datetime):
+        tz = ts.tzinfo
+        aware = ts if tz is not None else ts.replace(tzinfo=timezone.utc)
+        return (aware - _EPOCH) // timedelta(microseconds=1), tz
+    return round(float(ts) * 1_000_000), float
+
+
+def _ts_value(us: int, tz: Any) -> Any:
+    if tz is float:
+        return us / 1_000_000
+    dt = _EPOCH + timedelta(microseconds=us)
+    return dt.replace(tzinfo=None) if tz is None else dt.astimezone(tz)
+
+
+@dataclass
+class SealedBlock:
+    count: int
+    t_first: float
+    t_last: float
+    template: Any
+    tz: Any
+    ts_data: bytes
+    columns: Tuple[bytes, ...]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.ts_data) + sum(len(c) for c in self.columns)
+
+    def as_tuple(self) -> tuple:
+        return (self.count, self.t_first, self.t_last, self.template, self.tz, self.ts_data, self.columns)
+
+    def __iter__(self) -> Iterator[dict]:
+        ts_it = decode_timestamps(self.ts_data, self.count)
+        col_its = [decode_floats(c, self.count) for c in self.columns]
+        for us in ts_it:
+            row = iter([next(c) for c in col_its])
+            x = _fill(self.template, row)
+            x["ts"] = _ts_value(us, self.tz)
+            yield x
+
+
+def _seal(samples: List[dict]) -> List[SealedBlock]:
+    """Encode time-ordered samples, starting a new block whenever the template changes."""
+    blocks: List[SealedBlock] = []
+    cur_key = None
+    ts_enc: Optional[TimestampEncoder] = None
+    encs: List[FloatEncoder] = []
+    count, t_first, t_last = 0, 0.0, 0.0
+
+    def flush():
+        if count:
+            blocks.append(SealedBlock(
+                count=count, t_first=t_first, t_last=t_last,
+                template=cur_key[0], tz=cur_key[1],
+                ts_data=ts_enc.w.getvalue(),
+                columns=tuple(e.w.getvalue() for e in encs),
+            ))
+
+    for x in samples:
+        values: List[float] = []
+        template = _split({**x, "ts": _TS}, values)
+        us, tz = _ts_micros(x["ts"])
+        key = (template, tz)
+        if cur_key is None or key != cur_key:
+            flush()
+            cur_key = key
+            ts_enc = TimestampEncoder()
+            encs = [FloatEncoder() for _ in values]
+            count, t_first = 0, us / 1_000_000
+        ts_enc.add(us)
+        for e, v in zip(encs, values):
+            e.add(v)
+        count += 1
+        t_last = us / 1_000_000
+    flush()
+    return blocks
+
+
+@dataclass
+class CompressedRingBuffer:
+    """
+    Drop-in alternative to RingBuffer that keeps older history in sealed,
+    compressed blocks. Capacity is enforced per whole block, so it may hold up
+    to one block more than `maxlen` samples.
+    """
+    maxlen: int
+    reorder_window_s: float = 5.0
+    block_size: int = 256
+    blocks: List[SealedBlock] = field(default_factory=list)
+    head: RingBuffer = field(init=False)
+    _sealed: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        self.head = RingBuffer(maxlen=self.maxlen, reorder_window_s=self.reorder_window_s)
+
+    # counters live on the head, where ordering decisions are made
+    @property
+    def late(self) -> int:
+        return self.head.late
+
+    @property
+    def duplicates(self) -> int:
+        return self.head.duplicates
+
+    def __len__(self) -> int:
+        return self._sealed + len(self.head)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.blocks)
+
+    def push(self, x: dict) -> bool:
+        if self.blocks and ts_epoch(x["ts"]) <= self.blocks[-1].t_last:
+            # older than anything still reorderable; RingBuffer would call it late
+            self.head.late += 1
+            return False
+        if not self.head.push(x):
+            return False
+
+        # samples older than the reorder window can't change any more -> seal them
+        cutoff = ts_epoch(x["ts"]) - self.reorder_window_s
+        final = self.head.pop_older(cutoff, min_count=self.block_size)
+        if final:
+            for b in _seal(final):
+                self.blocks.append(b)
+                self._sealed += b.count
+
+        self._trim()
+        return True
+
+    def _trim(self) -> None:
+        while self.blocks and len(self) - self.blocks[0].count >= self.maxlen:
+            self._sealed -= self.blocks.pop(0).count
+
+    def export_blocks(self) -> dict:
+        """
+        Checkpoint form: sealed blocks still encoded (they are immutable, so
+        this copies no sample data) plus the uncompressed head.
+        """
+        return {"blocks": [b.as_tuple() for b in self.blocks], "head": list(self.head.to_list())}
+
+    def restore_blocks(self, saved: dict) -> None:
+        """Load export_blocks() output into this (empty) buffer without re-encoding."""
+        self.blocks = [SealedBlock(*b) for b in saved.get("blocks", [])]
+        self._sealed = sum(b.count for b in self.blocks)
+        for x in saved.get("head", []):
+            self.push(x)
+        self._trim()
+
+    def __iter__(self) -> Iterator[dict]:
+        for b in self.blocks:
+            yield from b
+        yield from self.head.to_list()
+
+    def to_list(self) -> List[dict]:
+        return list(self)
+
+    def tail(self, n: int) -> List[dict]:
+        out = self.head.tail(n)
+        # decode only as many trailing blocks as needed
+        for b in reversed(self.blocks):
+            if len(out) >= n:
+                break
+            out = list(b)[-(n - len(out)):] + out
+        return out
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[dict]:
+        out: List[dict] = []
+        i = 0 if start is None else bisect_left([b.t_last for b in self.blocks], start)
+        for b in self.blocks[i:]:
+            if end is not None and b.t_first > end:
+                return out
+            for x in b:
+                t = ts_epoch(x["ts"])
+                if (start is None or t >= start) and (end is None or t <= end):
+                    out.append(x)
+        out.extend(self.head.range(start, end))
+        return out
+
+    def latest_at(self, t: float) -> Optional[dict]:
+        hit = self.head.latest_at(t)
+        if hit is not None:
+            return hit
+        i = bisect_right([b.t_first for b in self.blocks], t)
+        if i == 0:
+            return None
+        best = None
+        for x in self.blocks[i - 1]:
+            if ts_epoch(x["ts"]) > t:
+                break
+            best = x
+        return best
+
+
+def exported_samples(saved: dict) -> Iterator[dict]:
+    """Decode export_blocks() output, oldest first (restoring into an uncompressed buffer)."""
+    for b in saved.get("blocks", []):
+        yield from SealedBlock(*b)
+    yield from saved.get("head", [])
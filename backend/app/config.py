@@ -1,4 +1,6 @@
 # backend/app/config.py
+from typing import List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,10 +13,35 @@ class Settings(BaseSettings):
 
     # Ring buffer sizes (per device per stream)
     max_samples: int = 1200  # e.g., 20 minutes at 1Hz
+    # Out-of-order tolerance: samples up to this much older than the newest are re-sorted in
+    reorder_window_s: float = 5.0
+    # Optional compressed history (delta-of-delta ts + XOR floats); holds several times more per MB
+    telemetry_compression: bool = False
+    compression_block_size: int = 256
+    compressed_max_samples: int = 12000  # used instead of max_samples when compression is on
 
     # Optional: require a shared secret for device POSTs (recommended later)
     ingest_token: str = ""   # if empty, no auth on ingest endpoints
 
+    # Ingest admission: replay dedupe window (in seq numbers) and per-device token bucket
+    ingest_dedupe_window: int = 256
+    ingest_rate_per_s: float = 0.0   # 0 disables rate limiting
+    ingest_burst: float = 50.0
+
+    # WebSocket ingest (/ws/ingest/{device_type}): ack after this many samples or seconds
+    ws_ingest_ack_every: int = 50
+    ws_ingest_ack_interval_s: float = 1.0
+
+    # Optional binary UDP ingest (see udp_ingest.py); 0 disables
+    udp_ingest_port: int = 0
+    udp_ingest_host: str = "0.0.0.0"
+
+    # Optional shared-memory feed of accepted samples for local processes
+    # (see shm_feed.py); empty name disables
+    shm_feed_name: str = ""
+    shm_feed_slots: int = 4096
+    shm_feed_slot_size: int = 256     # bytes; samples that don't fit are counted, not published
+
     # Optional: enable sqlite logging later
     enable_sqlite: bool = False
     sqlite_path: str = "./hub_telemetry.sqlite"
@@ -23,6 +50,47 @@ class Settings(BaseSettings):
     session_secret: str = "CHANGE_ME_IN_PROD"   # set via env in real deployments
     users_file: str = "./users.json"            # allow-list stored on hub
 
+    # Spectral features (FFT band powers) over IMU/mic windows
+    spectral_enabled: bool = True
+    spectral_window: int = 128          # samples per FFT window
+    spectral_hop: int = 32              # new samples needed before recomputing
+    spectral_interval_s: float = 1.0
+    spectral_bands_hz: List[float] = [0.0, 0.5, 2.0, 5.0, 10.0, 25.0]
+
+    # Device clock offset/drift fit: time constant (s of device time) of the weighting
+    clock_tau_s: float = 600.0
+
+    # /api/query: LRU result cache entries (keyed on query + store version)
+    query_cache_size: int = 64
+
+    # Live counters: events/sec window and recent-event log length
+    rate_window_s: int = 10
+    recent_events: int = 50
+
+    # Device health rules: JSON list of rule specs (empty = built-in defaults, see health_rules.py)
+    health_rules_file: str = ""
+
+    # Alerts: JSON list of alert specs (empty = built-in defaults, see alerts.py)
+    alert_rules_file: str = ""
+    alert_tick_s: float = 1.0       # absence / auto-clear check interval
+
+    # Per-route request tracing (see tracing.py); the sample rate for detailed
+    # per-request timelines can also be changed at runtime via /api/debug/tracing
+    tracing_enabled: bool = True
+    trace_sample_rate: float = 0.0
+    trace_slowest: int = 20
+
+    # Gzip JSON responses at least this large
+    json_gzip_min_bytes: int = 1024
+
+    # On-disk caches that make restarts cheap (Jinja bytecode, compressed static
+    # assets); empty disables. Safe to delete at any time.
+    cache_dir: str = "./.hub_cache"
+
+    # Warm restart: periodic checkpoint of in-memory state (empty path disables)
+    snapshot_path: str = "./hub_state.snap"
+    snapshot_interval_s: int = 30
+
     model_config = SettingsConfigDict(env_prefix="KONPANION_", env_file=".env")
 
 settings = Settings()
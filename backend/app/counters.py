@@ -0,0 +1,167 @@
+# app/counters.py
+"""
+Live hub counters for the dashboard: events/sec, bytes received today and a
+short log of recent events. Every update is O(1):
+
+- RateCounter keeps one bucket per second in a fixed ring and a running
+  total, so advancing the clock only clears the buckets that expired.
+- DailyCounter resets itself when local midnight passes; the next rollover
+  instant is precomputed, so the per-sample check is a single comparison.
+- The recent-event log is a bounded deque.
+
+HubCounters is shared by all ingest paths, so updates and reads take one
+short lock.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Optional
+
+
+class RateCounter:
+    """Events in the last `window_s` whole seconds (plus the current one)."""
+    __slots__ = ("window_s", "total", "_buckets", "_sec")
+
+    def __init__(self, window_s: int = 10):
+        self.window_s = window_s
+        self.total = 0
+        self._buckets = [0] * window_s
+        self._sec: Optional[int] = None
+
+    def _advance(self, sec: int) -> None:
+        if self._sec is None:
+            self._sec = sec
+            return
+        gap = sec - self._sec
+        if gap <= 0:
+            return
+        if gap >= self.window_s:
+            self._buckets = [0] * self.window_s
+            self.total = 0
+        else:
+            for s in range(self._sec + 1, sec + 1):
+                i = s % self.window_s
+                self.total -= self._buckets[i]
+                self._buckets[i] = 0
+        self._sec = sec
+
+    def add(self, now: float, n: int = 1) -> None:
+        sec = int(now)
+        self._advance(sec)
+        if sec < self._sec - self.window_s + 1:
+            return  # wall clock stepped back past the window
+        self._buckets[sec % self.window_s] += n
+        self.total += n
+
+    def rate(self, now: float) -> float:
+        self._advance(int(now))
+        return self.total / self.window_s
+
+
+def _next_midnight(now: float) -> float:
+    day = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (day + timedelta(days=1)).timestamp()
+
+
+@dataclass
+class DailyCounter:
+    """Events/bytes since local midnight."""
+    events: int = 0
+    bytes: int = 0
+    rollover_at: float = 0.0
+
+    def _roll(self, now: float) -> None:
+        if now >= self.rollover_at:
+            self.events = 0
+            self.bytes = 0
+            self.rollover_at = _next_midnight(now)
+
+    def add(self, now: float, nbytes: int) -> None:
+        self._roll(now)
+        self.events += 1
+        self.bytes += nbytes
+
+    def read(self, now: float) -> "DailyCounter":
+        self._roll(now)
+        return self
+
+
+class HubCounters:
+    def __init__(self, window_s: int = 10, recent: int = 50):
+        self.window_s = window_s
+        self.eps = RateCounter(window_s)
+        self.today = DailyCounter()
+        self.device_eps: Dict[str, RateCounter] = {}
+        self.device_today: Dict[str, DailyCounter] = {}
+        self.recent: Deque[dict] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        device_id: str,
+        device_type: str,
+        ts: float,
+        seq: Optional[int] = None,
+        nbytes: int = 0,
+        now: Optional[float] = None,
+    ) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.eps.add(now)
+            self.today.add(now, nbytes)
+
+            rc = self.device_eps.get(device_id)
+            if rc is None:
+                rc = self.device_eps[device_id] = RateCounter(self.window_s)
+                self.device_today[device_id] = DailyCounter()
+            rc.add(now)
+            self.device_today[device_id].add(now, nbytes)
+
+            # newest first, which is the order the dashboard renders
+            self.recent.appendleft({"device_type": device_type, "device_id": device_id, "ts": ts, "seq": seq})
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            today = self.today.read(now)
+            return {
+                "eps": round(self.eps.rate(now), 2),
+                "events_today": today.events,
+                "data_mb_today": round(today.bytes / 1e6, 3),
+                "last_events": list(self.recent),
+            }
+
+    def device_stats(self, now: Optional[float] = None) -> Dict[str, dict]:
+        now = time.time() if now is None else now
+        out = {}
+        with self._lock:
+            for device_id, rc in self.device_eps.items():
+                today = self.device_today[device_id].read(now)
+                out[device_id] = {
+                    "eps": round(rc.rate(now), 2),
+                    "events_today": today.events,
+                    "bytes_today": today.bytes,
+                }
+        return out
+
+    def export_state(self) -> dict:
+        """Today's totals and the recent-event log (rates are too short-lived to keep)."""
+        with self._lock:
+            return {
+                "today": asdict(self.today),
+                "device_today": {k: asdict(v) for k, v in self.device_today.items()},
+                "recent": list(self.recent),
+            }
+
+    def restore_state(self, state: dict) -> None:
+        # a checkpoint from before midnight rolls over on the next read, as a live counter would
+        with self._lock:
+            self.today = DailyCounter(**state["today"]) if "today" in state else DailyCounter()
+            self.device_today = {k: DailyCounter(**v) for k, v in state.get("device_today", {}).items()}
+            self.device_eps = {k: RateCounter(self.window_s) for k in self.device_today}
+            self.recent.clear()
+            self.recent.extend(state.get("recent", []))
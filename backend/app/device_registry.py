@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import time
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from enum import Enum
 from typing import Dict, List, Optional
 
@@ -55,5 +55,13 @@ class DeviceRegistry:
         d.last_seen = time.time()
         d.last_error = err
 
+    def export_state(self) -> List[dict]:
+        return [{**asdict(d), "state": d.state.value} for d in self._devices.values()]
+
+    def restore_state(self, items: List[dict]) -> None:
+        self._devices = {}
+        for x in items:
+            self.upsert(DiscoveredDevice(**{**x, "state": DeviceState(x["state"])}))
+
 
 registry = DeviceRegistry()
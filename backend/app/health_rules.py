@@ -0,0 +1,297 @@
+# app/health_rules.py
+"""
+Declarative device-health rules.
+
+Rules are plain data (DEFAULT_RULES below, or a JSON list pointed to by
+KONPANION_HEALTH_RULES_FILE), validated once and compiled into small closures.
+Per device the engine remembers the last value of every field a rule reads,
+so on each sample only rules whose inputs actually changed are re-evaluated,
+and the device's `issues` list is rebuilt only when some rule flips.
+
+Rule kinds:
+  threshold       field <op> value; optional `clear` level gives hysteresis
+                  (e.g. raise below 15 %, clear only at/above 20 %)
+  channel_count   list field must have `expected` entries; `required` also
+                  flags a missing payload
+  rate_of_change  |d field / dt| above `max_per_s` (per second, device clock)
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter, model_validator
+
+from .series import FIELD_RE, field_getter
+from .thresholds import OPS, check_format, check_hysteresis
+from .timeutil import ts_epoch
+
+_MISSING = object()
+
+# placeholders each kind's messages get (example values, used to validate specs)
+_MESSAGE_ARGS: Dict[str, Dict[str, Any]] = {
+    "threshold": {"value": 0.0},
+    "channel_count": {"expected": 0, "count": 0},
+    "rate_of_change": {"value": 0.0, "rate": 0.0},
+}
+_REQUIRED: Dict[str, str] = {"threshold": "value", "channel_count": "expected", "rate_of_change": "max_per_s"}
+
+
+class RuleSpec(BaseModel):
+    id: str
+    kind: Literal["threshold", "channel_count", "rate_of_change"]
+    field: str                      # dotted path into the sample, e.g. "battery_pct", "imu.az"
+    message: str                    # str.format() with {value} / {count} / {expected} / {rate}
+    device_types: List[str] = []    # empty = all device types
+
+    # threshold
+    op: Literal["<", "<=", ">", ">="] = "<"
+    value: Optional[float] = None
+    clear: Optional[float] = None
+
+    # channel_count
+    expected: Optional[int] = None
+    required: bool = False
+    missing_message: Optional[str] = None
+
+    # rate_of_change
+    max_per_s: Optional[float] = None
+
+    @model_validator(mode="after")
+    def _check_kind(self) -> "RuleSpec":
+        # fail when rules are loaded, not on every sample at ingest time
+        if not FIELD_RE.match(self.field):
+            raise ValueError(f"rule {self.id!r}: invalid field path {self.field!r}")
+        required = _REQUIRED[self.kind]
+        if getattr(self, required) is None:
+            raise ValueError(f"rule {self.id!r}: {self.kind} rules need {required!r}")
+        if self.kind == "threshold":
+            check_hysteresis(f"rule {self.id!r}", self.op, self.value, self.clear)
+        check_format(self.message, **_MESSAGE_ARGS[self.kind])
+        if self.missing_message is not None:
+            check_format(self.missing_message, **_MESSAGE_ARGS[self.kind])
+        return self
+
+
+DEFAULT_RULES: List[dict] = [
+    {
+        "id": "snuu_fsr_channels", "kind": "channel_count", "field": "fsr",
+        "device_types": ["SNUU"], "expected": 6, "required": True,
+        "message": "Expected {expected} FSR channels, got {count}.",
+        "missing_message": "No FSR payload received.",
+    },
+    {
+        "id": "nooh_fsr_channels", "kind": "channel_count", "field": "fsr",
+        "device_types": ["NOOH"], "expected": 4,
+        "message": "Expected {expected} FSR channels, got {count}.",
+    },
+    {
+        "id": "low_battery", "kind": "threshold", "field": "battery_pct",
+        "op": "<", "value": 15,
+        "message": "Low battery (<15%).",
+    },
+]
+
+STALE_FLAG = "stale"
+STALE_MESSAGE = "Device stale/disconnected."
+_RESTORED = "restored:"     # flag-id prefix for issues carried over from a checkpoint
+
+
+# A compiled check takes (sample, per-rule state dict) and returns the issue
+# message if active, "" if clear, or None for "no opinion, keep current state".
+Check = Callable[[dict, dict], Optional[str]]
+
+
+@dataclass
+class CompiledRule:
+    id: str
+    deps: Tuple[str, ...]   # top-level sample keys the rule reads
+    check: Check
+
+
+def _compile_threshold(spec: RuleSpec) -> Check:
+    get = field_getter(spec.field)
+    raise_if = OPS[spec.op]
+    level = spec.value
+    clear_level = spec.clear
+
+    def check(x: dict, st: dict) -> Optional[str]:
+        v = get(x)
+        if not isinstance(v, (int, float)):
+            return None
+        if raise_if(v, level):
+            st["on"] = True
+            return spec.message.format(value=v)
+        if st.get("on") and clear_level is not None and raise_if(v, clear_level):
+            return None  # inside the hysteresis band: keep raised
+        st["on"] = False
+        return ""
+    return check
+
+
+def _compile_channel_count(spec: RuleSpec) -> Check:
+    get = field_getter(spec.field)
+    expected = spec.expected
+
+    def check(x: dict, st: dict) -> Optional[str]:
+        v = get(x)
+        if not isinstance(v, list):
+            return (spec.missing_message or spec.message).format(expected=expected, count=0) if spec.required else ""
+        if len(v) != expected:
+            return spec.message.format(expected=expected, count=len(v))
+        return ""
+    return check
+
+
+def _compile_rate(spec: RuleSpec) -> Check:
+    get = field_getter(spec.field)
+    limit = spec.max_per_s
+
+    def check(x: dict, st: dict) -> Optional[str]:
+        v, t = get(x), ts_epoch(x["ts"])
+        if not isinstance(v, (int, float)):
+            v = None
+        prev = st.get("prev")
+        st["prev"] = (v, t) if v is not None else prev
+        if v is None or prev is None or t <= prev[1]:
+            return None
+        rate = abs(v - prev[0]) / (t - prev[1])
+        return spec.message.format(value=v, rate=rate) if rate > limit else ""
+    return check
+
+
+_COMPILERS = {
+    "threshold": _compile_threshold,
+    "channel_count": _compile_channel_count,
+    "rate_of_change": _compile_rate,
+}
+
+
+def compile_rule(spec: RuleSpec) -> CompiledRule:
+    top = spec.field.split(".", 1)[0]
+    # rate-of-change must see time advance even when the value is flat
+    deps = (top, "ts") if spec.kind == "rate_of_change" else (top,)
+    return CompiledRule(id=spec.id, deps=deps, check=_COMPILERS[spec.kind](spec))
+
+
+@dataclass
+class DeviceHealth:
+    last: Dict[str, Any] = field(default_factory=dict)
+    rule_state: Dict[str, dict] = field(default_factory=dict)
+    active: Dict[str, str] = field(default_factory=dict)    # rule/flag id -> message
+    issues: List[str] = field(default_factory=list)
+    restored: bool = False     # issues came from a checkpoint, not from rule evaluation
+
+
+class HealthEngine:
+    """
+    Per-device state is only touched by callers holding that device's lock
+    (HubStore shards); the per-type rule cache is idempotent to fill.
+    """
+    def __init__(self, specs: List[RuleSpec]):
+        self.rules = [compile_rule(s) for s in specs]
+        self._order = [r.id for r in self.rules]
+        self._types = {s.id: set(s.device_types) for s in specs}
+        self._by_type: Dict[str, Tuple[List[CompiledRule], Tuple[str, ...]]] = {}
+        self._devices: Dict[str, DeviceHealth] = {}
+
+    def _rules_for(self, device_type: str) -> Tuple[List[CompiledRule], Tuple[str, ...]]:
+        hit = self._by_type.get(device_type)
+        if hit is None:
+            rules = [r for r in self.rules if not self._types[r.id] or device_type in self._types[r.id]]
+            deps = tuple(dict.fromkeys(d for r in rules for d in r.deps))
+            hit = self._by_type[device_type] = (rules, deps)
+        return hit
+
+    def _device(self, device_id: str) -> DeviceHealth:
+        h = self._devices.get(device_id)
+        if h is None:
+            h = self._devices[device_id] = DeviceHealth()
+        return h
+
+    def _rebuild(self, h: DeviceHealth) -> None:
+        rules = [h.active[r] for r in self._order if r in h.active]
+        flags = [m for k, m in h.active.items() if k not in self._types]
+        h.issues = rules + flags
+
+    def reset(self) -> None:
+        self._devices.clear()
+
+    def seed(self, device_id: str, issues: List[str]) -> None:
+        """
+        Carry over issues from a restored DeviceStatus. There is no rule state
+        behind them, so they stay as they are until the device's next sample,
+        which drops them and re-evaluates every rule from scratch.
+        """
+        h = self._devices[device_id] = DeviceHealth(restored=True)
+        for i, msg in enumerate(issues):
+            h.active[STALE_FLAG if msg == STALE_MESSAGE else f"{_RESTORED}{i}"] = msg
+        h.issues = list(issues)
+
+    def evaluate(self, device_id: str, device_type: str, sample: dict) -> bool:
+        """
+        Feed one sample. Returns True if the device's issues changed; always
+        True for a device's first sample (or first after a restore), so callers
+        replace whatever issues they had with the engine's.
+        """
+        h = self._devices.get(device_id)
+        fresh = h is None or h.restored
+        if h is None:
+            h = self._devices[device_id] = DeviceHealth()
+        elif h.restored:
+            h.active = {k: m for k, m in h.active.items() if not k.startswith(_RESTORED)}
+            h.restored = False
+        rules, deps = self._rules_for(device_type)
+
+        changed = set()
+        last = h.last
+        for d in deps:
+            v = sample.get(d)
+            if last.get(d, _MISSING) != v:
+                changed.add(d)
+                last[d] = v
+        if not changed and not fresh:
+            return False
+
+        flipped = False
+        for r in rules:
+            if changed.isdisjoint(r.deps):
+                continue
+            st = h.rule_state.get(r.id)
+            if st is None:
+                st = h.rule_state[r.id] = {}
+            msg = r.check(sample, st)
+            if msg is None or h.active.get(r.id, "") == msg:
+                continue
+            if msg:
+                h.active[r.id] = msg
+            else:
+                del h.active[r.id]
+            flipped = True
+
+        if flipped or fresh:
+            self._rebuild(h)
+        return flipped or fresh
+
+    def set_flag(self, device_id: str, flag: str, message: Optional[str]) -> bool:
+        """Raise (message) or clear (None) an externally managed issue, e.g. staleness."""
+        h = self._device(device_id)
+        if h.active.get(flag) == message:
+            return False
+        if message is None:
+            del h.active[flag]
+        else:
+            h.active[flag] = message
+        self._rebuild(h)
+        return True
+
+    def issues(self, device_id: str) -> List[str]:
+        h = self._devices.get(device_id)
+        return list(h.issues) if h else []
+
+
+def load_rules(path: str = "") -> List[RuleSpec]:
+    raw = json.loads(Path(path).read_text(encoding="utf-8")) if path else DEFAULT_RULES
+    return TypeAdapter(List[RuleSpec]).validate_python(raw)
@@ -0,0 +1,174 @@
+# app/ingest_guard.py
+"""
+Cheap admission checks that run before a sample touches HubStore:
+
+- ReplayWindow: drops retried POSTs by per-device sequence number, using the
+  classic anti-replay sliding bitmask (highest seq + one bit per recent seq).
+  A seq a whole window or more away from the newest one is normally taken as
+  a device reboot (counter reset). For `strict` samples (UDP, where a captured
+  datagram can be replayed but not forged) that is only believed with an
+  explicit reset flag, or if the sample's device ts is newer than every ts
+  accepted from the device so far; anything else is a replay. (Over HTTP/WS
+  whoever can replay a request also holds the token, so strictness would buy
+  nothing there.) Not covered: replays from before the hub's last cold start
+  (no checkpoint), since the windows start empty, and a replayed datagram
+  that itself carries the reset flag; the ring buffer still drops its
+  samples as late unless the device clock restarted too.
+- TokenBucket: per-device rate limit so one misbehaving board can't flood
+  storage and WebSocket fanout.
+
+Both are O(1) per sample.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+RATE_LIMITED = "rate_limited"
+
+
+class ReplayWindow:
+    __slots__ = ("size", "top", "mask", "_full")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.top = -1
+        self.mask = 0
+        self._full = (1 << size) - 1
+
+    def seen(self, seq: int) -> bool:
+        if self.top < 0 or seq > self.top:
+            return False
+        off = self.top - seq
+        # far behind the window: treat as a device reboot/counter reset, not a replay
+        return off < self.size and bool(self.mask >> off & 1)
+
+    def far(self, seq: int) -> bool:
+        """True if seq is a window or more away from the newest (would read as a reset)."""
+        return self.top >= 0 and abs(self.top - seq) >= self.size
+
+    def mark(self, seq: int) -> bool:
+        """Record seq. Returns True if the window had to be reset (counter went backwards)."""
+        if self.top < 0 or seq > self.top:
+            shift = seq - self.top if self.top >= 0 else self.size
+            self.mask = ((self.mask << shift) | 1) & self._full if shift < self.size else 1
+            self.top = seq
+            return False
+        off = self.top - seq
+        if off >= self.size:
+            self.top, self.mask = seq, 1
+            return True
+        self.mask |= 1 << off
+        return False
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def take(self, now: float, n: float = 1.0) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+
+@dataclass
+class GuardCounters:
+    accepted: int = 0
+    duplicates: int = 0
+    rate_limited: int = 0
+    seq_resets: int = 0
+    replays: int = 0        # strict samples rejected as a far-away seq with an old ts
+
+
+@dataclass
+class IngestGuard:
+    window: int = 256
+    rate_per_s: float = 0.0  # 0 disables rate limiting
+    burst: float = 50.0
+    windows: Dict[str, ReplayWindow] = field(default_factory=dict)
+    buckets: Dict[str, TokenBucket] = field(default_factory=dict)
+    counters: Dict[str, GuardCounters] = field(default_factory=dict)
+    newest_ts: Dict[str, float] = field(default_factory=dict)   # newest accepted device ts
+
+    def admit(
+        self,
+        device_id: str,
+        seq: Optional[int],
+        now: Optional[float] = None,
+        ts: Optional[float] = None,
+        strict: bool = False,
+        reset: bool = False,
+    ) -> str:
+        """
+        Verdict for one sample. `ts` is its device timestamp (epoch s);
+        `strict` / `reset` as described in the module docstring.
+        """
+        c = self.counters.get(device_id)
+        if c is None:
+            c = self.counters[device_id] = GuardCounters()
+
+        win = None
+        if seq is not None and self.window > 0:
+            win = self.windows.get(device_id)
+            if win is None:
+                win = self.windows[device_id] = ReplayWindow(self.window)
+            if win.seen(seq):
+                c.duplicates += 1
+                return DUPLICATE
+            if strict and not reset and win.far(seq):
+                newest = self.newest_ts.get(device_id)
+                if ts is None or (newest is not None and ts <= newest):
+                    c.replays += 1
+                    return DUPLICATE
+
+        if self.rate_per_s > 0:
+            now = time.monotonic() if now is None else now
+            bucket = self.buckets.get(device_id)
+            if bucket is None:
+                bucket = self.buckets[device_id] = TokenBucket(self.rate_per_s, self.burst, now)
+            if not bucket.take(now):
+                c.rate_limited += 1
+                return RATE_LIMITED
+
+        # only mark seq once admitted, so a rate-limited retry isn't later mistaken for a replay
+        if win is not None:
+            if reset and win.far(seq):
+                win.top, win.mask = -1, 0      # announced restart: start a fresh window
+                c.seq_resets += 1
+            if win.mark(seq):
+                c.seq_resets += 1
+        if ts is not None and ts > self.newest_ts.get(device_id, float("-inf")):
+            self.newest_ts[device_id] = ts
+        c.accepted += 1
+        return ACCEPTED
+
+    def stats(self) -> Dict[str, dict]:
+        return {k: vars(v).copy() for k, v in self.counters.items()}
+
+    def export_state(self) -> dict:
+        """Replay windows and counters, for checkpoints. Token buckets start full after a restart."""
+        return {
+            "windows": {k: (w.top, w.mask) for k, w in list(self.windows.items())},
+            "counters": {k: vars(v).copy() for k, v in list(self.counters.items())},
+            "newest_ts": dict(self.newest_ts),
+        }
+
+    def restore_state(self, state: dict) -> None:
+        self.windows = {}
+        for device_id, (top, mask) in state.get("windows", {}).items():
+            w = self.windows[device_id] = ReplayWindow(self.window)
+            w.top, w.mask = top, mask & w._full
+        self.counters = {k: GuardCounters(**v) for k, v in state.get("counters", {}).items()}
+        self.newest_ts = dict(state.get("newest_ts", {}))
@@ -1,15 +1,77 @@
 # app/main.py
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import importlib
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse, JSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 
+from . import alerts, checkpoint, shm_feed, spectral, udp_ingest
+from .assets import STATIC_DIR, HashedStaticFiles, manifest
+from .config import settings
+from .middleware import JSONCompressionMiddleware, TracingMiddleware
 from .state import store
-from .routers import auth, dashboard, ingest, ws, hub, devices
+from .tracing import tracer
+from .routers import auth, dashboard, ingest, ws, hub, devices, debug, query
+
+
+log = logging.getLogger(__name__)
+
+# imported on first use by analytics/spectral code; warmed off the event loop after startup
+_WARM_IMPORTS = ("numpy",)
+
+
+def _warm_imports() -> None:
+    for name in _WARM_IMPORTS:
+        importlib.import_module(name)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    dashboard.precompile_templates()
+
+    # Warm restart: restore last checkpoint, then keep checkpointing
+    tasks = []
+    if settings.snapshot_path:
+        checkpoint.restore(settings.snapshot_path)
+        tasks.append(asyncio.create_task(
+            checkpoint.checkpoint_loop(settings.snapshot_path, settings.snapshot_interval_s)
+        ))
+
+    tasks.append(asyncio.create_task(alerts.alert_loop(settings.alert_tick_s)))
 
-app = FastAPI(title="Konpanion Hub", version="0.1.0")
+    if settings.spectral_enabled:
+        tasks.append(asyncio.create_task(spectral.feature_loop(settings.spectral_interval_s)))
+
+    if settings.shm_feed_name:
+        shm_feed.feed.open(settings.shm_feed_name, settings.shm_feed_slots, settings.shm_feed_slot_size)
+
+    if settings.udp_ingest_port:
+        await udp_ingest.server.start(settings.udp_ingest_host, settings.udp_ingest_port)
+
+    tasks.append(asyncio.create_task(asyncio.to_thread(_warm_imports)))
+    log.info("Startup finished in %.1f ms", (time.perf_counter() - t0) * 1000)
+
+    yield
+
+    await udp_ingest.server.stop()
+    shm_feed.feed.close()
+    for t in tasks:
+        t.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await t
+    if settings.snapshot_path:
+        await checkpoint.save(settings.snapshot_path)
+
+
+app = FastAPI(title="Konpanion Hub", version="0.1.0", lifespan=lifespan)
 
 # Sessions (needed for request.session) — ONLY ONCE
 app.add_middleware(
@@ -19,8 +81,15 @@ app.add_middleware(
     https_only=False,
 )
 
-# Static
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Compress larger JSON payloads (/api/hub, device series); streams pass through
+app.add_middleware(JSONCompressionMiddleware, minimum_size=settings.json_gzip_min_bytes)
+
+# Per-route counts/latency/bytes (/api/debug/routes); added last = outermost, so sizes are on-the-wire
+if settings.tracing_enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Static: content-hashed URLs, immutable caching, precompressed gzip/brotli
+app.mount("/static", HashedStaticFiles(directory=STATIC_DIR, manifest=manifest), name="static")
 
 # Routers — include each ONCE
 app.include_router(auth.router)
@@ -29,6 +98,8 @@ app.include_router(devices.router)
 app.include_router(ingest.router)
 app.include_router(ws.router)
 app.include_router(hub.router, prefix="/api", tags=["api"])
+app.include_router(query.router, prefix="/api", tags=["api"])
+app.include_router(debug.router)
 
 
 # Root: handle BOTH GET + HEAD
@@ -0,0 +1,159 @@
+# app/middleware.py
+from __future__ import annotations
+
+import gzip
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .tracing import RouteTracer, Trace
+
+
+class JSONCompressionMiddleware:
+    """
+    Gzip JSON responses above `minimum_size` bytes.
+
+    Unlike starlette's GZipMiddleware this never touches streaming or
+    non-JSON responses, so SSE/WebSocket traffic and already-compressed
+    static assets pass straight through.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        chunks = []
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    headers.get("content-type", "").startswith("application/json")
+                    and "content-encoding" not in headers
+                ):
+                    start = message  # hold until the body is known
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            if len(body) >= self.minimum_size:
+                body = gzip.compress(body, compresslevel=self.compresslevel)
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _nbytes(message: Message) -> int:
+    """Payload size on the wire (WebSocket text frames are UTF-8)."""
+    data = message.get("body") or message.get("bytes")
+    if data:
+        return len(data)
+    text = message.get("text")
+    if not text:
+        return 0
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class TracingMiddleware:
+    """
+    Feeds every HTTP request / WebSocket session into a RouteTracer (see
+    tracing.py). Should be the outermost middleware so response sizes are
+    what actually went over the wire.
+    """
+    def __init__(self, app: ASGIApp, tracer: RouteTracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        kind = scope["type"]
+        if kind != "http" and kind != "websocket":
+            await self.app(scope, receive, send)
+            return
+
+        tracer = self.tracer
+        root_path = scope.get("root_path", "")
+        wall = time.time()
+        t0 = time.perf_counter()
+        events: Optional[list] = [] if tracer.sampled() else None
+        req_bytes = resp_bytes = status = 0
+        t_start: Optional[float] = None
+        stream = kind == "websocket"
+
+        async def receive_wrapper() -> Message:
+            nonlocal req_bytes
+            message = await receive()
+            n = _nbytes(message)
+            req_bytes += n
+            if events is not None:
+                events.append(((time.perf_counter() - t0) * 1000, message["type"], n))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal resp_bytes, status, t_start, stream
+            mtype = message["type"]
+            n = 0
+            if mtype == "http.response.body" or mtype == "websocket.send":
+                n = _nbytes(message)
+                resp_bytes += n
+            elif mtype == "http.response.start":
+                t_start = time.perf_counter()
+                status = message["status"]
+                for k, v in message.get("headers", ()):
+                    if k == b"content-type":
+                        stream = v.startswith(b"text/event-stream")
+                        break
+            elif mtype == "websocket.accept":
+                t_start = time.perf_counter()
+                status = 101
+            if events is not None:
+                events.append(((time.perf_counter() - t0) * 1000, mtype, n))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception:
+            if not status:
+                status = 500
+            raise
+        finally:
+            t_end = time.perf_counter()
+            route = scope.get("route")
+            if route is not None:
+                path = route.path
+            elif scope.get("root_path", "") != root_path:
+                path = scope["root_path"] + "/*"   # mounted app (static files)
+            else:
+                path = "<unmatched>"
+            method = scope["method"] if kind == "http" else "WS"
+            if t_start is None:
+                t_start = t_end
+            tracer.record(Trace(
+                route=f"{method} {path}", method=method, path=scope["path"], status=status or 403,
+                started_at=wall, total_ms=(t_end - t0) * 1000, app_ms=(t_start - t0) * 1000,
+                send_ms=(t_end - t_start) * 1000, req_bytes=req_bytes, resp_bytes=resp_bytes, events=events,
+            ), stream=stream)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Literal, Optional, List, Dict
 from datetime import datetime
 
@@ -10,6 +10,7 @@ class BaseTelemetry(BaseModel):
     device_id: str
     device_type: DeviceType
     ts: datetime = Field(description="Device timestamp or hub-received timestamp")
+    seq: Optional[int] = Field(default=None, ge=0, description="Per-device sequence number (enables retry dedupe)")
 
     rssi_dbm: Optional[int] = None
     battery_pct: Optional[float] = Field(default=None, ge=0, le=100)
@@ -50,6 +51,9 @@ class NOOHTelemetry(BaseTelemetry):
 TelemetryUnion = VAELTelemetry | SNUUTelemetry | NOOHTelemetry
 
 class DeviceStatus(BaseModel):
+    # immutable: HubStore publishes a new copy on every change (readers never lock)
+    model_config = ConfigDict(frozen=True)
+
     hub_id: str
     device_id: str
     device_type: DeviceType
@@ -60,7 +64,33 @@ class DeviceStatus(BaseModel):
     fw_version: Optional[str] = None
     issues: List[str] = Field(default_factory=list)
 
+class DeviceListParams(BaseModel):
+    """Filters + paging for /api/devices (all optional; no filters = every device)."""
+    device_type: Optional[DeviceType] = None
+    connected: Optional[bool] = None
+    has_issues: Optional[bool] = None
+    seen_after: Optional[datetime] = None
+    seen_before: Optional[datetime] = None
+    order: Literal["device_id", "last_seen"] = "device_id"
+    offset: int = Field(default=0, ge=0)
+    limit: Optional[int] = Field(default=None, ge=1, le=1000)
+    # return only these DeviceStatus fields (device_id is always included)
+    fields: List[str] = []
+
+    @field_validator("fields")
+    @classmethod
+    def _check_fields(cls, v: List[str]) -> List[str]:
+        bad = [f for f in v if f not in DeviceStatus.model_fields]
+        if bad:
+            raise ValueError(f"unknown field(s): {', '.join(bad)}")
+        return v
+
 class HubSnapshot(BaseModel):
     hub_id: str
     ts: datetime
     devices: Dict[str, DeviceStatus]
+    # live counters (see counters.py)
+    eps: float = 0.0
+    events_today: int = 0
+    data_mb_today: float = 0.0
+    last_events: List[dict] = Field(default_factory=list)
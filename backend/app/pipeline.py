@@ -0,0 +1,43 @@
+# app/pipeline.py
+from __future__ import annotations
+
+import time
+
+from .ingest_guard import ACCEPTED
+from .models import TelemetryUnion
+from .shm_feed import feed as shm_feed
+from .state import store, ws_broker, change_feed, ingest_guard, alert_engine, clocks
+from .timeutil import ts_epoch
+
+# extra verdict (besides ingest_guard's) for samples the ring buffer rejected as late
+DROPPED = "dropped"
+
+
+async def accept_telemetry(evt: TelemetryUnion, nbytes: int = 0, strict_seq: bool = False,
+                           seq_reset: bool = False) -> str:
+    """
+    Single path for every sample, whatever transport it arrived on:
+    admission (replay dedupe + rate limit), store, clock tracking, alert evaluation,
+    WebSocket and shared-memory fanout, change-feed wake-up. Returns the verdict; only ACCEPTED samples
+    reach storage and fanout. `nbytes` is the sample's wire size; `strict_seq` /
+    `seq_reset` go to IngestGuard.admit (see ingest_guard.py).
+    """
+    verdict = ingest_guard.admit(evt.device_id, evt.seq, ts=ts_epoch(evt.ts), strict=strict_seq, reset=seq_reset)
+    if verdict != ACCEPTED:
+        return verdict
+
+    # clock model first: upsert bumps the store seq, which keys cached resample
+    # results, so they must not be computed with the previous estimate. Late and
+    # duplicate samples don't move device time forward, which the model ignores.
+    now = time.time()
+    clocks.observe(evt.device_id, ts_epoch(evt.ts), now)
+    data = store.upsert_telemetry(evt, nbytes)
+    if data is None:
+        verdict = DROPPED
+    await ws_broker.broadcast(data)
+    if data is not None:
+        shm_feed.publish(data, now)
+        for t in alert_engine.observe(evt.device_id, evt.device_type, data):
+            await ws_broker.broadcast(t)
+    change_feed.notify()
+    return verdict
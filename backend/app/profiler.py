@@ -0,0 +1,128 @@
+# app/profiler.py
+"""
+In-process sampling profiler for the live hub.
+
+A background thread snapshots every other thread's stack via
+sys._current_frames() at a fixed interval and aggregates them as
+flamegraph "collapsed" stacks (`thread;outer;...;inner count`). Meanwhile an
+asyncio probe measures event-loop lag (how late a short sleep wakes up), so a
+blocking call on the loop shows up both as lag and as the stack that caused it.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.005, max_depth: int = 128):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def run(self, duration_s: float) -> None:
+        """Blocking; call from a worker thread."""
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        deadline = time.perf_counter() + duration_s
+        while time.perf_counter() < deadline:
+            for t in threading.enumerate():
+                names.setdefault(t.ident, t.name)
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval_s)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class LoopLagProbe:
+    def __init__(self, interval_s: float = 0.01, stall_s: float = 0.05):
+        self.interval_s = interval_s
+        self.stall_s = stall_s
+        self.lags: List[float] = []
+
+    async def run(self, duration_s: float) -> None:
+        deadline = time.perf_counter() + duration_s
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                return
+            await asyncio.sleep(self.interval_s)
+            self.lags.append(max(0.0, time.perf_counter() - t0 - self.interval_s))
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        return {
+            "probes": len(lags),
+            "mean_ms": round(1000 * sum(lags) / len(lags), 3) if lags else 0.0,
+            "p99_ms": round(1000 * _percentile(lags, 0.99), 3),
+            "max_ms": round(1000 * (lags[-1] if lags else 0.0), 3),
+            "stalls": sum(1 for x in lags if x >= self.stall_s),
+            "stall_threshold_ms": self.stall_s * 1000,
+        }
+
+
+def task_stats() -> dict:
+    """Pending asyncio tasks grouped by coroutine name."""
+    by_coro: Counter = Counter()
+    for t in asyncio.all_tasks():
+        coro = t.get_coro()
+        by_coro[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+    return {"total": sum(by_coro.values()), "by_coroutine": dict(by_coro.most_common())}
+
+
+# one profile at a time: concurrent runs would just profile each other
+_busy = asyncio.Lock()
+
+
+def busy() -> bool:
+    return _busy.locked()
+
+
+async def profile(duration_s: float, interval_s: float, with_loop_stats: bool) -> dict:
+    async with _busy:
+        prof = SamplingProfiler(interval_s=interval_s)
+        probe: Optional[LoopLagProbe] = LoopLagProbe() if with_loop_stats else None
+
+        jobs = [asyncio.to_thread(prof.run, duration_s)]
+        if probe is not None:
+            jobs.append(probe.run(duration_s))
+        await asyncio.gather(*jobs)
+
+        out = {
+            "duration_s": duration_s,
+            "interval_ms": interval_s * 1000,
+            "samples": prof.samples,
+            "collapsed": prof.collapsed(),
+        }
+        if probe is not None:
+            out["loop_lag"] = probe.stats()
+            out["tasks"] = task_stats()
+        return out
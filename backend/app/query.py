@@ -0,0 +1,342 @@
+# app/query.py
+"""
+Aggregation queries over buffered telemetry (/api/query).
+
+A query names fields (dotted paths, see series.py), a time range (absolute
+start/end or `last_s` seconds back from now), optional device filters, how to
+group (per device and/or per `bucket_s` time bucket) and which aggregations
+to compute. Execution is vectorized: every selected sample gets an integer
+group key (device index * buckets + bucket index), and each aggregation is
+one bincount / reduce over the concatenated columns.
+
+Results are cached in a small LRU keyed on (query, store version). Any
+ingest bumps the version, so a cached answer is never older than the newest
+sample. Ranges relative to now (`last_s`, or a resample without `end`) are
+resolved against `now` rounded up to NOW_QUANTUM_S, which is part of the key,
+so on a quiet hub the window still moves.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from .models import DeviceType
+from .series import FIELD_RE, columns, resample
+from .timeutil import ts_epoch
+
+if TYPE_CHECKING:  # numpy is imported on first use (startup time)
+    import numpy as np
+
+Agg = Literal["avg", "min", "max", "p95", "count"]
+
+MAX_GROUPS = 100_000
+MAX_GRID_POINTS = 10_000
+MAX_SERIES_DEVICES = 64
+NOW_QUANTUM_S = 1.0
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _field_paths(v: List[str]) -> List[str]:
+    bad = [f for f in v if not FIELD_RE.match(f)]
+    if bad:
+        raise ValueError(f"invalid field path(s): {', '.join(bad)}")
+    return list(dict.fromkeys(v))
+
+
+class Query(BaseModel):
+    fields: List[str] = Field(min_length=1, max_length=16)
+    aggs: List[Agg] = Field(default_factory=lambda: ["avg"], min_length=1)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    last_s: Optional[float] = Field(default=None, gt=0)
+    device_type: Optional[DeviceType] = None
+    device_ids: List[str] = []
+    group_by: List[Literal["device", "time"]] = ["device"]
+    bucket_s: float = Field(default=60.0, gt=0)
+
+    @field_validator("fields")
+    @classmethod
+    def _check_fields(cls, v: List[str]) -> List[str]:
+        return _field_paths(v)
+
+    @model_validator(mode="after")
+    def _check_range(self) -> "Query":
+        if self.last_s is not None and self.start is not None:
+            raise ValueError("use either last_s or start, not both")
+        if self.start is not None and self.end is not None and self.end < self.start:
+            raise ValueError("end is before start")
+        return self
+
+
+def _agg(keys: np.ndarray, values: np.ndarray, ngroups: int, aggs: List[str]) -> Dict[str, np.ndarray]:
+    """Per-group aggregations of `values` (NaN ignored); empty groups are NaN (count 0)."""
+    import numpy as np
+
+    ok = ~np.isnan(values)
+    k, v = keys[ok], values[ok]
+    count = np.bincount(k, minlength=ngroups)
+    out: Dict[str, np.ndarray] = {}
+    if "count" in aggs:
+        out["count"] = count.astype(float)
+    empty = count == 0
+    if "avg" in aggs:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["avg"] = np.bincount(k, weights=v, minlength=ngroups) / count
+    if {"min", "max", "p95"} & set(aggs):
+        order = np.lexsort((v, k))
+        vs = v[order]
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+        last = np.maximum(starts + count - 1, 0)
+        if len(vs) == 0:
+            vs = np.full(1, np.nan)
+        if "min" in aggs:
+            out["min"] = np.where(empty, np.nan, vs[np.minimum(starts, len(vs) - 1)])
+        if "max" in aggs:
+            out["max"] = np.where(empty, np.nan, vs[np.minimum(last, len(vs) - 1)])
+        if "p95" in aggs:
+            # linear interpolation between closest ranks (numpy's default method)
+            pos = starts + 0.95 * np.maximum(count - 1, 0)
+            lo = np.minimum(np.floor(pos).astype(int), len(vs) - 1)
+            hi = np.minimum(np.ceil(pos).astype(int), len(vs) - 1)
+            out["p95"] = np.where(empty, np.nan, vs[lo] + (vs[hi] - vs[lo]) * (pos - np.floor(pos)))
+    return out
+
+
+def _dt(t: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(t, tz=timezone.utc) if t is not None else None
+
+
+def _cell(agg: str, x: float) -> Optional[float]:
+    if agg == "count":
+        return int(x)
+    return None if math.isnan(x) else round(float(x), 6)
+
+
+def run_query(q: Query, store, now: Optional[float] = None) -> dict:
+    import numpy as np
+
+    now = time.time() if now is None else now
+    if q.last_s is not None:
+        start, end = now - q.last_s, now
+    else:
+        start = ts_epoch(q.start) if q.start is not None else None
+        end = ts_epoch(q.end) if q.end is not None else None
+
+    status = store.status
+    ids = [
+        d for d in (q.device_ids or sorted(status))
+        if d in status and (q.device_type is None or status[d].device_type == q.device_type)
+    ]
+
+    # pull columns per device (copies taken under each shard's lock)
+    ts_parts, dev_parts, col_parts = [], [], {f: [] for f in q.fields}
+    for i, device_id in enumerate(ids):
+        samples = store.get_device_series(device_id, start=_dt(start), end=_dt(end))
+        if not samples:
+            continue
+        ts, cols = columns(samples, q.fields)
+        ts_parts.append(ts)
+        dev_parts.append(np.full(len(ts), i))
+        for f in q.fields:
+            col_parts[f].append(cols[f])
+
+    result = {"start": start, "end": end, "bucket_s": q.bucket_s if "time" in q.group_by else None, "groups": []}
+    if not ts_parts:
+        return result
+
+    ts = np.concatenate(ts_parts)
+    dev = np.concatenate(dev_parts)
+    by_device = "device" in q.group_by
+    by_time = "time" in q.group_by
+
+    t0 = start if start is not None else float(ts.min())
+    if by_time:
+        t0 = math.floor(t0 / q.bucket_s) * q.bucket_s
+        bucket = np.floor((ts - t0) / q.bucket_s).astype(np.int64)
+        nb = int(bucket.max()) + 1
+    else:
+        bucket = np.zeros(len(ts), dtype=np.int64)
+        nb = 1
+    nd = len(ids) if by_device else 1
+    if nd * nb > MAX_GROUPS:
+        raise QueryError(f"query would produce {nd * nb} groups (max {MAX_GROUPS}); use a larger bucket_s")
+    keys = (dev if by_device else 0) * nb + bucket
+
+    per_field = {f: _agg(keys, np.concatenate(col_parts[f]), nd * nb, q.aggs) for f in q.fields}
+    present = np.bincount(keys, minlength=nd * nb) > 0
+
+    for g in np.flatnonzero(present):
+        row: dict = {}
+        if by_device:
+            row["device_id"] = ids[g // nb]
+        if by_time:
+            row["t"] = t0 + (g % nb) * q.bucket_s
+        row["values"] = {f: {a: _cell(a, per_field[f][a][g]) for a in q.aggs} for f in q.fields}
+        result["groups"].append(row)
+    return result
+
+
+class ResampleParams(BaseModel):
+    stream: List[str] = Field(min_length=1, max_length=32)   # "device_id:field", e.g. "NOOH-1:imu.az"
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    last_s: Optional[float] = Field(default=None, gt=0)
+    step_s: float = Field(default=1.0, gt=0)
+    max_gap_s: Optional[float] = Field(default=None, gt=0)
+    correct_clock: bool = True
+
+    @field_validator("stream")
+    @classmethod
+    def _check_streams(cls, v: List[str]) -> List[str]:
+        for s in v:
+            device_id, _, f = s.rpartition(":")
+            if not device_id or not FIELD_RE.match(f):
+                raise ValueError(f"invalid stream {s!r}; expected device_id:field")
+        return list(dict.fromkeys(v))
+
+
+def run_resample(p: ResampleParams, store, clocks, now: Optional[float] = None) -> dict:
+    """
+    Interpolate streams from any devices onto one grid of hub time. With
+    correct_clock, each device's timestamps are first mapped onto the hub
+    clock using its estimated offset/drift (see clock.py).
+    """
+    import numpy as np
+
+    now = time.time() if now is None else now
+    if p.start is not None:
+        start = ts_epoch(p.start)
+        end = ts_epoch(p.end) if p.end is not None else now
+    else:
+        end = ts_epoch(p.end) if p.end is not None else now
+        start = end - (p.last_s or 60.0)
+    if end <= start:
+        raise QueryError("empty time range")
+    n = int(math.floor((end - start) / p.step_s)) + 1
+    if n > MAX_GRID_POINTS:
+        raise QueryError(f"grid would have {n} points (max {MAX_GRID_POINTS}); use a larger step_s")
+    grid = start + p.step_s * np.arange(n)
+
+    by_device: Dict[str, List[str]] = {}
+    for s in p.stream:
+        device_id, _, f = s.rpartition(":")
+        by_device.setdefault(device_id, []).append(f)
+
+    series: Dict[str, list] = {}
+    for device_id, fields in by_device.items():
+        if not store.has_device(device_id):
+            raise QueryError(f"unknown device {device_id!r}")
+        # fetch in device time, widened by the current correction and one gap
+        lo, hi = start, end
+        if p.correct_clock:
+            c = clocks.to_hub(device_id, np.array([start, end])) - np.array([start, end])
+            lo, hi = start - c[0], end - c[1]
+        margin = p.max_gap_s or p.step_s
+        samples = store.get_device_series(device_id, start=_dt(lo - margin), end=_dt(hi + margin))
+        ts, cols = columns(samples, fields)
+        if p.correct_clock and len(ts):
+            ts = clocks.to_hub(device_id, ts)
+        for f in fields:
+            vals = resample(ts, cols[f], grid, p.max_gap_s)
+            series[f"{device_id}:{f}"] = [None if math.isnan(x) else round(float(x), 6) for x in vals]
+
+    return {"start": start, "step_s": p.step_s, "t": grid.tolist(), "series": series}
+
+
+class SeriesParams(BaseModel):
+    field: List[str] = Field(min_length=1, max_length=16)
+    device_id: List[str] = Field(default_factory=list, max_length=MAX_SERIES_DEVICES)
+    device_type: Optional[DeviceType] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    last_s: Optional[float] = Field(default=None, gt=0)
+    limit: Optional[int] = Field(default=None, ge=1)    # newest n samples per device
+
+    @field_validator("field")
+    @classmethod
+    def _check_fields(cls, v: List[str]) -> List[str]:
+        return _field_paths(v)
+
+
+def _column(col: np.ndarray) -> list:
+    import numpy as np
+
+    return np.where(np.isnan(col), None, np.round(col, 6)).tolist()
+
+
+def run_series(p: SeriesParams, store, now: Optional[float] = None) -> dict:
+    """
+    Raw buffered samples of several devices in one response, one column per
+    field (plus `t`, epoch seconds) for each device. Devices come from
+    device_id, or every device of device_type (or all) if none are named.
+    """
+    now = time.time() if now is None else now
+    start = now - p.last_s if p.last_s is not None else (ts_epoch(p.start) if p.start is not None else None)
+    end = ts_epoch(p.end) if p.end is not None else None
+
+    if p.device_id:
+        unknown = [d for d in p.device_id if not store.has_device(d)]
+        if unknown:
+            raise QueryError(f"unknown device(s): {', '.join(unknown)}")
+        status = store.status
+        ids = [d for d in dict.fromkeys(p.device_id) if p.device_type is None or status[d].device_type == p.device_type]
+    else:
+        ids = [s.device_id for s in store.find_devices(device_type=p.device_type)]
+        if len(ids) > MAX_SERIES_DEVICES:
+            raise QueryError(f"{len(ids)} devices match (max {MAX_SERIES_DEVICES}); name them with device_id")
+
+    devices = {}
+    for device_id in ids:
+        if start is None and end is None and p.limit is not None:
+            samples = store.get_device_tail(device_id, p.limit)
+        else:
+            samples = store.get_device_series(device_id, start=_dt(start), end=_dt(end))
+            if p.limit is not None:
+                samples = samples[-p.limit:]
+        ts, cols = columns(samples, p.field)
+        devices[device_id] = {"t": ts.tolist(), **{f: _column(cols[f]) for f in p.field}}
+    return {"start": start, "end": end, "fields": p.field, "devices": devices}
+
+
+class QueryCache:
+    """Small thread-safe LRU of results keyed on (request model, store version)."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int], dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_run(self, q: BaseModel, store, run: Callable[..., dict] = run_query,
+                   now: Optional[float] = None) -> Tuple[dict, bool]:
+        # runners take now=; only relative ranges depend on it, and then it's part of the key
+        now = math.ceil((time.time() if now is None else now) / NOW_QUANTUM_S) * NOW_QUANTUM_S
+        relative = q.end is None if isinstance(q, ResampleParams) else getattr(q, "last_s", None) is not None
+        key = (type(q).__name__ + q.model_dump_json(), store.seq, now if relative else None)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit, True
+            self.misses += 1
+        result = run(q, store, now=now)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
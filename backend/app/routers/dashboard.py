@@ -9,6 +9,7 @@ from fastapi.responses import (
     Response,
 )
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from starlette.status import (
     HTTP_200_OK,
     HTTP_302_FOUND,
@@ -16,10 +17,33 @@ from starlette.status import (
     HTTP_307_TEMPORARY_REDIRECT,
 )
 
+from pathlib import Path
+
+from ..assets import TEMPLATES_DIR, manifest
+from ..config import settings as config
+from ..state import store
+
 router = APIRouter()
 
-# Templates live in backend/app/templates (your WorkingDirectory is backend/)
-templates = Jinja2Templates(directory="app/templates")
+# Templates live in backend/app/templates (resolved from the package, not the CWD)
+templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates.env.globals["static_url"] = manifest.url
+if config.cache_dir:
+    # compiled template code survives restarts; stale entries are keyed out by source checksum
+    _bcc_dir = Path(config.cache_dir) / "jinja"
+    try:
+        _bcc_dir.mkdir(parents=True, exist_ok=True)
+        templates.env.bytecode_cache = FileSystemBytecodeCache(str(_bcc_dir))
+    except OSError:
+        pass
+
+
+def precompile_templates() -> int:
+    """Compile every template now (called at startup) so no request pays for it."""
+    names = templates.env.list_templates()
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
 
 # ---------------------------------------------------------------------
 # Simple auth (TEMP): admin/admin via cookie
@@ -182,11 +206,25 @@ def dashboard(request: Request):
     if guard:
         return guard
 
-    # If your dashboard expects variables, pass them in this dict
+    # Render the current snapshot + session into the page so the dashboard is
+    # populated on first paint; app.js then resumes the SSE feed from event_id.
+    # The id is read before the snapshot (this runs in the threadpool, ingest keeps
+    # going): a change in between is replayed by the SSE resume, never skipped.
+    store.mark_stale_devices(stale_after_s=15)
+    session = dict(request.session)
+    event_id = store.event_id()
+    bootstrap = {
+        "session": session,
+        "hub_id": store.hub_id,
+        "hub": store.snapshot().model_dump(mode="json"),
+        "event_id": event_id,
+    }
     return templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
+            "user": session.get("user") or session.get("u") or "user",
+            "bootstrap": bootstrap,
         },
     )
 
@@ -0,0 +1,78 @@
+# backend/app/routers/debug.py
+from __future__ import annotations
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from app import profiler
+from app.tracing import tracer
+from app.routers.devices import _require_admin_like_access
+
+router = APIRouter(prefix="/api/debug", tags=["debug"])
+
+
+@router.get("/profile")
+async def profile(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    format: Literal["collapsed", "json"] = "collapsed",
+):
+    """
+    Sample the running process for `seconds` and return collapsed stacks
+    (feed to flamegraph.pl / speedscope). format=json also includes
+    event-loop lag and pending asyncio task counts.
+    """
+    _require_admin_like_access(request)
+    if profiler.busy():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    result = await profiler.profile(seconds, interval_ms / 1000, with_loop_stats=(format == "json"))
+    if format == "json":
+        return result
+    return PlainTextResponse(
+        result["collapsed"],
+        headers={"Content-Disposition": 'attachment; filename="hub-profile.collapsed"'},
+    )
+
+
+@router.get("/routes")
+async def routes(request: Request, sort: Literal["total_ms", "count", "resp_bytes", "req_bytes"] = "total_ms"):
+    """
+    Per-route request counts, latency histograms/percentiles and request/response
+    bytes since startup (or the last reset), heaviest routes first.
+    """
+    _require_admin_like_access(request)
+    return tracer.stats(sort)
+
+
+@router.get("/routes/slowest")
+async def slowest_requests(request: Request):
+    """Slowest recent requests with app/send timing breakdown."""
+    _require_admin_like_access(request)
+    return {"window_s": tracer.window_s, "requests": tracer.slowest()}
+
+
+@router.get("/traces")
+async def traces(request: Request, limit: int = Query(50, ge=1, le=1000)):
+    """Most recent sampled requests with their full ASGI message timeline (newest first)."""
+    _require_admin_like_access(request)
+    recent = list(tracer.traces)[-limit:]
+    return {"sample_rate": tracer.sample_rate, "traces": [t.as_dict() for t in reversed(recent)]}
+
+
+@router.post("/tracing")
+async def configure_tracing(
+    request: Request,
+    sample_rate: Optional[float] = Query(None, ge=0, le=1),
+    reset: bool = False,
+):
+    """Change the detailed-tracing sample rate at runtime and/or clear collected stats."""
+    _require_admin_like_access(request)
+    if sample_rate is not None:
+        tracer.sample_rate = sample_rate
+    if reset:
+        tracer.reset()
+    return {"sample_rate": tracer.sample_rate, "since": tracer.started_at}
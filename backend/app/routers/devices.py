@@ -8,7 +8,6 @@ from pathlib import Path
 from app.auth import require_auth, redirect_to_login
 from app.config import settings
 from app.users import load_users
-from app.discovery.wifi import scan_and_update_registry
 from app.device_registry import registry, DeviceState
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
@@ -63,6 +62,9 @@ class ConnectRequest(BaseModel):
 def discover(request: Request):
     _require_admin_like_access(request)
 
+    # rarely used; keep Wi-Fi discovery out of startup imports
+    from app.discovery.wifi import scan_and_update_registry
+
     devices = scan_and_update_registry()
     return {
         "count": len(devices),
@@ -1,13 +1,26 @@
 # app/routers/hub.py
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from typing import Any
+import asyncio
+import json
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Optional
 
-from ..state import store  # store should be your global HubStore instance
+from .. import shm_feed, spectral, udp_ingest
+from ..auth import require_auth
+from ..models import DeviceListParams
+from ..timeutil import ts_epoch
+from ..state import store, change_feed, ingest_guard, alert_engine, ws_broker, clocks  # store should be your global HubStore instance
 
 router = APIRouter()
 
+# SSE tuning: coalesce bursts of samples into one push, keep proxies/NAT alive
+SSE_MIN_PUSH_INTERVAL_S = 0.25
+SSE_KEEPALIVE_S = 15.0
+SSE_RETRY_MS = 3000
+
 
 @router.get("/hub")
 async def hub_snapshot() -> Any:
@@ -24,24 +37,204 @@ async def hub_snapshot() -> Any:
     return store.snapshot()
 
 
+def _sse(event: str, event_id: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+async def _hub_events(request: Request, last_event_id: Optional[str]) -> AsyncIterator[str]:
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    # resume from Last-Event-ID if it belongs to this process lifetime, else start from a snapshot
+    cursor = store.parse_event_id(last_event_id)
+    if cursor is None:
+        store.mark_stale_devices(stale_after_s=15)
+        # seq before the snapshot: a change racing with it is sent again as a delta
+        # (harmless) rather than lost
+        cursor = store.seq
+        yield _sse("snapshot", store.event_id(cursor), store.snapshot().model_dump_json())
+
+    # alerts: current active set first, then only transitions. Every event id is
+    # the device cursor, so resuming from any of them never skips device changes.
+    alerts = alert_engine.state()
+    alert_cursor = alerts["seq"]
+    yield _sse("alerts", store.event_id(cursor), json.dumps(alerts))
+
+    while not await request.is_disconnected():
+        seq, changed = store.changes_since(cursor)
+        if changed:
+            payload = json.dumps({
+                "devices": [d.model_dump(mode="json") for d in changed],
+                "counters": store.counters.snapshot(),
+            })
+            yield _sse("devices", store.event_id(seq), payload)
+            cursor = seq
+
+        transitions = alert_engine.since(alert_cursor)
+        if transitions is None:
+            # fell behind the transition log: resend the active set
+            alerts = alert_engine.state()
+            alert_cursor = alerts["seq"]
+            yield _sse("alerts", store.event_id(cursor), json.dumps(alerts))
+        elif transitions:
+            alert_cursor = transitions[-1]["seq"]
+            yield _sse("alerts", store.event_id(cursor), json.dumps({"seq": alert_cursor, "transitions": transitions}))
+
+        if await change_feed.wait(timeout=SSE_KEEPALIVE_S):
+            await asyncio.sleep(SSE_MIN_PUSH_INTERVAL_S)
+        else:
+            yield ": keepalive\n\n"
+        store.mark_stale_devices(stale_after_s=15)
+
+
+@router.get("/hub/stream")
+async def hub_stream(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+) -> Any:
+    """
+    Server-Sent Events feed of device status changes.
+    First event is a full `snapshot`; after that only `devices` deltas are sent.
+    `alerts` events carry the active alert set once, then only transitions.
+    Reconnecting clients send Last-Event-ID and receive just what they missed;
+    `?last_event_id=` lets a server-rendered page skip the initial snapshot.
+    """
+    return StreamingResponse(
+        _hub_events(request, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/devices")
-async def list_devices() -> Any:
-    """List known devices (those that have sent telemetry)."""
+async def list_devices(p: Annotated[DeviceListParams, Query()]) -> Any:
+    """
+    List known devices (those that have sent telemetry), optionally filtered
+    and paged, e.g. the first 50 disconnected SNUUs with only a few fields:
+        /api/devices?device_type=SNUU&connected=false&limit=50&fields=last_seen&fields=battery_pct
+    `next_offset` is null on the last page.
+    """
     try:
         store.mark_stale_devices(stale_after_s=15)
     except Exception:
         pass
-    snap = store.snapshot()
-    return {"hub_id": snap.hub_id, "ts": snap.ts, "devices": list(snap.devices.values())}
+    matches = store.find_devices(
+        device_type=p.device_type,
+        connected=p.connected,
+        has_issues=p.has_issues,
+        seen_after=ts_epoch(p.seen_after) if p.seen_after is not None else None,
+        seen_before=ts_epoch(p.seen_before) if p.seen_before is not None else None,
+        order=p.order,
+    )
+    end = len(matches) if p.limit is None else p.offset + p.limit
+    page = matches[p.offset:end]
+    if p.fields:
+        include = {"device_id", *p.fields}
+        devices: list = [d.model_dump(mode="json", include=include) for d in page]
+    else:
+        devices = page
+    return {
+        "hub_id": store.hub_id,
+        "ts": datetime.utcnow(),
+        "total": len(matches),
+        "offset": p.offset,
+        "next_offset": end if end < len(matches) else None,
+        "devices": devices,
+    }
+
+
+@router.get("/alerts")
+async def list_alerts(since: Optional[int] = None) -> Any:
+    """
+    Active alerts. With ?since=<seq>, just the transitions after it
+    (`resync: true` means the log moved on; use the active set instead).
+    """
+    if since is None:
+        return {**alert_engine.state(), "stats": alert_engine.stats()}
+    transitions = alert_engine.since(since)
+    if transitions is None:
+        return {**alert_engine.state(), "resync": True}
+    return {"seq": transitions[-1]["seq"] if transitions else since, "transitions": transitions}
+
+
+@router.post("/alerts/{alert_id}/ack")
+async def ack_alert(alert_id: str, request: Request) -> Any:
+    """Acknowledge an active alert (signed-in users only)."""
+    user = require_auth(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    try:
+        transitions = alert_engine.acknowledge(alert_id, user)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No such active alert")
+    for t in transitions:
+        await ws_broker.broadcast(t)
+    if transitions:
+        change_feed.notify()
+    # empty if it was already acknowledged; ack then clear for alerts that end on ack
+    return {"ok": True, "transitions": transitions}
+
+
+@router.get("/clock")
+async def clock_stats() -> Any:
+    """Estimated clock offset (device -> hub, ms) and drift (ppm) per device."""
+    return {"devices": clocks.stats()}
+
+
+@router.get("/counters")
+async def counters() -> Any:
+    """Live ingest counters, hub-wide and per device."""
+    return {**store.counters.snapshot(), "devices": store.counters.device_stats()}
 
 
 @router.get("/device/{device_id}")
-async def device_series(device_id: str) -> Any:
-    """Return recent telemetry series for a device."""
-    series = store.get_device_series(device_id)
+async def device_series(
+    device_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Any:
+    """Return recent telemetry series for a device (optionally only start <= ts <= end)."""
+    series = store.get_device_series(device_id, start=start, end=end)
     if not series:
         # device might exist in status but no buffered telemetry; check status
-        if device_id in store.status:
-            return {"device_id": device_id, "series": []}
+        if store.has_device(device_id):
+            return {"device_id": device_id, "series": [], "buffer": store.buffer_stats(device_id)}
+        raise HTTPException(status_code=404, detail="Unknown device_id")
+    return {"device_id": device_id, "series": series, "buffer": store.buffer_stats(device_id)}
+
+
+@router.get("/device/{device_id}/features")
+async def device_features(device_id: str) -> Any:
+    """Latest spectral feature window for a device (also pushed over /ws/telemetry as type=features)."""
+    if not store.has_device(device_id):
+        raise HTTPException(status_code=404, detail="Unknown device_id")
+    return {"device_id": device_id, "features": spectral.engine.latest.get(device_id)}
+
+
+@router.get("/features")
+async def all_features() -> Any:
+    """Latest spectral feature window for every device that has one."""
+    return {"hub_id": store.hub_id, "devices": spectral.engine.latest}
+
+
+@router.get("/device/{device_id}/at")
+async def device_sample_at(device_id: str, ts: datetime) -> Any:
+    """Return the latest sample at or before `ts`."""
+    if not store.has_device(device_id):
         raise HTTPException(status_code=404, detail="Unknown device_id")
-    return {"device_id": device_id, "series": series}
+    return {"device_id": device_id, "sample": store.get_device_sample_at(device_id, ts)}
+
+
+@router.get("/ingest/stats")
+async def ingest_stats() -> Any:
+    """
+    Per-device admission counters (accepted / duplicates / rate_limited / seq_resets),
+    plus UDP link stats (loss / reorder per device) when the UDP listener is running
+    and shared-memory feed counters when the feed is enabled.
+    """
+    out = {"hub_id": store.hub_id, "devices": ingest_guard.stats()}
+    if udp_ingest.server.transport is not None:
+        out["udp"] = udp_ingest.server.stats()
+    if shm_feed.feed.active:
+        out["shm"] = shm_feed.feed.stats()
+    return out
@@ -1,18 +1,18 @@
 from __future__ import annotations
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
 from datetime import datetime, timezone
 from typing import Optional
 
-from ..config import settings
+from ..auth import ingest_token_ok
+from ..ingest_guard import DUPLICATE, RATE_LIMITED
 from ..models import VAELTelemetry, SNUUTelemetry, NOOHTelemetry, TelemetryUnion
-from ..state import store, ws_broker
+from ..pipeline import accept_telemetry
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
 def _check_token(x_konpanion_token: Optional[str]) -> None:
-    if settings.ingest_token:
-        if not x_konpanion_token or x_konpanion_token != settings.ingest_token:
-            raise HTTPException(status_code=401, detail="Invalid ingest token.")
+    if not ingest_token_ok(x_konpanion_token):
+        raise HTTPException(status_code=401, detail="Invalid ingest token.")
 
 def _ensure_ts(evt: TelemetryUnion) -> TelemetryUnion:
     # If device doesn't provide ts, set hub-received time (still not fake; it's real receipt time).
@@ -20,26 +20,32 @@ def _ensure_ts(evt: TelemetryUnion) -> TelemetryUnion:
         evt.ts = datetime.now(timezone.utc)
     return evt
 
+def _body_size(request: Request) -> int:
+    try:
+        return int(request.headers.get("content-length") or 0)
+    except ValueError:
+        return 0
+
+def _respond(verdict: str) -> dict:
+    if verdict == RATE_LIMITED:
+        raise HTTPException(status_code=429, detail="Ingest rate limit exceeded.", headers={"Retry-After": "1"})
+    # a replayed retry is acknowledged so the device stops resending it
+    return {"ok": True, "duplicate": True} if verdict == DUPLICATE else {"ok": True}
+
 @router.post("/vael")
-async def ingest_vael(evt: VAELTelemetry, x_konpanion_token: Optional[str] = Header(default=None)):
+async def ingest_vael(evt: VAELTelemetry, request: Request, x_konpanion_token: Optional[str] = Header(default=None)):
     _check_token(x_konpanion_token)
     evt = _ensure_ts(evt)
-    store.upsert_telemetry(evt)
-    await ws_broker.broadcast(store.last_event)
-    return {"ok": True}
+    return _respond(await accept_telemetry(evt, _body_size(request)))
 
 @router.post("/snuu")
-async def ingest_snuu(evt: SNUUTelemetry, x_konpanion_token: Optional[str] = Header(default=None)):
+async def ingest_snuu(evt: SNUUTelemetry, request: Request, x_konpanion_token: Optional[str] = Header(default=None)):
     _check_token(x_konpanion_token)
     evt = _ensure_ts(evt)
-    store.upsert_telemetry(evt)
-    await ws_broker.broadcast(store.last_event)
-    return {"ok": True}
+    return _respond(await accept_telemetry(evt, _body_size(request)))
 
 @router.post("/nooh")
-async def ingest_nooh(evt: NOOHTelemetry, x_konpanion_token: Optional[str] = Header(default=None)):
+async def ingest_nooh(evt: NOOHTelemetry, request: Request, x_konpanion_token: Optional[str] = Header(default=None)):
     _check_token(x_konpanion_token)
     evt = _ensure_ts(evt)
-    store.upsert_telemetry(evt)
-    await ws_broker.broadcast(store.last_event)
-    return {"ok": True}
+    return _respond(await accept_telemetry(evt, _body_size(request)))
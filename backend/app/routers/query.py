@@ -0,0 +1,63 @@
+# backend/app/routers/query.py
+from __future__ import annotations
+
+from functools import partial
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query as QueryParams
+
+from ..config import settings
+from ..query import Query, QueryCache, QueryError, ResampleParams, SeriesParams, run_resample, run_series
+from ..state import store, clocks
+
+router = APIRouter()
+
+cache = QueryCache(maxsize=settings.query_cache_size)
+
+
+@router.post("/query")
+def query(q: Query) -> Any:
+    """
+    Aggregate buffered telemetry, e.g. average SNUU FSR channel 3 per 10 s
+    over the last hour:
+        {"fields": ["fsr.3"], "device_type": "SNUU", "last_s": 3600,
+         "group_by": ["device", "time"], "bucket_s": 10, "aggs": ["avg", "p95"]}
+    Sync on purpose: runs in the threadpool; the store is safe to read from there.
+    """
+    try:
+        result, cached = cache.get_or_run(q, store)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "version": store.event_id(), "cached": cached}
+
+
+@router.get("/resample")
+def resample(p: Annotated[ResampleParams, QueryParams()]) -> Any:
+    """
+    Several streams on one common hub-time grid, for overlays:
+        /api/resample?stream=VAEL-1:mic.rms&stream=NOOH-1:imu.az&last_s=120&step_s=0.1
+    """
+    try:
+        result, cached = cache.get_or_run(p, store, partial(run_resample, clocks=clocks))
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "version": store.event_id(), "cached": cached}
+
+
+@router.get("/series")
+def series(p: Annotated[SeriesParams, QueryParams()]) -> Any:
+    """
+    Buffered samples of several devices at once, columnar per device:
+        /api/series?device_type=SNUU&field=fsr.0&field=fsr.1&last_s=60
+        /api/series?device_id=VAEL-1&device_id=VAEL-2&field=battery_pct&limit=100
+    """
+    try:
+        result, cached = cache.get_or_run(p, store, run_series)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "version": store.event_id(), "cached": cached}
+
+
+@router.get("/query/stats")
+def query_stats() -> Any:
+    return cache.stats()
@@ -1,13 +1,74 @@
 # backend/app/routers/ws.py
 from __future__ import annotations
 
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Set
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter, ValidationError
 
-from ..auth import read_session, COOKIE_NAME
+from ..auth import ingest_token_ok, read_session, COOKIE_NAME
+from ..config import settings
+from ..ingest_guard import ACCEPTED, DUPLICATE, RATE_LIMITED
+from ..models import VAELTelemetry, SNUUTelemetry, NOOHTelemetry
+from ..pipeline import accept_telemetry, DROPPED
 from ..state import ws_broker
 
 router = APIRouter(prefix="/ws", tags=["ws"])
 
+_ADAPTERS = {
+    "VAEL": TypeAdapter(VAELTelemetry),
+    "SNUU": TypeAdapter(SNUUTelemetry),
+    "NOOH": TypeAdapter(NOOHTelemetry),
+}
+AUTH_TIMEOUT_S = 5.0
+MAX_REJECTED_PER_ACK = 256
+
+
+class _AckState:
+    """
+    What an ack tells the device. `seq` is a contiguous high-water mark: every
+    seq from the connection's first one up to it is stored (or was dropped as
+    late, which a resend wouldn't fix), so the device can forget those.
+    Rate-limited and invalid seqs hold it back and are listed in `rejected`
+    until acked once, so the device knows exactly what to resend.
+    """
+
+    def __init__(self, window: int):
+        self.window = max(1, window)
+        self.top: Optional[int] = None      # contiguous high-water mark
+        self.held: Set[int] = set()         # settled seqs above top, waiting for a gap to fill
+        self.rejected: List[int] = []
+
+    def _start(self, seq: int) -> None:
+        if self.top is None or self.top - seq >= self.window:
+            # first seq on this connection, or the device's counter went back (reboot)
+            self.top, self.held = seq - 1, set()
+
+    def settled(self, seq: int) -> None:
+        self._start(seq)
+        if seq <= self.top:
+            return
+        self.held.add(seq)
+        if len(self.held) > self.window:
+            # a gap the device never filled; don't let it pin the mark (or memory) forever
+            self.top = min(self.held) - 1
+        while self.top + 1 in self.held:
+            self.top += 1
+            self.held.discard(self.top)
+
+    def reject(self, seq: int) -> None:
+        self._start(seq)
+        if len(self.rejected) < MAX_REJECTED_PER_ACK:
+            self.rejected.append(seq)
+
+    def take_rejected(self) -> List[int]:
+        out, self.rejected = self.rejected, []
+        return out
+
 @router.websocket("/telemetry")
 async def telemetry_ws(ws: WebSocket):
     # cookie-based session auth
@@ -24,3 +85,108 @@ async def telemetry_ws(ws: WebSocket):
             await ws.receive_text()
     except WebSocketDisconnect:
         ws_broker.remove(ws)
+
+
+async def _authenticate(ws: WebSocket, token: Optional[str]) -> bool:
+    """Token from ?token= / X-Konpanion-Token, else the first message {"token": "..."}."""
+    if not settings.ingest_token:
+        return True
+    if token is None:
+        try:
+            hello = json.loads(await asyncio.wait_for(ws.receive_text(), AUTH_TIMEOUT_S))
+            token = hello.get("token") if isinstance(hello, dict) else None
+        except (asyncio.TimeoutError, ValueError):
+            token = None
+    return ingest_token_ok(token)
+
+
+@router.websocket("/ingest/{device_type}")
+async def ingest_ws(ws: WebSocket, device_type: str, device_id: Optional[str] = None, token: Optional[str] = None):
+    """
+    Streaming ingest: one connection per device instead of one POST per sample.
+
+    Each text message is a sample object or a list of them (same fields as
+    /ingest/*). hub_id and device_type default to this hub and the path,
+    device_id to ?device_id=, ts to the receive time (batches should carry
+    device ts, epoch seconds are fine), so a steady-state sample can be just
+    {"seq": 812, "ts": 1767225600.02, "imu": {...}}. The hub replies with
+    {"type": "ack", "seq": <contiguous high-water mark>, "rejected": [seq, ...],
+    <verdict counts>} after ws_ingest_ack_every samples, or at most
+    ws_ingest_ack_interval_s seconds after the first unacked one even if the
+    device has gone quiet (see _AckState).
+    """
+    adapter = _ADAPTERS.get(device_type.upper())
+    if adapter is None:
+        await ws.close(code=4404)
+        return
+
+    await ws.accept()
+    if not await _authenticate(ws, token or ws.headers.get("x-konpanion-token")):
+        await ws.close(code=4401)
+        return
+
+    defaults = {"hub_id": settings.hub_id, "device_type": device_type.upper()}
+    if device_id:
+        defaults["device_id"] = device_id
+
+    counts = {ACCEPTED: 0, DUPLICATE: 0, RATE_LIMITED: 0, DROPPED: 0, "invalid": 0}
+    acks = _AckState(settings.ingest_dedupe_window)
+    pending = 0
+    last_ack = time.monotonic()
+    interval = settings.ws_ingest_ack_interval_s
+
+    async def send_ack() -> None:
+        nonlocal pending, last_ack
+        await ws.send_json({"type": "ack", "seq": acks.top, "rejected": acks.take_rejected(), **counts})
+        pending, last_ack = 0, time.monotonic()
+
+    try:
+        while True:
+            # wake up for the interval ack even when no more messages come
+            timeout = None if pending == 0 else max(0.0, last_ack + interval - time.monotonic())
+            try:
+                text = await asyncio.wait_for(ws.receive_text(), timeout)
+            except asyncio.TimeoutError:
+                await send_ack()
+                continue
+            if pending == 0:
+                last_ack = time.monotonic()
+            try:
+                batch = json.loads(text)
+            except ValueError:
+                await ws.send_json({"type": "error", "detail": "invalid JSON"})
+                continue
+            if isinstance(batch, dict):
+                batch = [batch]
+            if not isinstance(batch, list):
+                await ws.send_json({"type": "error", "detail": "expected a sample object or list"})
+                continue
+
+            share = len(text) // max(1, len(batch))
+            for raw in batch:
+                try:
+                    if not isinstance(raw, dict):
+                        raise ValueError
+                    raw = {**defaults, **raw}
+                    if "ts" not in raw:
+                        raw["ts"] = datetime.now(timezone.utc)
+                    evt = adapter.validate_python(raw)
+                except (ValueError, ValidationError):
+                    counts["invalid"] += 1
+                    seq = raw.get("seq") if isinstance(raw, dict) else None
+                    if type(seq) is int and seq >= 0:
+                        acks.reject(seq)
+                    continue
+                verdict = await accept_telemetry(evt, share)
+                counts[verdict] += 1
+                if evt.seq is not None:
+                    if verdict == RATE_LIMITED:
+                        acks.reject(evt.seq)
+                    else:
+                        acks.settled(evt.seq)
+            pending += len(batch)
+
+            if pending >= settings.ws_ingest_ack_every or time.monotonic() - last_ack >= interval:
+                await send_ack()
+    except WebSocketDisconnect:
+        pass
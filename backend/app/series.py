@@ -0,0 +1,74 @@
+# app/series.py
+"""
+Column extraction (buffered sample dicts -> NumPy arrays) and resampling
+onto a common time grid.
+
+Fields are dotted paths into the sample, the same notation health rules use:
+"battery_pct", "imu.az", "mic.rms", "fsr.3" (list index). Missing values
+become NaN, so columns from different device types line up.
+"""
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .timeutil import ts_epoch
+
+if TYPE_CHECKING:  # numpy is imported on first use (startup time)
+    import numpy as np
+
+FIELD_RE = re.compile(r"^[a-z_]+(\.[a-z0-9_]+)*$")
+
+
+def field_getter(path: str) -> Callable[[dict], Any]:
+    parts = [int(p) if p.isdigit() else p for p in path.split(".")]
+
+    def get(x: Any) -> Any:
+        for p in parts:
+            if x is None:
+                return None
+            if isinstance(p, int):
+                x = x[p] if isinstance(x, list) and p < len(x) else None
+            else:
+                x = x.get(p) if isinstance(x, dict) else None
+        return x
+    return get
+
+
+def columns(samples: List[dict], fields: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """(n,) epoch timestamps and one (n,) float column per field."""
+    import numpy as np
+
+    n = len(samples)
+    ts = np.fromiter((ts_epoch(x["ts"]) for x in samples), dtype=float, count=n)
+    out = {}
+    for f in fields:
+        get = field_getter(f)
+        col = np.full(n, np.nan)
+        for i, x in enumerate(samples):
+            v = get(x)
+            if isinstance(v, (int, float)):
+                col[i] = v
+        out[f] = col
+    return ts, out
+
+
+def resample(ts: np.ndarray, values: np.ndarray, grid: np.ndarray, max_gap_s: Optional[float] = None) -> np.ndarray:
+    """
+    Linear interpolation of one column onto `grid` (ts ascending). Grid points
+    outside the data, or strictly between samples more than max_gap_s apart,
+    are NaN.
+    """
+    import numpy as np
+
+    ok = ~np.isnan(values)
+    t, v = ts[ok], values[ok]
+    if len(t) == 0:
+        return np.full(len(grid), np.nan)
+    out = np.interp(grid, t, v, left=np.nan, right=np.nan)
+    if max_gap_s is not None and len(t) > 1:
+        i = np.clip(np.searchsorted(t, grid), 1, len(t) - 1)
+        # only points strictly inside a wide gap; exact sample hits keep their value
+        inside = (t[i - 1] < grid) & (grid < t[i])
+        out[inside & ((t[i] - t[i - 1]) > max_gap_s)] = np.nan
+    return out
@@ -0,0 +1,337 @@
+# app/shm_feed.py
+"""
+Shared-memory telemetry feed for other processes on the hub (optional;
+enabled with KONPANION_SHM_FEED_NAME).
+
+Every accepted sample is written into a named ring in /dev/shm. Local
+consumers (ML inference, loggers, ...) map the segment and follow it at their
+own pace, without going through HTTP/WebSocket serialization. The hub never
+waits for readers; a reader that falls more than one ring behind loses the
+oldest records and is told how many.
+
+Layout (little endian):
+
+    header   64 bytes    <4sHHII magic b"KSHM", version 1, flags (1 = closed),
+                         slot size, slot count; write_seq <Q at offset 16
+                         (records published so far); generation <Q at
+                         offset 24 (writer boot id, new for every open)
+    slots    count x slot size, record r lives in slot r % count:
+               <QII      stamp, payload length, crc32(payload)
+               payload   <dqBB hub receive time, seq (-1 = none), device type code,
+                         device_id length; device_id utf-8; one record in the
+                         UDP ingest encoding (see udp_ingest.py)
+
+Single writer (the event loop), any number of readers, no locks. The writer
+sets a slot's stamp to 2r+1, writes the payload, sets it to 2r+2 and only then
+advances write_seq. A reader decodes record r directly from the mapping and
+keeps it only if the stamp was 2r+2 both before and after and the crc
+matches; anything else means the writer lapped it. The crc is what makes
+this safe on weakly ordered CPUs (the Pi's ARM cores), since Python has no
+memory fences.
+
+A hub that crashes never sets the closed flag, and its successor unlinks the
+orphaned segment and creates a new one under the same name. Readers still
+mapped to the old one notice on idle polls: they reattach by name now and
+then and switch over when the generation there differs from theirs.
+
+Reader side, from any process that can import this module:
+
+    from app.shm_feed import ShmFeedReader
+
+    with ShmFeedReader("konpanion") as feed:
+        for sample in feed.follow():
+            ...
+"""
+from __future__ import annotations
+
+import logging
+import struct
+import sys
+import time
+import zlib
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional
+
+from .udp_ingest import DEVICE_CODES, DEVICE_TYPES, decode_records, encode_records
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"KSHM"
+VERSION = 1
+F_CLOSED = 1
+
+HEADER_SIZE = 64
+HEADER = struct.Struct("<4sHHII")
+WRITE_SEQ = struct.Struct("<Q")
+WRITE_SEQ_OFF = 16
+GENERATION = struct.Struct("<Q")
+GENERATION_OFF = 24
+SLOT = struct.Struct("<QII")
+PAYLOAD = struct.Struct("<dqBB")
+
+
+class ShmFeedWriter:
+    def __init__(self):
+        self.name = ""
+        self.slots = 0
+        self.slot_size = 0
+        self.write_seq = 0
+        self.generation = 0
+        self.oversize = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._buf: Optional[memoryview] = None
+
+    @property
+    def active(self) -> bool:
+        return self._buf is not None
+
+    def open(self, name: str, slots: int = 4096, slot_size: int = 256) -> None:
+        size = HEADER_SIZE + slots * slot_size
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a hub that didn't shut down cleanly
+            log.warning("Replacing existing shared-memory segment %r", name)
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._shm, self._buf = shm, shm.buf
+        self.name, self.slots, self.slot_size = name, slots, slot_size
+        self.write_seq = 0
+        self.generation = time.time_ns()
+        self._buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        GENERATION.pack_into(self._buf, GENERATION_OFF, self.generation)
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, 0, slot_size, slots)
+        log.info("Shared-memory feed %r: %d slots x %d bytes", name, slots, slot_size)
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        # tell attached readers this segment is finished (a restarted hub makes a new one)
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, F_CLOSED, self.slot_size, self.slots)
+        self._buf.release()
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def publish(self, sample: dict, recv_ts: Optional[float] = None) -> bool:
+        """
+        Write one accepted sample (model_dump() shape). False if not open or it
+        can't be published (doesn't fit a slot, or a field is out of range for
+        the record encoding, e.g. device_id > 255 bytes); such samples are only
+        counted, never an error for ingest.
+        """
+        buf = self._buf
+        if buf is None:
+            return False
+        did = sample["device_id"].encode("utf-8")
+        seq = sample.get("seq")
+        try:
+            payload = PAYLOAD.pack(
+                time.time() if recv_ts is None else recv_ts,
+                -1 if seq is None else seq,
+                DEVICE_CODES[sample["device_type"]],
+                len(did),
+            ) + did + encode_records([sample])
+        except (struct.error, KeyError, OverflowError):
+            self.oversize += 1
+            return False
+        if SLOT.size + len(payload) > self.slot_size:
+            self.oversize += 1
+            return False
+
+        r = self.write_seq
+        off = HEADER_SIZE + (r % self.slots) * self.slot_size
+        SLOT.pack_into(buf, off, 2 * r + 1, 0, 0)
+        start = off + SLOT.size
+        buf[start:start + len(payload)] = payload
+        SLOT.pack_into(buf, off, 2 * r + 2, len(payload), zlib.crc32(payload))
+        self.write_seq = r + 1
+        WRITE_SEQ.pack_into(buf, WRITE_SEQ_OFF, r + 1)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "published": self.write_seq,
+            "generation": self.generation,
+            "oversize": self.oversize,
+        }
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # before 3.13 attaching registers the segment with this process's resource
+    # tracker, which would unlink the hub's segment when the reader exits
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class ShmFeedReader:
+    """
+    Follows a feed written by ShmFeedWriter. `start` is "latest" (only new
+    records) or "oldest" (everything still in the ring). `lost` counts records
+    that were overwritten before this reader got to them.
+    """
+
+    # how often an idle follow() checks whether the segment was replaced
+    replaced_check_s = 1.0
+
+    def __init__(self, name: str, start: str = "latest", hub_id: str = ""):
+        self.name = name
+        self.hub_id = hub_id
+        self.read = 0
+        self.lost = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._buf: Optional[memoryview] = None
+        self._open(start)
+
+    def _open(self, start: str) -> None:
+        shm = _attach(self.name)
+        magic, version, _flags, slot_size, slots = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError(f"{self.name!r} is not a telemetry feed (version {VERSION})")
+        self._shm, self._buf = shm, shm.buf
+        self.slots, self.slot_size = slots, slot_size
+        self.generation = GENERATION.unpack_from(shm.buf, GENERATION_OFF)[0]
+        ws = self.write_seq
+        self.cursor = ws if start == "latest" else max(0, ws - slots)
+
+    @property
+    def write_seq(self) -> int:
+        return WRITE_SEQ.unpack_from(self._buf, WRITE_SEQ_OFF)[0]
+
+    @property
+    def closed(self) -> bool:
+        """True once the hub has shut this segment down."""
+        return bool(HEADER.unpack_from(self._buf, 0)[2] & F_CLOSED)
+
+    def replaced(self) -> bool:
+        """True if a different writer now owns the name (the hub restarted without closing)."""
+        try:
+            shm = _attach(self.name)
+        except (FileNotFoundError, ValueError):
+            return False  # not recreated yet
+        try:
+            if shm.size < HEADER_SIZE or HEADER.unpack_from(shm.buf, 0)[0] != MAGIC:
+                return False
+            return GENERATION.unpack_from(shm.buf, GENERATION_OFF)[0] != self.generation
+        finally:
+            shm.close()
+
+    def _read(self, r: int) -> Optional[dict]:
+        buf = self._buf
+        off = HEADER_SIZE + (r % self.slots) * self.slot_size
+        want = 2 * r + 2
+        stamp, length, crc = SLOT.unpack_from(buf, off)
+        if stamp != want or length > self.slot_size - SLOT.size:
+            return None
+        p = buf[off + SLOT.size:off + SLOT.size + length]
+        try:
+            recv_ts, seq, dcode, id_len = PAYLOAD.unpack_from(p, 0)
+            o = PAYLOAD.size
+            device_id = bytes(p[o:o + id_len]).decode("utf-8")
+            base = {
+                "device_id": device_id,
+                "device_type": DEVICE_TYPES[dcode],
+                "seq": None if seq < 0 else seq,
+                "hub_ts": recv_ts,
+            }
+            if self.hub_id:
+                base["hub_id"] = self.hub_id
+            samples, _ = decode_records(p, o + id_len, 1, base)
+        except (struct.error, IndexError, KeyError, ValueError, OverflowError, OSError):
+            samples = None
+        ok = zlib.crc32(p) == crc and SLOT.unpack_from(buf, off)[0] == want
+        p.release()
+        return samples[0] if ok and samples else None
+
+    def poll(self, max_items: Optional[int] = None) -> List[dict]:
+        """Samples published since the last call (oldest first), without blocking."""
+        out: List[dict] = []
+        ws = self.write_seq
+        while self.cursor < ws and (max_items is None or len(out) < max_items):
+            if ws - self.cursor > self.slots:
+                self.lost += ws - self.slots - self.cursor
+                self.cursor = ws - self.slots
+            x = self._read(self.cursor)
+            if x is None:
+                off = HEADER_SIZE + (self.cursor % self.slots) * self.slot_size
+                if SLOT.unpack_from(self._buf, off)[0] <= 2 * self.cursor + 2:
+                    break  # writes not visible to this CPU yet; retry on the next poll
+                # overwritten while we looked; skip ahead past what the writer has reached
+                ws = self.write_seq
+                skip_to = max(self.cursor + 1, ws - self.slots + 1)
+                self.lost += skip_to - self.cursor
+                self.cursor = skip_to
+                continue
+            out.append(x)
+            self.cursor += 1
+        self.read += len(out)
+        return out
+
+    def follow(self, idle_s: float = 0.005, reconnect: bool = True) -> Iterator[dict]:
+        """
+        Yield samples as they arrive. When the hub closes the feed (or a
+        restarted hub replaced it) and `reconnect` is set, wait for a new
+        segment and continue from its start.
+        """
+        next_check = time.monotonic() + self.replaced_check_s
+        while True:
+            batch = self.poll()
+            if batch:
+                yield from batch
+                continue
+            if self.closed:
+                if not reconnect:
+                    return
+                self._reconnect(idle_s)
+                continue
+            if reconnect and time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.replaced_check_s
+                if self.replaced():
+                    log.info("Shared-memory feed %r was replaced; reattaching", self.name)
+                    self._reconnect(idle_s)
+                    continue
+            time.sleep(idle_s)
+
+    def _reconnect(self, idle_s: float) -> None:
+        self._close()
+        while True:
+            try:
+                self._open("oldest")
+            except (FileNotFoundError, ValueError):
+                time.sleep(max(idle_s, 0.5))
+                continue
+            if not self.closed:
+                return
+            self._close()
+            time.sleep(max(idle_s, 0.5))
+
+    def _close(self) -> None:
+        if self._buf is not None:
+            self._buf.release()
+            self._buf = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def close(self) -> None:
+        self._close()
+
+    def __enter__(self) -> "ShmFeedReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+feed = ShmFeedWriter()
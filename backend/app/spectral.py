@@ -0,0 +1,178 @@
+# app/spectral.py
+"""
+Windowed spectral features for IMU axes and mic metrics.
+
+Every `interval_s` the hub looks at each device's ring buffer; devices with
+at least `hop` new samples since their last window contribute their newest
+`window` samples. All such windows are stacked into one (devices, channels,
+window) array and processed together with NumPy: detrend, Hann taper, rFFT,
+then per channel
+
+  - band powers for the configured band edges (Hz)
+  - dominant frequency (largest non-DC bin)
+  - spectral energy (total non-DC power)
+
+Sample rate is estimated per device from its window's timestamps, so devices
+reporting at different rates are batched together but binned correctly.
+Results are a few numbers per channel per window instead of raw samples.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+from .config import settings
+from .timeutil import ts_epoch
+
+if TYPE_CHECKING:  # numpy is imported on first use (startup time)
+    import numpy as np
+
+log = logging.getLogger(__name__)
+
+CHANNELS: Tuple[Tuple[str, str], ...] = (
+    ("imu", "ax"), ("imu", "ay"), ("imu", "az"),
+    ("imu", "gx"), ("imu", "gy"), ("imu", "gz"),
+    ("mic", "rms"), ("mic", "peak"), ("mic", "zcr"),
+)
+CHANNEL_NAMES = tuple(f"{a}.{b}" for a, b in CHANNELS)
+
+
+def _window_matrix(samples: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """(channels, n) values (NaN where absent) and (n,) epoch timestamps."""
+    import numpy as np
+
+    n = len(samples)
+    vals = np.full((len(CHANNELS), n), np.nan)
+    ts = np.empty(n)
+    for j, x in enumerate(samples):
+        ts[j] = ts_epoch(x["ts"])
+        for i, (group, key) in enumerate(CHANNELS):
+            g = x.get(group)
+            if g is not None and g.get(key) is not None:
+                vals[i, j] = g[key]
+    return vals, ts
+
+
+def compute_features(
+    windows: np.ndarray,
+    fs: np.ndarray,
+    band_edges_hz: Sequence[float],
+) -> Dict[str, np.ndarray]:
+    """
+    windows: (D, C, W) samples, fs: (D,) sample rates.
+    Returns band_power (D, C, B), dominant_hz (D, C), energy (D, C).
+    Channels containing NaN (field absent in some sample) yield NaN features.
+    """
+    import numpy as np
+
+    d, c, w = windows.shape
+    x = windows - windows.mean(axis=2, keepdims=True)
+    x *= np.hanning(w)
+    power = np.abs(np.fft.rfft(x, axis=2)) ** 2 / w          # (D, C, F)
+
+    freqs = np.fft.rfftfreq(w)[None, :] * fs[:, None]         # (D, F)
+    edges = np.asarray(band_edges_hz, dtype=float)
+    lo, hi = edges[:-1], edges[1:]
+    masks = (freqs[:, None, :] >= lo[None, :, None]) & (freqs[:, None, :] < hi[None, :, None])  # (D, B, F)
+    band_power = np.einsum("dcf,dbf->dcb", power, masks.astype(power.dtype))
+
+    ac = power[:, :, 1:]                                      # drop DC
+    dom = np.argmax(ac, axis=2) + 1
+    dominant_hz = np.take_along_axis(np.broadcast_to(freqs[:, None, :], power.shape), dom[..., None], axis=2)[..., 0]
+    energy = ac.sum(axis=2)
+    return {"band_power": band_power, "dominant_hz": dominant_hz, "energy": energy}
+
+
+@dataclass
+class SpectralEngine:
+    window: int = 128
+    hop: int = 32
+    band_edges_hz: List[float] = field(default_factory=lambda: [0.0, 0.5, 2.0, 5.0, 10.0, 25.0])
+    latest: Dict[str, dict] = field(default_factory=dict)
+    _last_end: Dict[str, float] = field(default_factory=dict)
+
+    def _due(self, store) -> List[Tuple[str, List[dict]]]:
+        due = []
+        for device_id in store.device_ids():
+            samples = [x for x in store.get_device_tail(device_id, self.window) if x.get("imu") or x.get("mic")]
+            if len(samples) < self.window:
+                continue
+            last_end = self._last_end.get(device_id)
+            if last_end is not None:
+                new = sum(1 for x in samples if ts_epoch(x["ts"]) > last_end)
+                if new < self.hop:
+                    continue
+            due.append((device_id, samples))
+        return due
+
+    def run_once(self, store) -> List[dict]:
+        """Compute features for every device that has advanced by >= hop samples."""
+        due = self._due(store)
+        if not due:
+            return []
+        import numpy as np
+
+        mats, fs, ends, ids = [], [], [], []
+        for device_id, samples in due:
+            vals, ts = _window_matrix(samples)
+            span = ts[-1] - ts[0]
+            if span <= 0:
+                continue
+            mats.append(vals)
+            fs.append((len(ts) - 1) / span)
+            ends.append(ts[-1])
+            ids.append((device_id, samples[-1]))
+        if not mats:
+            return []
+
+        feats = compute_features(np.stack(mats), np.asarray(fs), self.band_edges_hz)
+        out = []
+        for k, (device_id, last) in enumerate(ids):
+            channels = {}
+            for ci, name in enumerate(CHANNEL_NAMES):
+                if np.isnan(feats["energy"][k, ci]):
+                    continue
+                channels[name] = {
+                    "dominant_hz": round(float(feats["dominant_hz"][k, ci]), 3),
+                    "energy": float(np.float32(feats["energy"][k, ci])),
+                    "bands": [float(np.float32(v)) for v in feats["band_power"][k, ci]],
+                }
+            result = {
+                "type": "features",
+                "device_id": device_id,
+                "device_type": last.get("device_type"),
+                # JSON-ready: this dict goes out over /ws/telemetry as is
+                "ts": last["ts"].isoformat() if isinstance(last["ts"], datetime) else last["ts"],
+                "fs_hz": round(fs[k], 3),
+                "window": self.window,
+                "bands_hz": self.band_edges_hz,
+                "channels": channels,
+            }
+            self._last_end[device_id] = ends[k]
+            self.latest[device_id] = result
+            out.append(result)
+        return out
+
+
+engine = SpectralEngine(
+    window=settings.spectral_window,
+    hop=settings.spectral_hop,
+    band_edges_hz=list(settings.spectral_bands_hz),
+)
+
+
+async def feature_loop(interval_s: float) -> None:
+    from .state import store, ws_broker
+
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            results = engine.run_once(store)
+        except Exception:
+            log.exception("Spectral feature pass failed")
+            continue
+        for r in results:
+            await ws_broker.broadcast(r)
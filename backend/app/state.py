@@ -2,12 +2,45 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import math
+from datetime import date, datetime
 from typing import Set, Optional, Any
 
+from .alerts import AlertEngine, load_alerts
+from .clock import ClockTracker
 from .config import settings
+from .health_rules import load_rules
+from .ingest_guard import IngestGuard
 from .store import HubStore
 
 
+def _json_default(x: Any) -> Any:
+    if isinstance(x, (datetime, date)):
+        return x.isoformat()
+    raise TypeError(f"{type(x).__name__} is not JSON serializable")
+
+
+def _finite(x: Any) -> Any:
+    """Copy of x with NaN/inf floats replaced by None (browsers' JSON.parse rejects NaN)."""
+    if isinstance(x, float):
+        return x if math.isfinite(x) else None
+    if isinstance(x, dict):
+        return {k: _finite(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_finite(v) for v in x]
+    return x
+
+
+def dumps(msg: Any) -> str:
+    """Compact JSON for clients: datetimes as ISO strings, NaN/inf as null."""
+    try:
+        return json.dumps(msg, separators=(",", ":"), default=_json_default, allow_nan=False)
+    except ValueError:
+        # rare (a NaN reading); only then pay for the copy
+        return json.dumps(_finite(msg), separators=(",", ":"), default=_json_default, allow_nan=False)
+
+
 class WebSocketBroker:
     def __init__(self):
         self.clients: Set[Any] = set()
@@ -23,17 +56,58 @@ class WebSocketBroker:
     async def broadcast(self, msg: Optional[dict]) -> None:
         if not msg:
             return
+        # encoded once for all clients; telemetry dicts (model_dump()) carry datetimes
+        text = dumps(msg)
         dead = []
         async with self._lock:
             for ws in list(self.clients):
                 try:
-                    await ws.send_json(msg)
+                    await ws.send_text(text)
                 except Exception:
                     dead.append(ws)
             for ws in dead:
                 self.remove(ws)
 
 
+class ChangeFeed:
+    """
+    Wakes long-lived readers (SSE streams) when store state changes.
+    The payload itself is pulled from HubStore.changes_since(), so a burst of
+    notifications collapses into a single wake-up per reader.
+    """
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
 # Shared singletons live here (NOT in main.py)
-store = HubStore(hub_id=settings.hub_id, max_samples=settings.max_samples)
+store = HubStore(
+    hub_id=settings.hub_id,
+    max_samples=(
+        settings.compressed_max_samples if settings.telemetry_compression else settings.max_samples
+    ),
+    reorder_window_s=settings.reorder_window_s,
+    compression_block_size=settings.compression_block_size if settings.telemetry_compression else 0,
+    health_rules=load_rules(settings.health_rules_file),
+    rate_window_s=settings.rate_window_s,
+    recent_events=settings.recent_events,
+)
+alert_engine = AlertEngine(load_alerts(settings.alert_rules_file))
+clocks = ClockTracker(tau_s=settings.clock_tau_s)
 ws_broker = WebSocketBroker()
+change_feed = ChangeFeed()
+ingest_guard = IngestGuard(
+    window=settings.ingest_dedupe_window,
+    rate_per_s=settings.ingest_rate_per_s,
+    burst=settings.ingest_burst,
+)
@@ -85,8 +85,7 @@ function renderStream(events) {
   }
 }
 
-async function tick() {
-  // session line
+async function loadSession() {
   try {
     const who = await getJSON("/_whoami");
     const uname = who.session?.user || who.session?.u || "user";
@@ -94,52 +93,122 @@ async function tick() {
   } catch {
     setText("whoamiLine", `Session unavailable (are you logged in?)`);
   }
+}
 
-  // hub snapshot (this should always render nicely even if empty)
-  try {
-    const hub = await getJSON("/api/hub");
-    setText("hubId", hub.hub_id || "—");
-    setText("lastUpdated", new Date().toLocaleTimeString());
-
-    // devices array shape depends on your store; handle common cases
-    const devices = hub.devices || hub.device_list || [];
-    const onlineCount = devices.length || 0;
-    setText("onlineCount", String(onlineCount));
-
-    // issues
-    const issues = hub.issues || [];
-    setText("issueCount", `${issues.length || 0} Active Issues`);
-
-    // per-device cards (fallback: standby)
-    const base = ["VAEL","SNUU","NOOH"];
-    for (const t of base) setDeviceState(t, "standby", null);
-
-    for (const d of devices) {
-      const t = d.device_type || d.type;
-      if (!t) continue;
-      const bat = d.battery_pct ?? d.battery ?? null;
-
-      // simple health heuristic for UI (purely presentational)
-      let state = "ok";
-      if (d.issues && d.issues.length) state = "warn";
-      if (d.low_battery) state = "warn";
-      setDeviceState(t, state, bat);
-    }
+// hub state as last rendered; SSE deltas are merged into hub.devices (keyed by device_id)
+let hub = { devices: {} };
+// active alerts by id; kept current from SSE "alerts" transitions
+let alerts = {};
 
-    renderDeviceList(devices);
+function renderHub() {
+  setText("hubId", hub.hub_id || "—");
+  setText("lastUpdated", new Date().toLocaleTimeString());
 
-    // stream: if you expose last_events, show them; otherwise keep empty
-    renderStream(hub.last_events || hub.events || []);
+  // snapshot devices are keyed by device_id; older shapes used arrays
+  const devices = Array.isArray(hub.devices) ? hub.devices : Object.values(hub.devices || {});
+  setText("onlineCount", String(devices.length || 0));
 
-    // stats (simple UI numbers; real calc later)
-    setText("eps", String(hub.eps || 0));
-    setText("dataToday", `${hub.data_mb_today || 0.0} MB`);
+  // issues (device health) + active alerts
+  const activeAlerts = Object.values(alerts);
+  const issues = (hub.issues || devices.flatMap(d => d.issues || [])).concat(activeAlerts.map(a => a.message));
+  setText("issueCount", `${issues.length || 0} Active Issues`);
 
+  // per-device cards (fallback: standby)
+  const base = ["VAEL","SNUU","NOOH"];
+  for (const t of base) setDeviceState(t, "standby", null);
+
+  for (const d of devices) {
+    const t = d.device_type || d.type;
+    if (!t) continue;
+    const bat = d.battery_pct ?? d.battery ?? null;
+
+    // simple health heuristic for UI (purely presentational)
+    let state = "ok";
+    if (d.issues && d.issues.length) state = "warn";
+    if (d.low_battery) state = "warn";
+    if (activeAlerts.some(a => a.device_id === d.device_id && a.severity === "critical" && a.state === "raised")) state = "bad";
+    setDeviceState(t, state, bat);
+  }
+
+  renderDeviceList(devices);
+
+  // stream: if you expose last_events, show them; otherwise keep empty
+  renderStream(hub.last_events || hub.events || []);
+
+  // stats (simple UI numbers; real calc later)
+  setText("eps", String(hub.eps || 0));
+  setText("dataToday", `${hub.data_mb_today || 0.0} MB`);
+}
+
+async function tick() {
+  // hub snapshot (this should always render nicely even if empty)
+  try {
+    hub = await getJSON("/api/hub");
+    renderHub();
     setPill("apiStatusPill", "apiStatusText", true, "Operational");
   } catch (e) {
     setPill("apiStatusPill", "apiStatusText", false, `Hub API error`);
   }
 }
 
-tick();
-setInterval(tick, 2000);
+function startPolling() {
+  tick();
+  setInterval(tick, 2000);
+}
+
+// One long-lived SSE connection instead of polling; EventSource resends
+// Last-Event-ID on reconnect so only missed deltas come back.
+function startStream(lastEventId) {
+  const url = lastEventId
+    ? `/api/hub/stream?last_event_id=${encodeURIComponent(lastEventId)}`
+    : "/api/hub/stream";
+  const es = new EventSource(url, { withCredentials: true });
+
+  es.addEventListener("snapshot", (ev) => {
+    hub = JSON.parse(ev.data);
+    renderHub();
+    setPill("apiStatusPill", "apiStatusText", true, "Operational");
+  });
+
+  es.addEventListener("devices", (ev) => {
+    const delta = JSON.parse(ev.data);
+    hub.devices = hub.devices || {};
+    for (const d of delta.devices || []) hub.devices[d.device_id] = d;
+    if (delta.counters) Object.assign(hub, delta.counters);
+    renderHub();
+  });
+
+  // full active set on connect/resync, then only raised/cleared/acknowledged transitions
+  es.addEventListener("alerts", (ev) => {
+    const msg = JSON.parse(ev.data);
+    if (msg.active) alerts = Object.fromEntries(msg.active.map(a => [a.id, a]));
+    for (const t of msg.transitions || []) {
+      if (t.transition === "cleared") delete alerts[t.alert.id];
+      else alerts[t.alert.id] = t.alert;
+    }
+    renderHub();
+  });
+
+  es.onopen = () => setPill("apiStatusPill", "apiStatusText", true, "Operational");
+  es.onerror = () => setPill("apiStatusPill", "apiStatusText", false, "Reconnecting…");
+}
+
+// Server-rendered snapshot + session (dashboard page); other pages fetch them.
+function readBootstrap() {
+  const el = document.getElementById("bootstrap");
+  if (!el) return null;
+  try { return JSON.parse(el.textContent); } catch { return null; }
+}
+
+const boot = readBootstrap();
+if (boot) {
+  hub = boot.hub || hub;
+  renderHub();
+  const uname = boot.session?.user || boot.session?.u || "user";
+  setText("whoamiLine", `Signed in as ${uname}`);
+} else {
+  loadSession();
+}
+
+if (window.EventSource) startStream(boot?.event_id);
+else startPolling();
@@ -0,0 +1,101 @@
+# app/status_index.py
+"""
+Secondary indexes over device status for filtered/paginated listings
+(/api/devices?device_type=...&connected=...).
+
+HubStore reports every status change here (old -> new), and only the sets
+whose membership actually changed are touched, so ingest pays a few set
+operations per sample at most. last_seen changes on nearly every sample, so
+it is kept as a plain dict and the sorted view used for range filters and
+"most recent first" ordering is rebuilt on the next query after a change.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+from .models import DeviceStatus
+from .timeutil import ts_epoch
+
+
+def _seen(s: DeviceStatus) -> Optional[float]:
+    return ts_epoch(s.last_seen) if s.last_seen is not None else None
+
+
+class StatusIndex:
+    def __init__(self):
+        self._ids: Set[str] = set()
+        self._by_type: Dict[str, Set[str]] = {}
+        self._connected: Set[str] = set()
+        self._issues: Set[str] = set()
+        self._last_seen: Dict[str, float] = {}
+        self._by_seen: Optional[List[Tuple[float, str]]] = None   # None = rebuild on next query
+        self._lock = threading.Lock()
+
+    def update(self, old: Optional[DeviceStatus], new: DeviceStatus) -> None:
+        device_id = new.device_id
+        with self._lock:
+            if old is None:
+                self._ids.add(device_id)
+            if old is None or old.device_type != new.device_type:
+                if old is not None:
+                    self._by_type.get(old.device_type, set()).discard(device_id)
+                self._by_type.setdefault(new.device_type, set()).add(device_id)
+            if old is None or old.connected != new.connected:
+                (self._connected.add if new.connected else self._connected.discard)(device_id)
+            if old is None or bool(old.issues) != bool(new.issues):
+                (self._issues.add if new.issues else self._issues.discard)(device_id)
+            if old is None or old.last_seen != new.last_seen:
+                seen = _seen(new)
+                if seen is None:
+                    self._last_seen.pop(device_id, None)
+                else:
+                    self._last_seen[device_id] = seen
+                self._by_seen = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._by_type.clear()
+            self._connected.clear()
+            self._issues.clear()
+            self._last_seen.clear()
+            self._by_seen = None
+
+    def select(
+        self,
+        device_type: Optional[str] = None,
+        connected: Optional[bool] = None,
+        has_issues: Optional[bool] = None,
+        seen_after: Optional[float] = None,
+        seen_before: Optional[float] = None,
+        order: str = "device_id",
+    ) -> List[str]:
+        """
+        Matching device ids, ordered by device_id or by last_seen (newest
+        first; never-seen devices last). Range bounds are inclusive epoch seconds.
+        """
+        with self._lock:
+            ids = self._ids if device_type is None else self._by_type.get(device_type, set())
+            if connected is not None:
+                ids = ids & self._connected if connected else ids - self._connected
+            if has_issues is not None:
+                ids = ids & self._issues if has_issues else ids - self._issues
+
+            if seen_after is None and seen_before is None and order == "device_id":
+                return sorted(ids)
+
+            if self._by_seen is None:
+                self._by_seen = sorted((t, d) for d, t in self._last_seen.items())
+            by_seen = self._by_seen
+            if seen_after is not None or seen_before is not None:
+                lo = bisect_left(by_seen, (seen_after,)) if seen_after is not None else 0
+                hi = bisect_right(by_seen, (seen_before, "\U0010ffff")) if seen_before is not None else len(by_seen)
+                in_range = by_seen[lo:hi]
+                if order == "device_id":
+                    return sorted(d for _, d in in_range if d in ids)
+                return [d for _, d in reversed(in_range) if d in ids]
+
+            ordered = [d for _, d in reversed(by_seen) if d in ids]
+            return ordered + sorted(d for d in ids if d not in self._last_seen)
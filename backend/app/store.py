@@ -1,108 +1,411 @@
 from __future__ import annotations
+import threading
+import time
 from dataclasses import dataclass, field
-from typing import Dict, Deque, Any, Optional, List
-from collections import deque
+from typing import Dict, Any, Optional, List, Tuple
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 
+from .counters import HubCounters
+from .health_rules import HealthEngine, RuleSpec, STALE_FLAG, STALE_MESSAGE, load_rules
 from .models import TelemetryUnion, DeviceStatus, HubSnapshot
+from .status_index import StatusIndex
+from .timeutil import ts_epoch
+
 
 @dataclass
 class RingBuffer:
+    """
+    Bounded telemetry buffer kept in timestamp order.
+
+    Device clocks and Wi-Fi retries reorder samples, so anything up to
+    `reorder_window_s` older than the newest sample is inserted in place.
+    Older samples are counted as `late` and dropped; a repeat of an already
+    buffered timestamp is counted as a `duplicate` and dropped.
+    """
     maxlen: int
-    items: Deque[dict] = field(default_factory=deque)
+    reorder_window_s: float = 5.0
+    late: int = 0
+    duplicates: int = 0
+    # parallel arrays; entries before _head are evicted and compacted lazily
+    _ts: List[float] = field(default_factory=list, repr=False)
+    _items: List[dict] = field(default_factory=list, repr=False)
+    _head: int = 0
 
-    def push(self, x: dict) -> None:
-        if self.items.maxlen != self.maxlen:
-            self.items = deque(self.items, maxlen=self.maxlen)
-        self.items.append(x)
+    def __len__(self) -> int:
+        return len(self._ts) - self._head
+
+    def push(self, x: dict) -> bool:
+        """Insert a sample. Returns False if it was dropped as late/duplicate."""
+        t = ts_epoch(x["ts"])
+        ts = self._ts
+        newest = ts[-1] if len(ts) > self._head else None
+
+        if newest is None or t > newest:
+            ts.append(t)
+            self._items.append(x)
+        else:
+            if t < newest - self.reorder_window_s:
+                self.late += 1
+                return False
+            i = bisect_left(ts, t, self._head)
+            if i < len(ts) and ts[i] == t:
+                self.duplicates += 1
+                return False
+            ts.insert(i, t)
+            self._items.insert(i, x)
+
+        if len(self) > self.maxlen:
+            self._head = len(ts) - self.maxlen
+            if self._head >= max(64, self.maxlen // 2):
+                del ts[:self._head]
+                del self._items[:self._head]
+                self._head = 0
+        return True
 
     def to_list(self) -> List[dict]:
-        return list(self.items)
+        return self._items[self._head:]
+
+    def tail(self, n: int) -> List[dict]:
+        """The newest n samples, oldest first."""
+        return self._items[max(self._head, len(self._items) - n):]
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[dict]:
+        """Samples with start <= ts <= end (epoch seconds, either bound optional)."""
+        lo = self._head if start is None else bisect_left(self._ts, start, self._head)
+        hi = len(self._ts) if end is None else bisect_right(self._ts, end, self._head)
+        return self._items[lo:hi]
+
+    def latest_at(self, t: float) -> Optional[dict]:
+        """Most recent sample with ts <= t."""
+        i = bisect_right(self._ts, t, self._head)
+        return self._items[i - 1] if i > self._head else None
+
+    def pop_older(self, cutoff: float, min_count: int = 1) -> List[dict]:
+        """Remove and return samples with ts < cutoff, but only if there are at least min_count."""
+        lo = self._head
+        hi = bisect_left(self._ts, cutoff, lo)
+        if hi - lo < min_count:
+            return []
+        out = self._items[lo:hi]
+        del self._ts[lo:hi]
+        del self._items[lo:hi]
+        return out
+
+
+@dataclass
+class DeviceShard:
+    """
+    Everything the hub keeps for one device, guarded by its own lock.
+
+    `status` is an immutable DeviceStatus that is replaced (never mutated) on
+    every change, so readers can hand it out without locking.
+    """
+    device_id: str
+    status: DeviceStatus
+    buffer: RingBuffer
+    changed_at: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
 
 class HubStore:
     """
     Purely event-driven: nothing appears unless a device sends telemetry.
+
+    State is sharded per device. Writers for different devices only contend
+    on the short global sections (shard creation, the change-feed seq, the
+    live counters); readers get immutable DeviceStatus objects and copies of
+    buffered samples, so they never block ingest or see half-applied updates.
     """
-    def __init__(self, hub_id: str, max_samples: int):
+    def __init__(
+        self,
+        hub_id: str,
+        max_samples: int,
+        reorder_window_s: float = 5.0,
+        compression_block_size: int = 0,
+        health_rules: Optional[List[RuleSpec]] = None,
+        rate_window_s: int = 10,
+        recent_events: int = 50,
+    ):
         self.hub_id = hub_id
         self.max_samples = max_samples
+        self.reorder_window_s = reorder_window_s
+        # >0: keep history in compressed blocks of this many samples (see compression.py)
+        self.compression_block_size = compression_block_size
+
+        # shards by device_id; the dict is only replaced/extended under _shards_lock
+        self._shards: Dict[str, DeviceShard] = {}
+        self._shards_lock = threading.Lock()
+
+        # type / connected / has-issues / last_seen indexes for filtered listings,
+        # updated whenever a shard publishes a new status
+        self.index = StatusIndex()
 
-        # status by device_id
-        self.status: Dict[str, DeviceStatus] = {}
+        # device health rules (compiled once; issues kept incrementally per device,
+        # always evaluated under that device's shard lock)
+        self.health = HealthEngine(health_rules if health_rules is not None else load_rules())
 
-        # ring buffers by device_id
-        self.telemetry: Dict[str, RingBuffer] = {}
+        # live counters (events/sec, bytes today, recent events), O(1) per sample
+        self.counters = HubCounters(window_s=rate_window_s, recent=recent_events)
 
-        # last raw event for websocket fanout
+        # last raw event (any device), kept for checkpoints
         self.last_event: Optional[dict] = None
 
-    def upsert_telemetry(self, evt: TelemetryUnion) -> None:
-        # status init
-        if evt.device_id not in self.status:
-            self.status[evt.device_id] = DeviceStatus(
-                hub_id=evt.hub_id,
-                device_id=evt.device_id,
-                device_type=evt.device_type,
-                connected=True,
-                last_seen=evt.ts,
-                battery_pct=evt.battery_pct,
-                rssi_dbm=evt.rssi_dbm,
-                fw_version=evt.fw_version,
-                issues=[]
+        # change feed: store-wide sequence + the seq at which each device last changed.
+        # `epoch` distinguishes process lifetimes so stale Last-Event-IDs are detected.
+        self.epoch = int(time.time())
+        self.seq = 0
+        self._seq_lock = threading.Lock()
+
+    # -- read-only views -------------------------------------------------
+
+    @property
+    def status(self) -> Dict[str, DeviceStatus]:
+        """Current (immutable) status by device_id."""
+        return {k: sh.status for k, sh in list(self._shards.items())}
+
+    def has_device(self, device_id: str) -> bool:
+        return device_id in self._shards
+
+    def device_ids(self) -> List[str]:
+        return list(self._shards)
+
+    def find_devices(self, **filters: Any) -> List[DeviceStatus]:
+        """Statuses matching StatusIndex.select() filters, in its order."""
+        shards = self._shards
+        return [shards[d].status for d in self.index.select(**filters) if d in shards]
+
+    # -- writers -----------------------------------------------------------
+
+    def _touch(self, shard: DeviceShard) -> None:
+        with self._seq_lock:
+            self.seq += 1
+            shard.changed_at = self.seq
+
+    def _publish(self, shard: DeviceShard, status: DeviceStatus) -> None:
+        """Replace a shard's status (caller holds shard.lock)."""
+        self.index.update(shard.status, status)
+        shard.status = status
+        self._touch(shard)
+
+    def _new_buffer(self) -> RingBuffer:
+        if self.compression_block_size > 0:
+            from .compression import CompressedRingBuffer
+            return CompressedRingBuffer(
+                maxlen=self.max_samples,
+                reorder_window_s=self.reorder_window_s,
+                block_size=self.compression_block_size,
             )
-        else:
-            s = self.status[evt.device_id]
-            s.connected = True
-            s.last_seen = evt.ts
+        return RingBuffer(maxlen=self.max_samples, reorder_window_s=self.reorder_window_s)
+
+    def _shard_for(self, evt: TelemetryUnion) -> DeviceShard:
+        shard = self._shards.get(evt.device_id)
+        if shard is not None:
+            return shard
+        with self._shards_lock:
+            shard = self._shards.get(evt.device_id)
+            if shard is None:
+                status = DeviceStatus(
+                    hub_id=evt.hub_id,
+                    device_id=evt.device_id,
+                    device_type=evt.device_type,
+                    connected=True,
+                    last_seen=evt.ts,
+                    battery_pct=evt.battery_pct,
+                    rssi_dbm=evt.rssi_dbm,
+                    fw_version=evt.fw_version,
+                    issues=[]
+                )
+                shard = DeviceShard(evt.device_id, status, self._new_buffer())
+                self.index.update(None, status)
+                # copy-on-write so lock-free readers iterating the old dict are unaffected
+                self._shards = {**self._shards, evt.device_id: shard}
+            return shard
+
+    def upsert_telemetry(self, evt: TelemetryUnion, nbytes: int = 0) -> Optional[dict]:
+        """
+        Apply one sample (`nbytes` = its size on the wire, for the byte counters).
+        Returns the stored sample (for fanout), or None if the buffer dropped it
+        as late/duplicate; a dropped sample only marks the device connected,
+        it doesn't touch readings, health or counters.
+        """
+        # dumped outside the lock; the model is not shared
+        data = evt.model_dump()
+        shard = self._shard_for(evt)
+
+        with shard.lock:
+            s = shard.status
+            # the buffer decides first: a late/duplicate sample must not change the device
+            accepted = shard.buffer.push(data)
+            if not accepted:
+                # ... but it still shows the device is alive (e.g. a retry of
+                # older data after a reconnect), so it ends staleness
+                if self.health.set_flag(evt.device_id, STALE_FLAG, None) or not s.connected:
+                    self._publish(shard, s.model_copy(update={
+                        "connected": True, "issues": self.health.issues(evt.device_id),
+                    }))
+                return None
+
+            update: Dict[str, Any] = {"connected": True}
+            # reordered samples must not move last_seen backwards
+            if s.last_seen is None or ts_epoch(evt.ts) >= ts_epoch(s.last_seen):
+                update["last_seen"] = evt.ts
             if evt.battery_pct is not None:
-                s.battery_pct = evt.battery_pct
+                update["battery_pct"] = evt.battery_pct
             if evt.rssi_dbm is not None:
-                s.rssi_dbm = evt.rssi_dbm
+                update["rssi_dbm"] = evt.rssi_dbm
             if evt.fw_version is not None:
-                s.fw_version = evt.fw_version
-
-        # validate channel counts (no fake data; only flag issues)
-        issues = []
-        if evt.device_type == "SNUU":
-            if evt.fsr is None:
-                issues.append("No FSR payload received.")
-            elif len(evt.fsr) != 6:
-                issues.append(f"Expected 6 FSR channels, got {len(evt.fsr)}.")
-        if evt.device_type == "NOOH":
-            if evt.fsr is not None and len(evt.fsr) != 4:
-                issues.append(f"Expected 4 FSR channels, got {len(evt.fsr)}.")
+                update["fw_version"] = evt.fw_version
 
-        if evt.battery_pct is not None and evt.battery_pct < 15:
-            issues.append("Low battery (<15%).")
+            # health issues (no fake data; only flag issues). Rules re-run only when
+            # their input fields changed; a fresh sample always clears staleness.
+            changed = self.health.set_flag(evt.device_id, STALE_FLAG, None)
+            changed |= self.health.evaluate(evt.device_id, evt.device_type, data)
+            if changed:
+                update["issues"] = self.health.issues(evt.device_id)
 
-        # overwrite issues each update (keeps it current)
-        self.status[evt.device_id].issues = issues
+            self._publish(shard, s.model_copy(update=update))
 
-        # buffer init
-        if evt.device_id not in self.telemetry:
-            self.telemetry[evt.device_id] = RingBuffer(maxlen=self.max_samples)
-        self.telemetry[evt.device_id].push(evt.model_dump())
-
-        self.last_event = evt.model_dump()
+        self.counters.record(evt.device_id, evt.device_type, ts_epoch(evt.ts), evt.seq, nbytes)
+        self.last_event = data
+        return data
 
     def mark_stale_devices(self, stale_after_s: int = 15) -> None:
         now = datetime.utcnow()
-        for s in self.status.values():
-            if s.last_seen is None:
-                s.connected = False
-                continue
-            if now - s.last_seen.replace(tzinfo=None) > timedelta(seconds=stale_after_s):
-                s.connected = False
-                if "Device stale/disconnected." not in s.issues:
-                    s.issues = list(dict.fromkeys(s.issues + ["Device stale/disconnected."]))
+        for shard in list(self._shards.values()):
+            with shard.lock:
+                s = shard.status
+                update: Dict[str, Any] = {}
+                if s.last_seen is None:
+                    update["connected"] = False
+                elif now - s.last_seen.replace(tzinfo=None) > timedelta(seconds=stale_after_s):
+                    update["connected"] = False
+                    if self.health.set_flag(s.device_id, STALE_FLAG, STALE_MESSAGE):
+                        update["issues"] = self.health.issues(s.device_id)
+                if "issues" in update or update.get("connected", s.connected) != s.connected:
+                    self._publish(shard, s.model_copy(update=update))
+
+    # -- readers -----------------------------------------------------------
 
     def snapshot(self) -> HubSnapshot:
         return HubSnapshot(
             hub_id=self.hub_id,
             ts=datetime.utcnow(),
-            devices={k: v for k, v in self.status.items()}
+            devices=self.status,
+            **self.counters.snapshot(),
         )
 
-    def get_device_series(self, device_id: str) -> List[dict]:
-        rb = self.telemetry.get(device_id)
-        return rb.to_list() if rb else []
+    def event_id(self, seq: Optional[int] = None) -> str:
+        return f"{self.epoch}-{self.seq if seq is None else seq}"
+
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """Seq to resume from, or None if the id is missing/from another process lifetime."""
+        try:
+            epoch, seq = (int(x) for x in (event_id or "").split("-", 1))
+        except ValueError:
+            return None
+        if epoch != self.epoch or seq > self.seq:
+            return None
+        return seq
+
+    def changes_since(self, seq: int) -> Tuple[int, List[DeviceStatus]]:
+        """Current seq plus every device whose status changed after `seq` (coalesced)."""
+        # read seq first: a device touched mid-scan is reported now and again next time,
+        # never missed
+        current = self.seq
+        changed = [sh.status for sh in list(self._shards.values()) if sh.changed_at > seq]
+        return current, changed
+
+    def get_device_series(
+        self,
+        device_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[dict]:
+        shard = self._shards.get(device_id)
+        if shard is None:
+            return []
+        with shard.lock:
+            if start is None and end is None:
+                return list(shard.buffer.to_list())
+            return shard.buffer.range(
+                ts_epoch(start) if start is not None else None,
+                ts_epoch(end) if end is not None else None,
+            )
+
+    def get_device_tail(self, device_id: str, n: int) -> List[dict]:
+        """The newest n buffered samples of a device, oldest first."""
+        shard = self._shards.get(device_id)
+        if shard is None:
+            return []
+        with shard.lock:
+            return list(shard.buffer.tail(n))
+
+    def get_device_sample_at(self, device_id: str, ts: datetime) -> Optional[dict]:
+        shard = self._shards.get(device_id)
+        if shard is None:
+            return None
+        with shard.lock:
+            return shard.buffer.latest_at(ts_epoch(ts))
+
+    def buffer_stats(self, device_id: str) -> Dict[str, int]:
+        shard = self._shards.get(device_id)
+        if shard is None:
+            return {"buffered": 0, "late": 0, "duplicates": 0}
+        rb = shard.buffer
+        with shard.lock:
+            return {"buffered": len(rb), "late": rb.late, "duplicates": rb.duplicates}
+
+    def export_state(self) -> dict:
+        """
+        Plain-data copy of status, buffered telemetry and daily counters (used
+        by checkpoints). Compressed history is exported still encoded, so this
+        is cheap enough to run on the event loop.
+        """
+        status, telemetry = {}, {}
+        for device_id, shard in list(self._shards.items()):
+            with shard.lock:
+                status[device_id] = shard.status.model_dump()
+                if self.compression_block_size > 0:
+                    telemetry[device_id] = shard.buffer.export_blocks()
+                else:
+                    telemetry[device_id] = list(shard.buffer.to_list())
+        return {
+            "hub_id": self.hub_id,
+            "status": status,
+            "telemetry": telemetry,
+            "last_event": self.last_event,
+            "counters": self.counters.export_state(),
+        }
+
+    def _restore_buffer(self, saved: Any) -> RingBuffer:
+        rb = self._new_buffer()
+        if isinstance(saved, dict):
+            # compressed blocks (export_blocks)
+            from .compression import exported_samples
+            if self.compression_block_size > 0:
+                rb.restore_blocks(saved)
+                return rb
+            saved = list(exported_samples(saved))
+        for x in saved[-self.max_samples:]:
+            rb.push(x)
+        return rb
+
+    def restore_state(self, state: dict) -> None:
+        """Replace in-memory state with a previously exported one."""
+        telemetry = state.get("telemetry", {})
+        shards: Dict[str, DeviceShard] = {}
+        for device_id, raw in state.get("status", {}).items():
+            rb = self._restore_buffer(telemetry.get(device_id, []))
+            shards[device_id] = DeviceShard(device_id, DeviceStatus.model_validate(raw), rb)
+        with self._shards_lock:
+            self._shards = shards
+            self.index.clear()
+            self.health.reset()
+            for shard in shards.values():
+                self.index.update(None, shard.status)
+                self.health.seed(shard.device_id, shard.status.issues)
+        self.last_event = state.get("last_event")
+        self.counters.restore_state(state.get("counters") or {})
+        for shard in shards.values():
+            self._touch(shard)
@@ -0,0 +1,40 @@
+# app/thresholds.py
+"""
+Pieces shared by health rules and alerts: comparison operators, hysteresis
+checks and validation of user-supplied message templates.
+
+A threshold raises while `value <op> level` holds. With a separate `clear`
+level it stays raised until `value <op> clear` stops holding, so `clear`
+has to lie on the releasing side of the level (op "<", level 10: clear >= 10).
+"""
+from __future__ import annotations
+
+import operator
+from typing import Any, Callable, Dict, Optional
+
+OPS: Dict[str, Callable[[float, float], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def check_format(message: str, **example: Any) -> None:
+    """Raise ValueError unless `message` formats with exactly these placeholders."""
+    try:
+        message.format(**example)
+    except KeyError as e:
+        raise ValueError(f"unknown placeholder {{{e.args[0]}}} in {message!r}; use {sorted(example)}")
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"bad message {message!r}: {e}")
+
+
+def check_hysteresis(name: str, op: str, value: float, clear: Optional[float]) -> None:
+    """Raise ValueError if `clear` sits on the raising side of `value` (`name` prefixes the error)."""
+    if clear is None:
+        return
+    below = op in ("<", "<=")
+    if clear < value if below else clear > value:
+        raise ValueError(f"{name}: clear {clear:g} is on the raising side of {op} {value:g}; "
+                         f"it must be {'>=' if below else '<='} {value:g}")
@@ -0,0 +1,14 @@
+# app/timeutil.py
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any
+
+
+def ts_epoch(ts: Any) -> float:
+    """Sample timestamp -> epoch seconds (naive datetimes are treated as UTC)."""
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    return float(ts)
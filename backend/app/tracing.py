@@ -0,0 +1,192 @@
+# app/tracing.py
+"""
+Per-route request tracing: which endpoints use the Pi's CPU and bandwidth.
+
+TracingMiddleware (middleware.py) times every HTTP request and WebSocket
+session and hands the result to RouteTracer, keyed on the route template
+("/api/device/{device_id}", not the concrete path), so the table stays small.
+
+Always on, O(1) per request:
+  - count, 5xx errors, request/response bytes (as sent, i.e. after gzip)
+  - latency histogram with power-of-two millisecond buckets; percentiles are
+    read off the histogram (bucket upper bound)
+  - the slowest requests of the current and previous window, with a
+    breakdown: `app_ms` until the response started (handler + any request
+    body read), `send_ms` spent sending the body (long for streams)
+
+Detailed tracing is sampled: a fraction `sample_rate` of requests (adjustable
+at runtime) also records a timeline of every ASGI message, kept in a bounded
+log of recent traces.
+
+For WebSockets and SSE streams the "latency" is the session length, which
+isn't useful next to request latencies, so streams only count toward
+bytes/count and are listed under `streams`.
+"""
+from __future__ import annotations
+
+import heapq
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+# upper bounds in ms: 0.25, 0.5, 1, 2, ..., 16384; one overflow bucket after that
+BUCKET_MS: Tuple[float, ...] = tuple(0.25 * 2 ** i for i in range(17))
+
+
+@dataclass
+class RouteStats:
+    count: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    req_bytes: int = 0
+    resp_bytes: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKET_MS) + 1))
+
+    def add(self, ms: float, status: int, req_bytes: int, resp_bytes: int) -> None:
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.req_bytes += req_bytes
+        self.resp_bytes += resp_bytes
+        self.buckets[bisect_left(BUCKET_MS, ms)] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return BUCKET_MS[i] if i < len(BUCKET_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        n = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / n, 3),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "req_bytes": self.req_bytes,
+            "resp_bytes": self.resp_bytes,
+            "avg_resp_bytes": self.resp_bytes // n,
+            # "<=X ms": count, empty buckets left out
+            "histogram": {
+                (f"<={BUCKET_MS[i]:g}" if i < len(BUCKET_MS) else f">{BUCKET_MS[-1]:g}"): c
+                for i, c in enumerate(self.buckets) if c
+            },
+        }
+
+
+@dataclass
+class Trace:
+    """One finished request; `events` only for sampled requests."""
+    route: str
+    method: str
+    path: str
+    status: int
+    started_at: float           # epoch s
+    total_ms: float
+    app_ms: float
+    send_ms: float
+    req_bytes: int
+    resp_bytes: int
+    events: Optional[List[tuple]] = None   # (ms since start, message type, bytes)
+
+    def as_dict(self) -> dict:
+        d = {
+            "route": self.route, "method": self.method, "path": self.path, "status": self.status,
+            "started_at": self.started_at, "total_ms": round(self.total_ms, 3),
+            "app_ms": round(self.app_ms, 3), "send_ms": round(self.send_ms, 3),
+            "req_bytes": self.req_bytes, "resp_bytes": self.resp_bytes,
+        }
+        if self.events is not None:
+            d["events"] = [{"t_ms": round(t, 3), "type": k, "bytes": b} for t, k, b in self.events]
+        return d
+
+
+class RouteTracer:
+    """
+    Aggregates finished requests. Only touched from the event loop (the
+    middleware runs there even for sync endpoints), so no locking.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slowest: int = 20, window_s: float = 300.0, recent: int = 100):
+        self.sample_rate = sample_rate
+        self.slowest_n = slowest
+        self.window_s = window_s
+        self.routes: Dict[str, RouteStats] = {}
+        self.streams: Dict[str, RouteStats] = {}
+        self.traces: Deque[Trace] = deque(maxlen=recent)
+        self.started_at = time.time()
+        # min-heaps of (total_ms, tiebreak, Trace) for the current / previous window
+        self._slow: List[tuple] = []
+        self._slow_prev: List[tuple] = []
+        self._window_end = time.monotonic() + window_s
+        self._n = 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record(self, trace: Trace, stream: bool = False) -> None:
+        table = self.streams if stream else self.routes
+        st = table.get(trace.route)
+        if st is None:
+            st = table[trace.route] = RouteStats()
+        st.add(trace.total_ms, trace.status, trace.req_bytes, trace.resp_bytes)
+        if trace.events is not None:
+            self.traces.append(trace)
+        if stream:
+            return
+
+        now = time.monotonic()
+        if now >= self._window_end:
+            self._slow_prev, self._slow = self._slow, []
+            self._window_end = now + self.window_s
+        self._n += 1
+        item = (trace.total_ms, self._n, trace)
+        if len(self._slow) < self.slowest_n:
+            heapq.heappush(self._slow, item)
+        elif trace.total_ms > self._slow[0][0]:
+            heapq.heapreplace(self._slow, item)
+
+    def slowest(self) -> List[dict]:
+        items = sorted(self._slow + self._slow_prev, key=lambda x: x[0], reverse=True)
+        return [t.as_dict() for _, _, t in items[:self.slowest_n]]
+
+    def reset(self) -> None:
+        self.routes.clear()
+        self.streams.clear()
+        self.traces.clear()
+        self._slow, self._slow_prev = [], []
+        self._window_end = time.monotonic() + self.window_s
+        self.started_at = time.time()
+
+    def stats(self, sort: str = "total_ms") -> dict:
+        """Per-route tables, busiest first by `sort` (total_ms, count or resp_bytes)."""
+        def table(d: Dict[str, RouteStats]) -> Dict[str, dict]:
+            keyed = sorted(d.items(), key=lambda kv: getattr(kv[1], sort), reverse=True)
+            return {route: st.as_dict() for route, st in keyed}
+
+        return {
+            "since": self.started_at,
+            "sample_rate": self.sample_rate,
+            "routes": table(self.routes),
+            "streams": table(self.streams),
+        }
+
+
+tracer = RouteTracer(sample_rate=settings.trace_sample_rate, slowest=settings.trace_slowest)
@@ -0,0 +1,325 @@
+# app/udp_ingest.py
+"""
+Binary UDP telemetry ingest (optional; enabled with KONPANION_UDP_INGEST_PORT).
+
+One datagram carries a batch of samples from one device:
+
+    header   <2sBBBBHI   magic b"KT", version 1, device type (1 VAEL, 2 SNUU, 3 NOOH),
+                         flags, device_id length, sample count, seq of first sample;
+                         flags 0x01 = seq counter restarted (set on the first
+                         datagram after boot), other bits reserved (0)
+    device_id            utf-8
+    records  x count     <dH ts (epoch s, device clock) + field mask, then only the fields
+                         present in the mask, in this order:
+                           0x01 battery_pct   <f
+                           0x02 rssi_dbm      <b
+                           0x04 imu           <6f  ax ay az gx gy gz
+                           0x08 mic           <2f  rms peak
+                           0x10 mic.zcr       <f
+                           0x20 fsr           <B count, then count x <f
+                           0x40 fall_event    <B
+                           0x80 fall_conf     <f
+    tag      8 bytes     HMAC-SHA256(ingest_token, everything above)[:8];
+                         only present (and required) when ingest_token is set
+
+Sample i gets seq = seq0 + i, so UDP samples go through the same replay
+dedupe as HTTP ones, and gaps/reordering in seq are reported per device.
+A captured datagram keeps a valid tag, so UDP samples are admitted strictly:
+a seq far from the device's newest is only accepted as a reboot with the
+reset flag or a device ts newer than anything accepted before (see
+ingest_guard.py); otherwise it is counted as a replay.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import socket
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from .models import NOOHTelemetry, SNUUTelemetry, TelemetryUnion, VAELTelemetry
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"KT"
+VERSION = 1
+TAG_LEN = 8
+RCVBUF_BYTES = 1 << 20
+
+HEADER = struct.Struct("<2sBBBBHI")
+RECORD = struct.Struct("<dH")
+_F = struct.Struct("<f")
+_B = struct.Struct("<B")
+_b = struct.Struct("<b")
+_IMU = struct.Struct("<6f")
+_MIC = struct.Struct("<2f")
+
+F_SEQ_RESET = 0x01     # header flags
+
+F_BATTERY, F_RSSI, F_IMU, F_MIC, F_ZCR, F_FSR, F_FALL, F_FALL_CONF = (1 << i for i in range(8))
+
+DEVICE_TYPES = {1: "VAEL", 2: "SNUU", 3: "NOOH"}
+DEVICE_CODES = {v: k for k, v in DEVICE_TYPES.items()}
+_ADAPTERS = {
+    "VAEL": TypeAdapter(VAELTelemetry),
+    "SNUU": TypeAdapter(SNUUTelemetry),
+    "NOOH": TypeAdapter(NOOHTelemetry),
+}
+_IMU_KEYS = ("ax", "ay", "az", "gx", "gy", "gz")
+
+
+class DatagramError(ValueError):
+    pass
+
+
+def _tag(token: str, body: bytes) -> bytes:
+    return hmac.new(token.encode("utf-8"), body, hashlib.sha256).digest()[:TAG_LEN]
+
+
+def encode_records(samples: List[dict]) -> bytes:
+    """Pack sample dicts (model_dump() shape, ts as datetime or epoch seconds)."""
+    out = bytearray()
+    for x in samples:
+        ts = x["ts"]
+        if isinstance(ts, datetime):
+            ts = (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()
+        mask, body = 0, bytearray()
+        if x.get("battery_pct") is not None:
+            mask |= F_BATTERY
+            body += _F.pack(x["battery_pct"])
+        if x.get("rssi_dbm") is not None:
+            mask |= F_RSSI
+            body += _b.pack(max(-128, min(127, x["rssi_dbm"])))
+        if x.get("imu"):
+            mask |= F_IMU
+            body += _IMU.pack(*(x["imu"][k] for k in _IMU_KEYS))
+        if x.get("mic"):
+            mask |= F_MIC
+            body += _MIC.pack(x["mic"]["rms"], x["mic"]["peak"])
+            if x["mic"].get("zcr") is not None:
+                mask |= F_ZCR
+                body += _F.pack(x["mic"]["zcr"])
+        if x.get("fsr") is not None:
+            mask |= F_FSR
+            body += _B.pack(len(x["fsr"])) + struct.pack(f"<{len(x['fsr'])}f", *x["fsr"])
+        if x.get("fall_event") is not None:
+            mask |= F_FALL
+            body += _B.pack(1 if x["fall_event"] else 0)
+        if x.get("fall_confidence") is not None:
+            mask |= F_FALL_CONF
+            body += _F.pack(x["fall_confidence"])
+        out += RECORD.pack(ts, mask) + body
+    return bytes(out)
+
+
+def encode_datagram(device_type: str, device_id: str, seq0: int, samples: List[dict], token: str = "",
+                    flags: int = 0) -> bytes:
+    """Reference encoder (firmware does the same in C)."""
+    did = device_id.encode("utf-8")
+    body = HEADER.pack(MAGIC, VERSION, DEVICE_CODES[device_type], flags, len(did), len(samples), seq0)
+    body += did + encode_records(samples)
+    return body + _tag(token, body) if token else body
+
+
+def decode_records(data, off: int, count: int, base: dict) -> Tuple[List[dict], int]:
+    """
+    Unpack `count` records starting at `off`; each sample dict starts as a copy
+    of `base`. Returns (samples, offset after the last record). Raises
+    struct.error / IndexError on truncated input and ValueError / OverflowError /
+    OSError on a timestamp datetime can't represent (NaN, 1e20, ...).
+    """
+    samples = []
+    for _ in range(count):
+        ts, mask = RECORD.unpack_from(data, off)
+        off += RECORD.size
+        x: dict = dict(base)
+        x["ts"] = datetime.fromtimestamp(ts, tz=timezone.utc)
+        if mask & F_BATTERY:
+            x["battery_pct"] = _F.unpack_from(data, off)[0]
+            off += 4
+        if mask & F_RSSI:
+            x["rssi_dbm"] = _b.unpack_from(data, off)[0]
+            off += 1
+        if mask & F_IMU:
+            x["imu"] = dict(zip(_IMU_KEYS, _IMU.unpack_from(data, off)))
+            off += _IMU.size
+        if mask & F_MIC:
+            rms, peak = _MIC.unpack_from(data, off)
+            off += _MIC.size
+            x["mic"] = {"rms": rms, "peak": peak}
+            if mask & F_ZCR:
+                x["mic"]["zcr"] = _F.unpack_from(data, off)[0]
+                off += 4
+        if mask & F_FSR:
+            n = data[off]
+            x["fsr"] = list(struct.unpack_from(f"<{n}f", data, off + 1))
+            off += 1 + 4 * n
+        if mask & F_FALL:
+            x["fall_event"] = bool(data[off])
+            off += 1
+        if mask & F_FALL_CONF:
+            x["fall_confidence"] = _F.unpack_from(data, off)[0]
+            off += 4
+        samples.append(x)
+    return samples, off
+
+
+def decode_datagram(data: bytes, token: str, hub_id: str) -> Tuple[str, int, List[dict], int]:
+    """Verify + unpack a datagram into (device_id, seq0, sample dicts, header flags)."""
+    if token:
+        if len(data) < HEADER.size + TAG_LEN:
+            raise DatagramError("short datagram")
+        data, tag = data[:-TAG_LEN], data[-TAG_LEN:]
+        if not hmac.compare_digest(tag, _tag(token, data)):
+            raise PermissionError("bad tag")
+    if len(data) < HEADER.size:
+        raise DatagramError("short datagram")
+
+    magic, version, dcode, flags, id_len, count, seq0 = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise DatagramError("bad magic/version")
+    device_type = DEVICE_TYPES.get(dcode)
+    if device_type is None:
+        raise DatagramError(f"unknown device type {dcode}")
+    off = HEADER.size
+    device_id = data[off:off + id_len].decode("utf-8")
+    off += id_len
+
+    try:
+        samples, off = decode_records(data, off, count, {
+            "hub_id": hub_id, "device_id": device_id, "device_type": device_type,
+        })
+    except (struct.error, IndexError):
+        raise DatagramError("truncated record")
+    except (ValueError, OverflowError, OSError):
+        raise DatagramError("bad record timestamp")
+    if off != len(data):
+        raise DatagramError("trailing bytes")
+    return device_id, seq0, samples, flags
+
+
+@dataclass
+class LinkStats:
+    """Per-device datagram link quality, derived from sample seq numbers."""
+    datagrams: int = 0
+    samples: int = 0
+    lost: int = 0        # seqs skipped so far (decremented if they show up late)
+    reordered: int = 0   # samples that arrived after a higher seq
+    invalid: int = 0     # samples that failed model validation
+    next_seq: int = -1
+
+    def observe(self, seq0: int, count: int) -> None:
+        self.datagrams += 1
+        self.samples += count
+        if self.next_seq < 0:
+            self.next_seq = seq0 + count
+            return
+        if seq0 >= self.next_seq:
+            self.lost += seq0 - self.next_seq
+            self.next_seq = seq0 + count
+        else:
+            self.reordered += count
+            self.lost = max(0, self.lost - count)
+
+
+class UdpIngestServer(asyncio.DatagramProtocol):
+    def __init__(self, queue_size: int = 1024):
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.links: Dict[str, LinkStats] = {}
+        self.bad_auth = 0
+        self.bad_datagrams = 0
+        self.queue_drops = 0
+        self.errors = 0          # unexpected failures while applying a datagram
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self, host: str, port: int) -> None:
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        sock = self.transport.get_extra_info("socket")
+        if sock is not None:
+            # absorb bursts while the worker is busy; the kernel may clamp this to rmem_max
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_BYTES)
+        self._worker = asyncio.create_task(self._drain())
+        log.info("UDP ingest listening on %s:%d", host, port)
+
+    async def stop(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    # protocol callback: keep it trivial, decoding happens in the worker
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.queue_drops += 1
+
+    async def _drain(self) -> None:
+        from .config import settings
+        from .pipeline import accept_telemetry
+
+        while True:
+            data = await self.queue.get()
+            try:
+                device_id, seq0, samples, flags = decode_datagram(data, settings.ingest_token, settings.hub_id)
+            except PermissionError:
+                self.bad_auth += 1
+                continue
+            except (DatagramError, UnicodeDecodeError):
+                self.bad_datagrams += 1
+                continue
+
+            try:
+                await self._apply(device_id, seq0, samples, len(data), accept_telemetry, flags)
+            except Exception:
+                # never let one datagram stop the worker (the socket would keep queueing unread)
+                self.errors += 1
+                log.exception("Failed to apply UDP datagram from %s", device_id)
+
+    async def _apply(self, device_id: str, seq0: int, samples: List[dict], nbytes: int, accept_telemetry,
+                     flags: int = 0) -> None:
+        link = self.links.get(device_id)
+        if link is None:
+            link = self.links[device_id] = LinkStats()
+        link.observe(seq0, len(samples))
+
+        adapter = _ADAPTERS[samples[0]["device_type"]] if samples else None
+        share = nbytes // max(1, len(samples))
+        for i, x in enumerate(samples):
+            x["seq"] = seq0 + i
+            try:
+                evt: TelemetryUnion = adapter.validate_python(x)
+            except ValidationError:
+                link.invalid += 1
+                continue
+            await accept_telemetry(evt, share, strict_seq=True, seq_reset=bool(flags & F_SEQ_RESET))
+
+    def stats(self) -> dict:
+        return {
+            "bad_auth": self.bad_auth,
+            "bad_datagrams": self.bad_datagrams,
+            "queue_drops": self.queue_drops,
+            "errors": self.errors,
+            "devices": {
+                k: {f: v for f, v in vars(link).items() if f != "next_seq"}
+                for k, link in self.links.items()
+            },
+        }
+
+
+server = UdpIngestServer()
@@ -0,0 +1,100 @@
+# bench/compression.py
+"""
+Compression ratio + decode speed for CompressedRingBuffer.
+
+    cd backend && python -m bench.compression [--samples N] [--hz HZ]
+
+Synthesises 6-axis IMU + mic telemetry the way a VAEL board reports it
+(16-bit sensor readings scaled to floats, jittery device timestamps) and
+compares it with the plain RingBuffer (list of dicts) and with a typed-array
+lower bound of 8 bytes per channel per sample.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.compression import CompressedRingBuffer
+from app.models import VAELTelemetry
+from app.store import RingBuffer
+
+
+def _deep_size(x, seen=None) -> int:
+    seen = seen if seen is not None else set()
+    if id(x) in seen:
+        return 0
+    seen.add(id(x))
+    n = sys.getsizeof(x)
+    if isinstance(x, dict):
+        n += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in x.items())
+    elif isinstance(x, list):
+        n += sum(_deep_size(v, seen) for v in x)
+    return n
+
+
+def _samples(n: int, hz: float):
+    rnd = random.Random(42)
+    t = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    axes = [0.0] * 6
+    for i in range(n):
+        t += timedelta(microseconds=int(1_000_000 / hz) + rnd.randint(-300, 300))
+        axes = [a + rnd.gauss(0, 20) for a in axes]
+        # 16-bit ADC counts -> g / deg/s, like the firmware does
+        imu = [round(a) / 16384.0 for a in axes[:3]] + [round(a) / 131.0 for a in axes[3:]]
+        yield VAELTelemetry(
+            hub_id="HUB-BENCH",
+            device_id="VAEL-01",
+            ts=t,
+            battery_pct=round(90 - i / n * 10, 1),
+            rssi_dbm=-50 - rnd.randint(0, 5),
+            fw_version="1.2.0",
+            imu=dict(zip(("ax", "ay", "az", "gx", "gy", "gz"), imu)),
+            mic={"rms": round(rnd.random(), 3), "peak": round(rnd.random(), 3)},
+        ).model_dump()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", type=int, default=60_000)
+    ap.add_argument("--hz", type=float, default=50.0)
+    ap.add_argument("--block-size", type=int, default=256)
+    args = ap.parse_args()
+
+    data = list(_samples(args.samples, args.hz))
+
+    plain = RingBuffer(maxlen=args.samples)
+    for x in data:
+        plain.push(x)
+    plain_bytes = _deep_size(plain.to_list())
+
+    comp = CompressedRingBuffer(maxlen=args.samples, block_size=args.block_size)
+    t0 = time.perf_counter()
+    for x in data:
+        comp.push(x)
+    enc_s = time.perf_counter() - t0
+
+    sealed = sum(b.count for b in comp.blocks)
+    channels = 1 + 6 + 2 + 2  # ts, imu, mic, battery/rssi
+    typed_bytes = sealed * channels * 8
+
+    t0 = time.perf_counter()
+    n = sum(1 for _ in (x for b in comp.blocks for x in b))
+    dec_s = time.perf_counter() - t0
+
+    assert comp.to_list() == plain.to_list(), "round-trip mismatch"
+
+    print(f"samples             {args.samples} @ {args.hz:g} Hz ({sealed} sealed in {len(comp.blocks)} blocks)")
+    print(f"plain RingBuffer    {plain_bytes / args.samples:8.1f} B/sample")
+    print(f"typed arrays        {typed_bytes / sealed:8.1f} B/sample")
+    print(f"compressed blocks   {comp.nbytes / sealed:8.1f} B/sample  "
+          f"(x{plain_bytes / args.samples / (comp.nbytes / sealed):.1f} vs plain, "
+          f"x{typed_bytes / comp.nbytes:.1f} vs typed)")
+    print(f"encode              {args.samples / enc_s:10.0f} samples/s")
+    print(f"decode (streaming)  {n / dec_s:10.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench/startup.py
+"""
+Cold/warm start budget for the hub.
+
+    cd backend && python -m bench.startup [--runs N] [--port P]
+
+For each run a fresh interpreter is measured twice:
+  import   time to `import app.main` (python -X importtime style, in-process)
+  ttfr     time-to-first-response: spawn uvicorn, poll GET /api/hub until 200
+
+The first run after clearing KONPANION_CACHE_DIR is the true cold start
+(no Jinja bytecode / compressed-asset cache); later runs show what a
+systemd `Restart=always` restart costs. Checkpoint restore is disabled so the
+numbers don't depend on hub_state.snap.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env(cache_dir: str) -> dict:
+    env = dict(os.environ)
+    env["KONPANION_CACHE_DIR"] = cache_dir
+    env["KONPANION_SNAPSHOT_PATH"] = ""
+    return env
+
+
+def _clear(cache_dir: str) -> None:
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_ttfr(env: dict, port: int, timeout_s: float = 30.0) -> float:
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout_s:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/hub", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--port", type=int, default=0)
+    args = ap.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="hub-startup-")
+    try:
+        env = _env(cache_dir)
+        rows = []
+        for i in range(args.runs):
+            imp = measure_import(env)
+            if i == 0:
+                # the import above filled the cache; the cold TTFR must start empty too
+                _clear(cache_dir)
+            rows.append((imp, measure_ttfr(env, args.port or _free_port())))
+            label = "cold" if i == 0 else "warm"
+            print(f"run {i + 1} ({label}): import {rows[-1][0] * 1000:7.1f} ms   ttfr {rows[-1][1] * 1000:7.1f} ms")
+        if len(rows) > 1:
+            warm = rows[1:]
+            print(f"warm median: import {statistics.median(r[0] for r in warm) * 1000:.1f} ms   "
+                  f"ttfr {statistics.median(r[1] for r in warm) * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
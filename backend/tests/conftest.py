@@ -0,0 +1,12 @@
+# tests/conftest.py
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+# run from anywhere: make `app` importable, and keep the hub singletons away from
+# the real checkpoint / on-disk caches (settings are read at import time)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("KONPANION_SNAPSHOT_PATH", "")
+os.environ.setdefault("KONPANION_CACHE_DIR", "")
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.alerts import ACKNOWLEDGED, CLEARED, RAISED, AlertEngine, AlertSpec, load_alerts
+
+BATTERY = {"id": "bat", "kind": "threshold", "field": "battery_pct", "op": "<", "value": 10, "clear": 15,
+           "cooldown_s": 60, "message": "Battery {value:.0f}%"}
+
+
+def engine(*specs: dict) -> AlertEngine:
+    return AlertEngine([AlertSpec(**s) for s in specs])
+
+
+def kinds(transitions):
+    return [t["transition"] for t in transitions]
+
+
+def test_threshold_raise_clear_with_hysteresis():
+    e = engine(BATTERY)
+    assert e.observe("d", "VAEL", {"battery_pct": 50}, now=0) == []
+    raised = e.observe("d", "VAEL", {"battery_pct": 8}, now=1)
+    assert kinds(raised) == [RAISED] and raised[0]["alert"]["message"] == "Battery 8%"
+    assert e.observe("d", "VAEL", {"battery_pct": 5}, now=2) == []      # already raised
+    assert e.observe("d", "VAEL", {"battery_pct": 12}, now=3) == []     # inside hysteresis band
+    assert kinds(e.observe("d", "VAEL", {"battery_pct": 16}, now=4)) == [CLEARED]
+    assert e.state()["active"] == []
+
+
+def test_cooldown_suppresses_flapping():
+    e = engine(BATTERY)
+    e.observe("d", "VAEL", {"battery_pct": 5}, now=0)
+    e.observe("d", "VAEL", {"battery_pct": 20}, now=1)
+    assert e.observe("d", "VAEL", {"battery_pct": 5}, now=30) == []     # within 60 s of the clear
+    assert e.stats()["suppressed"] == 1
+    e.observe("d", "VAEL", {"battery_pct": 20}, now=31)
+    assert kinds(e.observe("d", "VAEL", {"battery_pct": 5}, now=62)) == [RAISED]
+
+
+def test_absence_raised_by_tick_cleared_by_sample():
+    e = engine({"id": "off", "kind": "absence", "timeout_s": 30, "cooldown_s": 0, "message": "gone {timeout_s:.0f}s"})
+    e.observe("d", "VAEL", {}, now=0)
+    assert e.tick(now=10) == []
+    raised = e.tick(now=31)
+    assert kinds(raised) == [RAISED] and raised[0]["alert"]["id"] == "d:off"
+    assert e.tick(now=40) == []
+    assert kinds(e.observe("d", "VAEL", {}, now=41)) == [CLEARED]
+
+
+def test_ack():
+    e = engine(BATTERY)
+    alert_id = e.observe("d", "VAEL", {"battery_pct": 5}, now=0)[0]["alert"]["id"]
+    acked = e.acknowledge(alert_id, "alice", now=1)
+    assert kinds(acked) == [ACKNOWLEDGED] and acked[0]["alert"]["acked_by"] == "alice"
+    assert e.acknowledge(alert_id, "bob", now=2) == []                  # already acked
+    assert e.state()["active"][0]["state"] == ACKNOWLEDGED              # threshold alerts stay until cleared
+    with pytest.raises(KeyError):
+        e.acknowledge("d:nope", "alice")
+
+
+def test_fall_auto_clear():
+    e = engine({"id": "fall", "kind": "fall", "min_confidence": 0.6, "cooldown_s": 0, "auto_clear_s": 300,
+                "message": "Fall ({confidence:.2f})"})
+    assert e.observe("n", "NOOH", {"fall_event": True, "fall_confidence": 0.5}, now=0) == []
+    assert kinds(e.observe("n", "NOOH", {"fall_event": True, "fall_confidence": 0.9}, now=1)) == [RAISED]
+    assert e.tick(now=200) == []
+    assert kinds(e.tick(now=301)) == [CLEARED]
+
+
+def test_fall_without_auto_clear_ends_on_ack_and_can_raise_again():
+    e = engine({"id": "fall", "kind": "fall", "cooldown_s": 0, "auto_clear_s": None, "message": "Fall"})
+    alert_id = e.observe("n", "NOOH", {"fall_event": True}, now=0)[0]["alert"]["id"]
+    assert e.tick(now=10_000) == []                                     # stays until acknowledged
+    assert kinds(e.acknowledge(alert_id, "alice", now=10_001)) == [ACKNOWLEDGED, CLEARED]
+    assert e.state()["active"] == []
+    assert kinds(e.observe("n", "NOOH", {"fall_event": True}, now=10_002)) == [RAISED]
+
+
+def test_since_and_resync():
+    e = AlertEngine([AlertSpec(**BATTERY)], log_size=2)
+    for i in range(3):
+        e.observe(f"d{i}", "VAEL", {"battery_pct": 5}, now=i)
+    assert [t["seq"] for t in e.since(1)] == [2, 3]
+    assert e.since(3) == []
+    assert e.since(0) is None                                           # seq 1 already evicted
+
+
+@pytest.mark.parametrize("spec, error", [
+    ({"kind": "threshold", "field": "battery_pct", "message": "x"}, "need 'field' and 'value'"),
+    ({"kind": "threshold", "value": 5, "message": "x"}, "need 'field' and 'value'"),
+    ({"kind": "threshold", "field": "a b", "value": 5, "message": "x"}, "invalid field path"),
+    ({"kind": "threshold", "field": "battery_pct", "value": 5, "message": "{confidence}"}, "unknown placeholder"),
+    ({"kind": "absence", "message": "{value}"}, "unknown placeholder"),
+    ({"kind": "fall", "message": "{confidence:.2q}"}, "bad message"),
+    ({"kind": "threshold", "field": "battery_pct", "op": "<", "value": 10, "clear": 5, "message": "x"},
+     "raising side"),
+    ({"kind": "threshold", "field": "imu.az", "op": ">=", "value": 2, "clear": 3, "message": "x"}, "raising side"),
+])
+def test_bad_specs_fail_at_load(tmp_path, spec, error):
+    path = tmp_path / "alerts.json"
+    path.write_text(json.dumps([{"id": "a", **spec}]))
+    with pytest.raises(ValidationError, match=error):
+        load_alerts(str(path))
+
+
+def test_default_alerts_load():
+    assert [a.id for a in load_alerts()] == ["battery_critical", "offline", "fall"]
+
+
+@pytest.mark.parametrize("op, value, clear", [("<", 10, 10), ("<=", 10, 15), (">", 2, 1.5), (">=", 2, 2)])
+def test_clear_on_the_releasing_side_is_accepted(op, value, clear):
+    AlertSpec(id="a", kind="threshold", field="x", op=op, value=value, clear=clear, message="x")
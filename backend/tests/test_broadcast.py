@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import VAELTelemetry
+from app.spectral import SpectralEngine
+from app.state import WebSocketBroker
+from app.store import HubStore
+
+
+class FakeWS:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+
+    async def send_text(self, text: str) -> None:
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(json.loads(text))
+
+
+def _store_with_imu(n: int = 160, fs: float = 50.0, hz: float = 3.0) -> HubStore:
+    store = HubStore(hub_id="hub", max_samples=1000)
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(n):
+        t = i / fs
+        store.upsert_telemetry(VAELTelemetry(
+            hub_id="hub", device_id="V1", ts=t0 + timedelta(seconds=t),
+            imu={"ax": 0, "ay": 0, "az": math.sin(2 * math.pi * hz * t), "gx": 0, "gy": 0, "gz": 0},
+        ))
+    return store
+
+
+def test_broadcast_telemetry_and_features():
+    store = _store_with_imu()
+    sample = store.get_device_tail("V1", 1)[0]
+    assert isinstance(sample["ts"], datetime)
+    features = SpectralEngine(window=128, hop=32).run_once(store)
+    assert len(features) == 1
+    assert features[0]["channels"]["imu.az"]["dominant_hz"] == pytest.approx(3.0, abs=0.4)
+
+    ok, dead = FakeWS(), FakeWS(fail=True)
+    broker = WebSocketBroker()
+    broker.add(ok)
+    broker.add(dead)
+
+    async def go():
+        await broker.broadcast(sample)
+        await broker.broadcast(features[0])
+        await broker.broadcast(None)
+
+    asyncio.run(go())
+    assert [m.get("type") for m in ok.sent] == [None, "features"]
+    assert datetime.fromisoformat(ok.sent[0]["ts"]) == sample["ts"]
+    assert ok.sent[1]["ts"] == sample["ts"].isoformat()
+    assert broker.clients == {ok}
+
+
+def test_features_are_plain_json():
+    features = SpectralEngine(window=128, hop=32).run_once(_store_with_imu())
+    json.dumps(features)    # no default= needed: safe for any JSON sender
+
+
+
+def test_non_finite_floats_go_out_as_null():
+    ok = FakeWS()
+    broker = WebSocketBroker()
+    broker.add(ok)
+    msg = {"battery_pct": float("nan"), "imu": {"az": float("inf")}, "fsr": [1.0, -float("inf")], "ts": datetime(2026, 1, 1)}
+    asyncio.run(broker.broadcast(msg))
+    assert ok.sent == [{"battery_pct": None, "imu": {"az": None}, "fsr": [1.0, None], "ts": "2026-01-01T00:00:00"}]
+    assert math.isnan(msg["battery_pct"])       # the caller's dict is left alone
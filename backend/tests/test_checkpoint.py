@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import pickle
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import checkpoint, state
+from app.alerts import AlertEngine, load_alerts
+from app.clock import ClockTracker
+from app.compression import SealedBlock
+from app.ingest_guard import DUPLICATE, IngestGuard
+from app.models import VAELTelemetry
+from app.store import HubStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_store(block_size: int = 0) -> HubStore:
+    return HubStore(hub_id="hub", max_samples=2000, reorder_window_s=1.0, compression_block_size=block_size)
+
+
+def fill(store: HubStore, n: int = 600) -> None:
+    for i in range(n):
+        store.upsert_telemetry(VAELTelemetry(
+            hub_id="hub", device_id="V1", ts=T0 + timedelta(seconds=i / 50), seq=i,
+            battery_pct=50 - i / 100, imu={"ax": math.sin(i / 7), "ay": float("nan"), "az": 1e308,
+                                            "gx": 0, "gy": -0.0, "gz": i},
+        ))
+
+
+def same(a: list, b: list) -> bool:
+    # NaN != NaN, so compare through repr
+    return repr(a) == repr(b)
+
+
+@pytest.fixture
+def singletons(monkeypatch):
+    def install(block_size: int = 0):
+        objs = {
+            "store": make_store(block_size),
+            "ingest_guard": IngestGuard(window=64),
+            "alert_engine": AlertEngine(load_alerts()),
+            "clocks": ClockTracker(),
+        }
+        for k, v in objs.items():
+            monkeypatch.setattr(state, k, v)
+        return objs
+    return install
+
+
+def test_file_round_trip_and_corruption(tmp_path):
+    path = str(tmp_path / "hub.ckpt")
+    checkpoint.write_checkpoint(path, {"a": [1, 2.5, None], "ts": T0})
+    assert checkpoint.read_checkpoint(path) == {"a": [1, 2.5, None], "ts": T0}
+
+    raw = bytearray((tmp_path / "hub.ckpt").read_bytes())
+    raw[-3] ^= 0xFF
+    (tmp_path / "hub.ckpt").write_bytes(bytes(raw))
+    with pytest.raises(checkpoint.CheckpointError):
+        checkpoint.read_checkpoint(path)
+    assert checkpoint.restore(path) is False
+    assert checkpoint.read_checkpoint(str(tmp_path / "missing")) is None
+
+
+def test_disallowed_globals_are_rejected(tmp_path):
+    path = str(tmp_path / "hub.ckpt")
+    checkpoint.write_checkpoint(path, {"x": SealedBlock(0, 0.0, 0.0, None, None, b"", ())})
+    with pytest.raises(checkpoint.CheckpointError, match="Disallowed global"):
+        checkpoint.read_checkpoint(path)
+
+
+@pytest.mark.parametrize("saved_with,restored_with", [(0, 0), (64, 64), (64, 0), (0, 64)])
+def test_telemetry_survives_restart(tmp_path, saved_with, restored_with):
+    src = make_store(saved_with)
+    fill(src)
+    path = str(tmp_path / "hub.ckpt")
+    checkpoint.write_checkpoint(path, {"store": src.export_state()})
+
+    dst = make_store(restored_with)
+    dst.restore_state(checkpoint.read_checkpoint(path)["store"])
+    assert same(dst.get_device_tail("V1", 10_000), src.get_device_tail("V1", 10_000))
+    assert dst.find_devices(device_type="VAEL")[0].device_id == "V1"
+    assert dst.counters.snapshot()["events_today"] == src.counters.snapshot()["events_today"]
+
+
+def test_export_keeps_compressed_blocks_encoded(monkeypatch):
+    store = make_store(64)
+    fill(store)
+    assert store._shards["V1"].buffer.blocks
+
+    def no_decode(self):
+        raise AssertionError("decoded a block while exporting")
+    monkeypatch.setattr(SealedBlock, "__iter__", no_decode)
+    exported = store.export_state()["telemetry"]["V1"]
+    assert exported["blocks"] and len(exported["head"]) < 64 + 50
+
+
+def test_warm_restart_keeps_guard_alerts_and_clocks(tmp_path, singletons):
+    old = singletons(64)
+    fill(old["store"], 100)
+    for seq in range(100):
+        old["ingest_guard"].admit("V1", seq)
+    now = T0.timestamp()
+    old["alert_engine"].observe("V1", "VAEL", {"battery_pct": 5.0}, now=now)
+    for i in range(10):
+        old["clocks"].observe("V1", now + i, now + i + 0.25)
+
+    path = str(tmp_path / "hub.ckpt")
+    asyncio.run(checkpoint.save(path))
+
+    new = singletons(64)
+    assert checkpoint.restore(path) is True
+    assert new["ingest_guard"].admit("V1", 99) == DUPLICATE
+    assert new["ingest_guard"].stats()["V1"]["accepted"] == 100
+    assert new["alert_engine"].state()["active"] == old["alert_engine"].state()["active"]
+    assert new["alert_engine"].seq == old["alert_engine"].seq
+    # the restored alert still clears (with hysteresis) and then honours its cooldown
+    assert [t["transition"] for t in new["alert_engine"].observe("V1", "VAEL", {"battery_pct": 20.0}, now=now + 1)] == ["cleared"]
+    assert new["alert_engine"].observe("V1", "VAEL", {"battery_pct": 5.0}, now=now + 2) == []
+    assert new["clocks"].stats() == old["clocks"].stats()
+    assert same(new["store"].get_device_tail("V1", 200), old["store"].get_device_tail("V1", 200))
+
+
+def test_other_hub_checkpoint_is_ignored(tmp_path, singletons):
+    old = singletons()
+    fill(old["store"], 10)
+    path = str(tmp_path / "hub.ckpt")
+    state_ = checkpoint.collect_state()
+    state_["store"]["hub_id"] = "other"
+    checkpoint.write_checkpoint(path, state_)
+    new = singletons()
+    checkpoint.restore(path)
+    assert new["store"].device_ids() == []
+
+
+def test_blocks_pickle_back_to_singletons():
+    store = make_store(64)
+    fill(store, 200)
+    blocks = store.export_state()["telemetry"]["V1"]["blocks"]
+    again = pickle.loads(pickle.dumps(blocks, protocol=5))
+    assert same(list(SealedBlock(*again[0])), list(SealedBlock(*blocks[0])))
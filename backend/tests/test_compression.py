@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import math
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.compression import (
+    CompressedRingBuffer, FloatEncoder, TimestampEncoder, decode_floats, decode_timestamps,
+)
+
+
+def bits(x: float) -> int:
+    return struct.unpack("<Q", struct.pack("<d", x))[0]
+
+
+def roundtrip_ts(values):
+    enc = TimestampEncoder()
+    for v in values:
+        enc.add(v)
+    return list(decode_timestamps(enc.w.getvalue(), len(values)))
+
+
+def roundtrip_floats(values):
+    enc = FloatEncoder()
+    for v in values:
+        enc.add(v)
+    return list(decode_floats(enc.w.getvalue(), len(values)))
+
+
+@pytest.mark.parametrize("dod", [0, 1, -1, 8191, -8192, 8192, -8193, 2**19 - 1, -2**19, 2**19,
+                                 2**31 - 1, -2**31, 2**31, -2**31 - 1, 2**40, -2**40])
+def test_timestamp_bucket_edges(dod):
+    base = 1_767_225_600_000_000
+    values = [base, base + 20_000, base + 40_000 + dod, base + 60_000 + dod]
+    assert roundtrip_ts(values) == values
+
+
+def test_timestamps_before_epoch_and_irregular():
+    values = [-1_000_000, -999_000, 0, 5, 5, 2**52, 2**52 + 1]
+    assert roundtrip_ts(values) == values
+
+
+def test_float_round_trip_is_bit_exact():
+    values = [0.0, -0.0, 1.0, float("nan"), struct.unpack("<d", struct.pack("<Q", 0x7FF8_0000_0000_0001))[0],
+              float("inf"), -float("inf"), 5e-324, -5e-324, 1.7976931348623157e308, 1.5, 1.5, 1.25,
+              3.0, -3.0, 2**53, 0.1, 0.2, 0.30000000000000004]
+    out = roundtrip_floats(values)
+    assert [bits(x) for x in out] == [bits(x) for x in values]
+
+
+def test_float_window_reuse_and_full_width_xor():
+    # 1.0 -> -1.0 flips only the sign bit (lead 0), then a change in the lowest bit (trail 0)
+    values = [1.0, -1.0, -1.0000000000000002, 1.0, math.pi, math.e]
+    assert [bits(x) for x in roundtrip_floats(values)] == [bits(x) for x in values]
+
+
+def make(t0: datetime, i: int) -> dict:
+    return {
+        "device_id": "V1", "seq": i, "ts": t0 + timedelta(milliseconds=20 * i + (i % 3)),
+        "battery_pct": 80 - i / 1000, "fall_event": i % 50 == 0, "fw_version": "1.2" if i < 150 else "1.3",
+        "imu": {"ax": float("nan") if i % 7 == 0 else i / 3, "gz": -i}, "rssi_dbm": None, "bins": [1, i],
+    }
+
+
+def test_compressed_buffer_round_trip():
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rb = CompressedRingBuffer(maxlen=10_000, reorder_window_s=1.0, block_size=32)
+    samples = [make(t0, i) for i in range(300)]
+    for x in samples:
+        assert rb.push(x)
+    assert len(rb.blocks) > 2                       # some sealed, fw_version change split a block
+    assert repr(rb.to_list()) == repr(samples)      # repr: NaN-safe, checks int/bool/None types too
+    out = rb.to_list()
+    assert type(out[0]["seq"]) is int and type(out[0]["fall_event"]) is bool
+    assert out[0]["ts"].tzinfo is not None
+
+
+def test_compressed_buffer_epoch_timestamps_and_queries():
+    rb = CompressedRingBuffer(maxlen=100, reorder_window_s=1.0, block_size=16)
+    for i in range(200):
+        rb.push({"ts": 1000.0 + i * 0.5, "v": float(i)})
+    assert len(rb) >= 100 and len(rb) <= 100 + 16
+    assert rb.tail(3) == [{"ts": 1098.5, "v": 197.0}, {"ts": 1099.0, "v": 198.0}, {"ts": 1099.5, "v": 199.0}]
+    assert [x["v"] for x in rb.range(1060.0, 1061.0)] == [120.0, 121.0, 122.0]
+    assert rb.latest_at(1060.2)["v"] == 120.0
+    assert not rb.push({"ts": 1001.0, "v": 0.0})     # older than the sealed blocks
+    assert rb.late == 1
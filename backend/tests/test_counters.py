@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from app.counters import DailyCounter, HubCounters, RateCounter
+
+# local midnight, so rollover tests don't depend on the machine's timezone
+MIDNIGHT = datetime(2026, 3, 10).timestamp()
+
+
+def test_rate_counter_window():
+    rc = RateCounter(window_s=4)
+    for t in (100.0, 100.5, 101.2, 103.9):
+        rc.add(t)
+    assert rc.total == 4 and rc.rate(103.9) == 1.0
+    assert rc.rate(104.0) == 0.5         # second 100 (two events) expired
+    assert rc.rate(105.5) == 0.25        # 101 expired too
+    rc.add(105.5, n=3)
+    assert rc.total == 4
+    assert rc.rate(120.0) == 0.0 and rc._buckets == [0] * 4   # whole window expired at once
+
+
+def test_rate_counter_clock_stepping_back():
+    rc = RateCounter(window_s=4)
+    rc.add(100.0)
+    rc.add(98.0)            # within the window: counted in its own second
+    assert rc.total == 2
+    rc.add(50.0)            # stepped back past the window: ignored
+    assert rc.total == 2 and rc.rate(100.0) == 0.5
+    assert rc.rate(103.0) == 0.25        # 98's bucket (index 2) was cleared by second 102
+
+
+def test_daily_counter_rolls_over_at_local_midnight():
+    d = DailyCounter()
+    d.add(MIDNIGHT - 10, 100)
+    d.add(MIDNIGHT - 1, 50)
+    assert (d.events, d.bytes) == (2, 150)
+    assert d.read(MIDNIGHT - 0.5).events == 2
+    assert d.read(MIDNIGHT).events == 0
+    d.add(MIDNIGHT + 5, 7)
+    assert (d.events, d.bytes) == (1, 7)
+    assert d.rollover_at == (datetime(2026, 3, 10) + timedelta(days=1)).timestamp()
+
+
+def test_hub_counters_snapshot_and_device_stats():
+    hc = HubCounters(window_s=2, recent=3)
+    for i in range(5):
+        hc.record(f"V{i % 2}", "VAEL", ts=1.0 * i, seq=i, nbytes=1000, now=MIDNIGHT + 10)
+    snap = hc.snapshot(now=MIDNIGHT + 10)
+    assert snap["eps"] == 2.5 and snap["events_today"] == 5 and snap["data_mb_today"] == 0.005
+    assert [e["seq"] for e in snap["last_events"]] == [4, 3, 2]          # newest first
+    assert hc.device_stats(now=MIDNIGHT + 10) == {
+        "V0": {"eps": 1.5, "events_today": 3, "bytes_today": 3000},
+        "V1": {"eps": 1.0, "events_today": 2, "bytes_today": 2000},
+    }
+
+
+def test_export_restore_keeps_today_and_rolls_over_later():
+    hc = HubCounters(window_s=2, recent=3)
+    for i in range(4):
+        hc.record("V1", "VAEL", ts=1.0 * i, seq=i, nbytes=10, now=MIDNIGHT - 60)
+    saved = hc.export_state()
+
+    same_day = HubCounters(window_s=2, recent=3)
+    same_day.restore_state(saved)
+    snap = same_day.snapshot(now=MIDNIGHT - 30)
+    assert snap["events_today"] == 4 and snap["eps"] == 0.0          # rates are not kept
+    assert [e["seq"] for e in snap["last_events"]] == [3, 2, 1]
+    assert same_day.device_stats(now=MIDNIGHT - 30)["V1"]["bytes_today"] == 40
+
+    next_day = HubCounters()
+    next_day.restore_state(saved)
+    assert next_day.snapshot(now=MIDNIGHT + 60)["events_today"] == 0
+    assert next_day.device_stats(now=MIDNIGHT + 60)["V1"]["events_today"] == 0
+
+    empty = HubCounters()
+    empty.restore_state({})                                           # older checkpoints
+    assert empty.snapshot(now=MIDNIGHT)["events_today"] == 0
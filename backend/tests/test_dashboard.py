@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.models import VAELTelemetry
+from app.routers import dashboard
+from app.store import HubStore
+
+
+def ingest(store: HubStore, device_id: str) -> None:
+    store.upsert_telemetry(VAELTelemetry(hub_id="hub", device_id=device_id, ts=datetime.now(timezone.utc)))
+
+
+class RacingStore(HubStore):
+    """A sample arrives while the snapshot is being taken."""
+
+    def snapshot(self):
+        ingest(self, "late")
+        return super().snapshot()
+
+
+def test_bootstrap_event_id_does_not_skip_concurrent_ingest(monkeypatch):
+    from app.main import app
+
+    store = RacingStore(hub_id="hub", max_samples=10)
+    ingest(store, "V1")
+    monkeypatch.setattr(dashboard, "store", store)
+    monkeypatch.setattr(dashboard, "_require_auth", lambda request: None)
+
+    html = TestClient(app).get("/dashboard").text
+    boot = json.loads(re.search(r'<script id="bootstrap" type="application/json">(.*?)</script>', html, re.S).group(1))
+
+    # resuming from the bootstrap id must report the racing device (again, at worst)
+    seq = store.parse_event_id(boot["event_id"])
+    assert seq is not None
+    _, changed = store.changes_since(seq)
+    assert "late" in {d.device_id for d in changed}
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import DeviceStatus, NOOHTelemetry, SNUUTelemetry, VAELTelemetry
+from app.query import MAX_SERIES_DEVICES, QueryError, SeriesParams, run_series
+from app.routers import hub, query
+from app.status_index import StatusIndex
+from app.store import HubStore
+
+NOW = datetime.now(timezone.utc)
+# device -> (model, seconds ago); older than 15 s reads as disconnected (+ stale issue)
+FLEET = {"V1": (VAELTelemetry, 1), "V2": (VAELTelemetry, 100), "S1": (SNUUTelemetry, 10), "N1": (NOOHTelemetry, 200)}
+
+
+def status(device_id: str, device_type: str = "VAEL", connected: bool = True,
+           issues=(), seen: float = 0.0) -> DeviceStatus:
+    return DeviceStatus(
+        hub_id="hub", device_id=device_id, device_type=device_type, connected=connected,
+        last_seen=datetime.fromtimestamp(seen, tz=timezone.utc) if seen else None, issues=list(issues),
+    )
+
+
+def test_status_index_tracks_changes():
+    idx = StatusIndex()
+    a, b, c = status("a", seen=30), status("b", "SNUU", connected=False, seen=10), status("c", issues=["x"])
+    for s in (a, b, c):
+        idx.update(None, s)
+    assert idx.select() == ["a", "b", "c"]
+    assert idx.select(device_type="VAEL", connected=True) == ["a", "c"]
+    assert idx.select(has_issues=True) == ["c"] and idx.select(has_issues=False) == ["a", "b"]
+    assert idx.select(order="last_seen") == ["a", "b", "c"]          # never seen last
+    assert idx.select(seen_after=10, seen_before=20) == ["b"]         # inclusive bounds
+
+    a2 = a.model_copy(update={"device_type": "SNUU", "connected": False, "last_seen": None})
+    idx.update(a, a2)
+    b2 = b.model_copy(update={"last_seen": datetime.fromtimestamp(50, tz=timezone.utc), "issues": ["y"]})
+    idx.update(b, b2)
+    assert idx.select(device_type="VAEL") == ["c"]
+    assert idx.select(device_type="SNUU", connected=False) == ["a", "b"]
+    assert idx.select(order="last_seen") == ["b", "a", "c"]
+    assert idx.select(seen_after=0, order="last_seen") == ["b"]
+    assert idx.select(has_issues=True) == ["b", "c"]
+    idx.clear()
+    assert idx.select() == []
+
+
+@pytest.fixture
+def store(monkeypatch):
+    s = HubStore(hub_id="hub", max_samples=100)
+    for device_id, (model, ago) in FLEET.items():
+        for i in range(3):
+            s.upsert_telemetry(model(
+                hub_id="hub", device_id=device_id, ts=NOW - timedelta(seconds=ago + 2 - i), battery_pct=50 + i,
+            ))
+    monkeypatch.setattr(hub, "store", s)
+    monkeypatch.setattr(query, "store", s)
+    monkeypatch.setattr(query, "cache", query.QueryCache())
+    return s
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(hub.router, prefix="/api")
+    app.include_router(query.router, prefix="/api")
+    return TestClient(app)
+
+
+def ids(body: dict) -> list:
+    return [d["device_id"] for d in body["devices"]]
+
+
+def test_devices_filters(client):
+    assert ids(client.get("/api/devices").json()) == ["N1", "S1", "V1", "V2"]
+    assert ids(client.get("/api/devices?device_type=VAEL").json()) == ["V1", "V2"]
+    assert ids(client.get("/api/devices?connected=false").json()) == ["N1", "V2"]
+    # S1 sends no FSR payload (a default health rule), V2 and N1 are stale
+    assert ids(client.get("/api/devices?has_issues=true").json()) == ["N1", "S1", "V2"]
+    assert ids(client.get("/api/devices?has_issues=false&connected=true").json()) == ["V1"]
+    assert ids(client.get("/api/devices?order=last_seen").json()) == ["V1", "S1", "V2", "N1"]
+    after = (NOW - timedelta(seconds=60)).isoformat().replace("+00:00", "Z")
+    assert ids(client.get("/api/devices", params={"seen_after": after}).json()) == ["S1", "V1"]
+    assert client.get("/api/devices?fields=nope").status_code == 422
+    assert client.get("/api/devices?limit=1001").status_code == 422
+
+
+def test_devices_paging_and_projection(client):
+    seen, offset = [], 0
+    while offset is not None:
+        body = client.get("/api/devices", params={"limit": 3, "offset": offset, "fields": "battery_pct"}).json()
+        assert body["total"] == 4
+        assert all(set(d) == {"device_id", "battery_pct"} for d in body["devices"])
+        seen += ids(body)
+        offset = body["next_offset"]
+    assert seen == ["N1", "S1", "V1", "V2"]
+
+
+def test_series_endpoint(client):
+    body = client.get("/api/series?device_type=VAEL&field=battery_pct&field=imu.az&limit=2").json()
+    assert set(body["devices"]) == {"V1", "V2"}
+    v1 = body["devices"]["V1"]
+    assert v1["battery_pct"] == [51.0, 52.0] and v1["imu.az"] == [None, None] and len(v1["t"]) == 2
+    assert client.get("/api/series?device_id=nope&field=battery_pct").status_code == 400
+    assert client.get("/api/series?field=Bad").status_code == 422
+
+
+def test_run_series_ranges_and_limits(store):
+    now = NOW.timestamp()
+    r = run_series(SeriesParams(field=["battery_pct"], last_s=11), store, now=now)
+    assert {d: v["battery_pct"] for d, v in r["devices"].items() if v["t"]} == {"V1": [50.0, 51.0, 52.0], "S1": [51.0, 52.0]}
+    r = run_series(SeriesParams(field=["battery_pct"], device_id=["V1", "S1", "V1"], device_type="VAEL"), store)
+    assert list(r["devices"]) == ["V1"]
+
+    for i in range(MAX_SERIES_DEVICES):
+        store.upsert_telemetry(VAELTelemetry(hub_id="hub", device_id=f"X{i}", ts=NOW))
+    with pytest.raises(QueryError, match="max"):
+        run_series(SeriesParams(field=["battery_pct"]), store)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from app.health_rules import STALE_FLAG, STALE_MESSAGE, HealthEngine, RuleSpec, load_rules
+from app.models import SNUUTelemetry, VAELTelemetry
+from app.store import HubStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def engine(*specs: dict) -> HealthEngine:
+    return HealthEngine([RuleSpec(**s) for s in specs])
+
+
+def test_threshold_with_hysteresis():
+    e = engine({"id": "bat", "kind": "threshold", "field": "battery_pct", "op": "<", "value": 15,
+                "clear": 20, "message": "Low ({value:.0f}%)"})
+    assert e.evaluate("d", "VAEL", {"battery_pct": 50}) is True    # first sample always reports
+    assert e.issues("d") == []
+    assert e.evaluate("d", "VAEL", {"battery_pct": 50}) is False   # inputs unchanged: not re-run
+    assert e.evaluate("d", "VAEL", {"battery_pct": 10}) is True
+    assert e.issues("d") == ["Low (10%)"]
+    assert e.evaluate("d", "VAEL", {"battery_pct": 17}) is False   # inside the band: stays raised
+    assert e.evaluate("d", "VAEL", {"battery_pct": 25}) is True
+    assert e.issues("d") == []
+
+
+def test_channel_count_and_device_types():
+    e = engine({"id": "fsr", "kind": "channel_count", "field": "fsr", "device_types": ["SNUU"],
+                "expected": 6, "required": True, "message": "{count}/{expected}", "missing_message": "none"})
+    e.evaluate("s", "SNUU", {"fsr": [0] * 6})
+    assert e.issues("s") == []
+    e.evaluate("s", "SNUU", {"fsr": [0] * 4})
+    assert e.issues("s") == ["4/6"]
+    e.evaluate("s", "SNUU", {})
+    assert e.issues("s") == ["none"]
+    e.evaluate("v", "VAEL", {"fsr": [0]})      # rule doesn't apply to VAEL
+    assert e.issues("v") == []
+
+
+def test_rate_of_change():
+    e = engine({"id": "jerk", "kind": "rate_of_change", "field": "imu.az", "max_per_s": 5,
+                "message": "az {rate:.0f}/s"})
+    e.evaluate("d", "VAEL", {"ts": T0, "imu": {"az": 1.0}})
+    e.evaluate("d", "VAEL", {"ts": T0 + timedelta(seconds=1), "imu": {"az": 2.0}})
+    assert e.issues("d") == []
+    e.evaluate("d", "VAEL", {"ts": T0 + timedelta(seconds=1.1), "imu": {"az": 4.0}})
+    assert e.issues("d") == ["az 20/s"]
+
+
+def test_flags_follow_rule_issues():
+    e = engine({"id": "bat", "kind": "threshold", "field": "battery_pct", "value": 15, "message": "low"})
+    e.evaluate("d", "VAEL", {"battery_pct": 5})
+    assert e.set_flag("d", STALE_FLAG, STALE_MESSAGE) is True
+    assert e.set_flag("d", STALE_FLAG, STALE_MESSAGE) is False
+    assert e.issues("d") == ["low", STALE_MESSAGE]
+    assert e.set_flag("d", STALE_FLAG, None) is True
+    assert e.issues("d") == ["low"]
+
+
+@pytest.mark.parametrize("spec, error", [
+    ({"kind": "threshold", "field": "battery_pct", "message": "x"}, "need 'value'"),
+    ({"kind": "channel_count", "field": "fsr", "message": "x"}, "need 'expected'"),
+    ({"kind": "rate_of_change", "field": "imu.az", "message": "x"}, "need 'max_per_s'"),
+    ({"kind": "threshold", "field": "battery_pct", "value": 1, "message": "{count}"}, "unknown placeholder"),
+    ({"kind": "threshold", "field": "battery_pct", "value": 1, "message": "{value:.0q}"}, "bad message"),
+    ({"kind": "threshold", "field": "battery_pct", "value": 1, "message": "{}"}, "bad message"),
+    ({"kind": "channel_count", "field": "fsr", "expected": 6, "message": "ok", "missing_message": "{rate}"},
+     "unknown placeholder"),
+    ({"kind": "threshold", "field": "Battery Pct", "value": 1, "message": "x"}, "invalid field path"),
+    ({"kind": "threshold", "field": "battery_pct", "op": "<", "value": 10, "clear": 5, "message": "x"},
+     "raising side"),
+    ({"kind": "threshold", "field": "mic.rms", "op": ">", "value": 0.5, "clear": 0.8, "message": "x"},
+     "raising side"),
+])
+def test_bad_specs_fail_at_load(tmp_path, spec, error):
+    path = tmp_path / "rules.json"
+    path.write_text(__import__("json").dumps([{"id": "r", **spec}]))
+    with pytest.raises(ValidationError, match=error):
+        load_rules(str(path))
+
+
+def test_default_rules_load():
+    assert {r.id for r in load_rules()} == {"snuu_fsr_channels", "nooh_fsr_channels", "low_battery"}
+
+
+def _vael(device_id: str, battery: float, ts: datetime) -> VAELTelemetry:
+    return VAELTelemetry(hub_id="hub", device_id=device_id, ts=ts, battery_pct=battery)
+
+
+def test_restored_issues_are_rebuilt_on_first_sample():
+    now = datetime.now(timezone.utc)
+    old = HubStore(hub_id="hub", max_samples=10)
+    old.upsert_telemetry(_vael("V1", 5, now))
+    old.upsert_telemetry(SNUUTelemetry(hub_id="hub", device_id="S1", ts=now, fsr=[1, 2]))
+    state = old.export_state()
+    assert old.status["V1"].issues == ["Low battery (<15%)."]
+
+    new = HubStore(hub_id="hub", max_samples=10)
+    new.restore_state(state)
+    assert new.status["V1"].issues == ["Low battery (<15%)."]
+    new.mark_stale_devices(stale_after_s=15)    # still fresh: restored issues untouched
+    assert new.status["V1"].issues == ["Low battery (<15%)."]
+
+    new.upsert_telemetry(_vael("V1", 80, now + timedelta(seconds=1)))
+    assert new.status["V1"].issues == []
+    new.upsert_telemetry(SNUUTelemetry(hub_id="hub", device_id="S1", ts=now + timedelta(seconds=1), fsr=[0] * 6))
+    assert new.status["S1"].issues == []
+
+
+def test_restored_stale_device_keeps_issues_until_it_reports():
+    old = HubStore(hub_id="hub", max_samples=10)
+    old.upsert_telemetry(_vael("V1", 5, datetime.now(timezone.utc) - timedelta(minutes=5)))
+    old.mark_stale_devices(stale_after_s=15)
+    assert old.status["V1"].issues == ["Low battery (<15%).", STALE_MESSAGE]
+
+    new = HubStore(hub_id="hub", max_samples=10)
+    new.restore_state(old.export_state())
+    new.mark_stale_devices(stale_after_s=15)
+    assert new.status["V1"].issues == ["Low battery (<15%).", STALE_MESSAGE]
+    new.upsert_telemetry(_vael("V1", 90, datetime.now(timezone.utc)))
+    assert new.status["V1"].issues == []
+    assert new.status["V1"].connected
+
+
+def test_paths_into_short_or_wrong_shaped_payloads_are_no_reading():
+    rules = [RuleSpec(id="fsr5", kind="threshold", field="fsr.5", op=">", value=100, message="{value}"),
+             RuleSpec(id="ax", kind="rate_of_change", field="imu.ax", max_per_s=1, message="{rate}"),
+             RuleSpec(id="n", kind="channel_count", field="imu", expected=3, message="{count}")]
+    store = HubStore(hub_id="hub", max_samples=10, health_rules=rules)
+    # fsr too short for fsr.5, and no imu at all: no issue, and no error at ingest
+    assert store.upsert_telemetry(SNUUTelemetry(hub_id="hub", device_id="S1", ts=T0, fsr=[1, 2, 3])) is not None
+    assert store.status["S1"].issues == []
+    e = HealthEngine(rules)
+    e.evaluate("s", "SNUU", {"ts": T0, "fsr": 7, "imu": "x"})
+    e.evaluate("s", "SNUU", {"ts": T0 + timedelta(seconds=1), "fsr": [0] * 5 + [1000], "imu": {"ax": "?"}})
+    assert e.issues("s") == ["1000"]
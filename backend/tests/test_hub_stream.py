@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app.alerts import AlertEngine
+from app.models import VAELTelemetry
+from app.routers import hub
+from app.store import HubStore
+
+
+class FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+class FakeFeed:
+    async def wait(self, timeout: float) -> bool:
+        return True
+
+
+@pytest.fixture
+def store(monkeypatch):
+    s = HubStore(hub_id="hub", max_samples=100)
+    monkeypatch.setattr(hub, "store", s)
+    monkeypatch.setattr(hub, "alert_engine", AlertEngine([]))
+    monkeypatch.setattr(hub, "change_feed", FakeFeed())
+    monkeypatch.setattr(hub, "SSE_MIN_PUSH_INTERVAL_S", 0)
+    return s
+
+
+def ingest(store: HubStore, device_id: str, battery: float) -> None:
+    store.upsert_telemetry(VAELTelemetry(
+        hub_id="hub", device_id=device_id, ts=datetime.now(timezone.utc), battery_pct=battery,
+    ))
+
+
+def parse(chunk: str):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if ": " in line)
+    return fields.get("event"), fields.get("id"), json.loads(fields["data"]) if "data" in fields else None
+
+
+class Stream:
+    """Steps the SSE generator one event at a time (skipping retry/keepalive lines)."""
+
+    def __init__(self, last_event_id=None):
+        self.gen = hub._hub_events(FakeRequest(), last_event_id)
+
+    async def next(self, timeout: float = 2.0):
+        return await asyncio.wait_for(self._next(), timeout)
+
+    async def _next(self):
+        while True:
+            chunk = await self.gen.__anext__()
+            if chunk.startswith("id:"):
+                return parse(chunk)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_snapshot_then_deltas(store):
+    ingest(store, "V1", 50)
+    ingest(store, "V2", 60)
+
+    async def go():
+        s = Stream()
+        kind, eid, data = await s.next()
+        assert kind == "snapshot" and set(data["devices"]) == {"V1", "V2"}
+        assert eid == store.event_id()
+        kind, alerts_id, _ = await s.next()
+        assert kind == "alerts" and alerts_id == eid
+        ingest(store, "V2", 61)
+        kind, eid2, data = await s.next()
+        assert kind == "devices" and [d["device_id"] for d in data["devices"]] == ["V2"]
+        assert eid2 == store.event_id()
+
+    run(go())
+
+
+def test_change_racing_the_snapshot_is_not_lost(store):
+    ingest(store, "V1", 50)
+
+    async def go():
+        s = Stream()
+        await s.next()          # snapshot built and sent; generator is suspended here
+        ingest(store, "V1", 40)  # lands before the stream looks for deltas
+        await s.next()          # alerts
+        kind, _, data = await s.next()
+        assert kind == "devices" and data["devices"][0]["battery_pct"] == 40
+
+    run(go())
+
+
+def test_resume_from_last_event_id(store):
+    ingest(store, "V1", 50)
+    ingest(store, "V2", 60)
+
+    async def first():
+        s = Stream()
+        await s.next()              # snapshot
+        ingest(store, "V1", 45)      # not sent yet when the alerts event goes out
+        _, alerts_id, _ = await s.next()
+        return alerts_id
+
+    # resuming from the alerts event id must still deliver that change
+    last_id = run(first())
+
+    async def resume():
+        s = Stream(last_id)
+        kind, _, _ = await s.next()
+        assert kind == "alerts"     # no snapshot when resuming
+        kind, _, data = await s.next()
+        assert kind == "devices" and [d["device_id"] for d in data["devices"]] == ["V1"]
+        assert data["devices"][0]["battery_pct"] == 45
+
+    run(resume())
+
+
+@pytest.mark.parametrize("bad_id", ["garbage", "1-5", None])
+def test_unknown_event_id_gets_snapshot(store, bad_id):
+    ingest(store, "V1", 50)
+
+    async def go():
+        kind, _, _ = await Stream(bad_id).next()
+        assert kind == "snapshot"
+
+    run(go())
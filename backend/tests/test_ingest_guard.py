@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from app.ingest_guard import ACCEPTED, DUPLICATE, RATE_LIMITED, IngestGuard, ReplayWindow, TokenBucket
+
+
+def test_replay_window_marks_and_detects():
+    w = ReplayWindow(8)
+    assert not w.seen(5)
+    w.mark(5)
+    assert w.seen(5)
+    w.mark(3)               # out of order inside the window
+    assert w.seen(3) and not w.seen(4)
+    w.mark(12)              # slides: 5 is now 7 behind, still tracked; 3 fell out
+    assert w.seen(5) and w.seen(12) and not w.seen(3)
+    assert not w.seen(13)
+
+
+def test_replay_window_big_jump_and_counter_reset():
+    w = ReplayWindow(8)
+    w.mark(1)
+    w.mark(1000)                    # jump past the window clears the old bits
+    assert w.seen(1000) and not w.seen(999)
+    assert not w.seen(1)            # far behind: treated as a reboot, not a replay
+    assert w.mark(1) is True        # ... and marking it resets the window
+    assert w.top == 1 and w.seen(1) and not w.seen(1000 - 1)
+
+
+def test_token_bucket_burst_and_refill():
+    b = TokenBucket(rate=2.0, burst=3.0, now=0.0)
+    assert [b.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert b.take(0.5)              # 1 token after 0.5 s at 2/s
+    assert not b.take(0.5)
+    assert b.take(100.0) and b.tokens == 2.0    # capped at burst
+
+
+def test_guard_dedupes_and_rate_limits_per_device():
+    g = IngestGuard(window=16, rate_per_s=1.0, burst=2)
+    assert g.admit("a", 1, now=0.0) == ACCEPTED
+    assert g.admit("a", 1, now=0.0) == DUPLICATE
+    assert g.admit("a", 2, now=0.0) == ACCEPTED
+    assert g.admit("a", 3, now=0.0) == RATE_LIMITED
+    assert g.admit("b", 3, now=0.0) == ACCEPTED             # separate bucket and window
+    # a rate-limited seq isn't marked, so its retry is accepted, not a duplicate
+    assert g.admit("a", 3, now=1.0) == ACCEPTED
+    assert g.admit("a", None, now=1.0) == RATE_LIMITED      # no seq: no dedupe, still limited
+    assert g.stats()["a"] == {"accepted": 3, "duplicates": 1, "rate_limited": 2, "seq_resets": 0, "replays": 0}
+
+
+def test_guard_counts_seq_resets_and_can_be_disabled():
+    g = IngestGuard(window=4)
+    g.admit("a", 100)
+    assert g.admit("a", 0) == ACCEPTED
+    assert g.stats()["a"]["seq_resets"] == 1
+    off = IngestGuard(window=0)
+    assert off.admit("a", 1) == off.admit("a", 1) == ACCEPTED
+
+
+def test_strict_far_away_seq_needs_a_newer_ts_or_reset():
+    g = IngestGuard(window=4)
+    for seq in range(10):
+        assert g.admit("a", seq, ts=100.0 + seq, strict=True) == ACCEPTED
+    assert g.admit("a", 2, ts=102.0, strict=True) == DUPLICATE      # replay
+    assert g.admit("a", 2, ts=102.0) == ACCEPTED                    # non-strict: a reset
+    g = IngestGuard(window=4)
+    g.admit("a", 50, ts=100.0, strict=True)
+    assert g.admit("a", 1000, ts=99.0, strict=True) == DUPLICATE    # far ahead, old ts
+    assert g.admit("a", 0, strict=True) == DUPLICATE                # no ts to vouch for it
+    assert g.admit("a", 0, ts=1.0, strict=True, reset=True) == ACCEPTED
+    assert g.admit("a", 1, ts=2.0, strict=True) == ACCEPTED
+    assert g.stats()["a"]["replays"] == 2 and g.stats()["a"]["seq_resets"] == 1
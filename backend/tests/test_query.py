@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.models import SNUUTelemetry, VAELTelemetry
+from app.query import Query, QueryCache, QueryError, run_query
+from app.store import HubStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+BATTERY = {"V1": [50.0, 40.0, 30.0, 20.0, 10.0, 0.0], "V2": [90.0, 91.0, 92.0, 93.0, 94.0, 95.0]}
+
+
+@pytest.fixture
+def store() -> HubStore:
+    s = HubStore(hub_id="hub", max_samples=100)
+    for device_id, values in BATTERY.items():
+        for i, v in enumerate(values):
+            s.upsert_telemetry(VAELTelemetry(
+                hub_id="hub", device_id=device_id, ts=T0 + timedelta(seconds=10 * i), battery_pct=v,
+            ))
+    # different type, no battery reading: NaN, ignored by the aggregations
+    s.upsert_telemetry(SNUUTelemetry(hub_id="hub", device_id="S1", ts=T0, battery_pct=None))
+    return s
+
+
+def values(result: dict, device_id: str) -> dict:
+    return next(g["values"]["battery_pct"] for g in result["groups"] if g.get("device_id") == device_id)
+
+
+def test_per_device_aggregations(store):
+    q = Query(fields=["battery_pct"], aggs=["avg", "min", "max", "p95", "count"])
+    r = run_query(q, store)
+    v1 = values(r, "V1")
+    assert v1 == {
+        "avg": 25.0, "min": 0.0, "max": 50.0,
+        "p95": round(float(np.percentile(BATTERY["V1"], 95)), 6), "count": 6,
+    }
+    assert values(r, "V2")["p95"] == round(float(np.percentile(BATTERY["V2"], 95)), 6)
+    assert values(r, "S1") == {"avg": None, "min": None, "max": None, "p95": None, "count": 0}
+
+
+def test_time_buckets_and_filters(store):
+    q = Query(fields=["battery_pct"], aggs=["avg", "count"], group_by=["time"], bucket_s=20,
+              device_type="VAEL", start=T0, end=T0 + timedelta(seconds=39))
+    r = run_query(q, store)
+    t0 = T0.timestamp()
+    assert [(g["t"] - t0, g["values"]["battery_pct"]) for g in r["groups"]] == [
+        (0.0, {"avg": (50 + 40 + 90 + 91) / 4, "count": 4}),
+        (20.0, {"avg": (30 + 20 + 92 + 93) / 4, "count": 4}),
+    ]
+    assert "device_id" not in r["groups"][0]
+
+    both = run_query(Query(fields=["battery_pct"], group_by=["device", "time"], bucket_s=30, device_ids=["V2"]), store)
+    assert [(g["device_id"], g["values"]["battery_pct"]["avg"]) for g in both["groups"]] == [("V2", 91.0), ("V2", 94.0)]
+
+
+def test_last_s_is_relative_to_now(store):
+    now = T0.timestamp() + 50
+    r = run_query(Query(fields=["battery_pct"], aggs=["count"], last_s=15, device_ids=["V1"]), store, now=now)
+    assert values(r, "V1") == {"count": 2}
+
+
+def test_too_many_groups_and_bad_requests(store):
+    with pytest.raises(QueryError):
+        run_query(Query(fields=["battery_pct"], group_by=["device", "time"], bucket_s=1e-4), store)
+    with pytest.raises(ValidationError):
+        Query(fields=["Battery"])
+    with pytest.raises(ValidationError):
+        Query(fields=["battery_pct"], start=T0, last_s=5)
+    with pytest.raises(ValidationError):
+        Query(fields=["battery_pct"], start=T0, end=T0 - timedelta(seconds=1))
+
+
+def test_cache_is_invalidated_by_ingest(store):
+    cache = QueryCache(maxsize=2)
+    q = Query(fields=["battery_pct"], aggs=["count"], device_ids=["V1"])
+    first, hit = cache.get_or_run(q, store)
+    assert not hit and cache.get_or_run(q, store) == (first, True)
+    store.upsert_telemetry(VAELTelemetry(hub_id="hub", device_id="V1", ts=T0 + timedelta(seconds=60), battery_pct=1))
+    again, hit = cache.get_or_run(q, store)
+    assert not hit and values(again, "V1") == {"count": 7}
+    assert cache.stats() == {"entries": 2, "hits": 1, "misses": 2}
+
+
+def test_cached_relative_window_still_moves(store):
+    cache = QueryCache()
+    last = T0.timestamp() + 50                  # newest sample
+    q = Query(fields=["battery_pct"], aggs=["count"], last_s=1, device_ids=["V1"])
+    assert values(cache.get_or_run(q, store, now=last + 0.2)[0], "V1") == {"count": 1}
+    assert cache.get_or_run(q, store, now=last + 0.4)[1]          # same quantum: cached
+    later, hit = cache.get_or_run(q, store, now=last + 1.5)      # no ingest in between
+    assert not hit and later["groups"] == []
+    # absolute ranges don't depend on now
+    fixed = Query(fields=["battery_pct"], aggs=["count"], start=T0)
+    cache.get_or_run(fixed, store, now=last)
+    assert cache.get_or_run(fixed, store, now=last + 100)[1]
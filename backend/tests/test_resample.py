@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.clock import MAX_DRIFT, ClockModel, ClockTracker
+from app.models import VAELTelemetry
+from app.query import QueryError, ResampleParams, run_resample
+from app.series import resample
+from app.store import HubStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_resample_interpolates_and_masks_gaps():
+    ts = np.array([0.0, 1.0, 2.0, 10.0])
+    vals = np.array([0.0, 10.0, np.nan, 100.0])   # NaN samples are skipped, not propagated
+    grid = np.array([-1.0, 0.5, 1.0, 5.0, 10.0, 11.0])
+    out = resample(ts, vals, grid)
+    assert np.isnan(out[0]) and np.isnan(out[-1])
+    assert out[1:5].tolist() == [5.0, 10.0, 10.0 + 90.0 * 4 / 9, 100.0]
+    gapped = resample(ts, vals, grid, max_gap_s=2.0)
+    assert np.isnan(gapped[3]) and gapped[1] == 5.0
+    assert np.isnan(resample(ts, np.full(4, np.nan), grid)).all()
+
+
+def test_gap_mask_keeps_exact_sample_hits():
+    ts = np.array([0.0, 10.0])
+    vals = np.array([1.0, 2.0])
+    out = resample(ts, vals, np.array([0.0, 5.0, 10.0]), max_gap_s=5.0)
+    assert out[0] == 1.0 and np.isnan(out[1]) and out[2] == 2.0
+    # a hit on the last sample of a wide gap inside a longer series
+    ts = np.array([0.0, 1.0, 20.0, 21.0])
+    out = resample(ts, np.array([0.0, 1.0, 20.0, 21.0]), np.array([1.0, 10.0, 20.0, 20.5]), max_gap_s=2.0)
+    assert out[0] == 1.0 and np.isnan(out[1]) and out[2:].tolist() == [20.0, 20.5]
+
+
+def test_clock_model_fits_offset_and_drift():
+    m = ClockModel(tau_s=1e6)
+    for i in range(200):
+        x = 1000.0 + 5 * i
+        m.observe(x, x + 2.0 + 50e-6 * (x - 1000.0))
+    _, drift, _ = m.fit()
+    assert drift == pytest.approx(50e-6, rel=1e-6)
+    assert m.correction(np.array([1000.0]))[0] == pytest.approx(2.0, abs=1e-6)
+    # a burst (many device timestamps at one hub instant) adds at most one point
+    hub = 3000.0
+    assert [m.observe(2000.0 + k, hub) for k in range(3)] == [True, False, False]
+    assert not m.observe(1990.0, hub + 1)       # device time didn't move forward
+
+
+def test_clock_drift_is_clamped():
+    m = ClockModel(tau_s=1e6)
+    for i in range(20):
+        m.observe(float(i), i * 1.5)
+    assert m.fit()[1] == MAX_DRIFT
+
+
+def test_run_resample_corrects_each_device_clock():
+    store = HubStore(hub_id="hub", max_samples=1000)
+    clocks = ClockTracker(tau_s=1e6)
+    t0 = T0.timestamp()
+    for device_id, offset in (("A", 0.0), ("B", 3.0)):
+        for i in range(100):
+            dev_ts = t0 + i - offset              # B's clock runs 3 s behind the hub
+            store.upsert_telemetry(VAELTelemetry(
+                hub_id="hub", device_id=device_id, ts=datetime.fromtimestamp(dev_ts, tz=timezone.utc),
+                battery_pct=float(i),
+            ))
+            clocks.observe(device_id, dev_ts, t0 + i)
+
+    p = ResampleParams(stream=["A:battery_pct", "B:battery_pct"], start=T0 + timedelta(seconds=10),
+                       end=T0 + timedelta(seconds=12), step_s=0.5)
+    r = run_resample(p, store, clocks)
+    assert r["series"]["A:battery_pct"] == r["series"]["B:battery_pct"] == [10.0, 10.5, 11.0, 11.5, 12.0]
+
+    raw = run_resample(p.model_copy(update={"correct_clock": False}), store, clocks)
+    assert raw["series"]["B:battery_pct"] == [13.0, 13.5, 14.0, 14.5, 15.0]
+
+
+def test_run_resample_rejects_bad_requests():
+    store = HubStore(hub_id="hub", max_samples=10)
+    with pytest.raises(QueryError, match="unknown device"):
+        run_resample(ResampleParams(stream=["X:battery_pct"], last_s=10), store, ClockTracker())
+    with pytest.raises(QueryError, match="grid"):
+        run_resample(ResampleParams(stream=["X:battery_pct"], last_s=1e6, step_s=1), store, ClockTracker())
+    with pytest.raises(ValueError):
+        ResampleParams(stream=["no-field"])
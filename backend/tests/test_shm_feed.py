@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+
+import pytest
+
+from app import shm_feed
+from app.shm_feed import ShmFeedReader, ShmFeedWriter
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    # reader and writer share this process, so skip the reader's resource-tracker
+    # workaround (it would unregister the writer's own registration)
+    monkeypatch.setattr(shm_feed, "_attach", lambda name: shared_memory.SharedMemory(name=name))
+    w = ShmFeedWriter()
+    w.open(f"konp_test_{os.getpid()}_{next(_names)}", slots=16, slot_size=128)
+    yield w
+    w.close()
+
+
+def sample(i: int, **kw) -> dict:
+    x = {"device_id": "VAEL-1", "device_type": "VAEL", "seq": i, "ts": 1767225600.0 + i, "battery_pct": 50.0}
+    x.update(kw)
+    return x
+
+
+def test_publish_and_follow(feed):
+    r = ShmFeedReader(feed.name)
+    assert r.poll() == []
+    for i in range(5):
+        assert feed.publish(sample(i), recv_ts=100.0 + i)
+    got = r.poll()
+    assert [x["seq"] for x in got] == [0, 1, 2, 3, 4]
+    assert got[0]["device_id"] == "VAEL-1" and got[0]["device_type"] == "VAEL"
+    assert got[0]["battery_pct"] == 50.0 and got[0]["hub_ts"] == 100.0
+    assert got[0]["ts"] == datetime.fromtimestamp(1767225600.0, tz=timezone.utc)
+    assert r.poll() == [] and r.lost == 0
+    r.close()
+
+
+def test_overrun_is_counted(feed):
+    r = ShmFeedReader(feed.name, start="oldest")
+    for i in range(40):
+        feed.publish(sample(i))
+    got = r.poll()
+    assert [x["seq"] for x in got] == list(range(24, 40))
+    assert r.lost == 24
+    r.close()
+
+
+@pytest.mark.parametrize("bad", [
+    {"device_id": "x" * 300},          # device_id length is one byte
+    {"fsr": [0.0] * 300},              # fsr count is one byte
+    {"seq": 2 ** 64},                  # seq is an int64
+    {"fsr": [0.0] * 40},               # encodes fine but doesn't fit a 128-byte slot
+])
+def test_unpublishable_sample_is_counted(feed, bad):
+    assert feed.publish(sample(0, **bad)) is False
+    assert feed.oversize == 1
+    assert feed.publish(sample(1))
+    assert feed.stats()["published"] == 1
+
+
+def test_oversized_sample_does_not_fail_ingest(feed, monkeypatch):
+    from app import pipeline
+    from app.models import VAELTelemetry
+
+    monkeypatch.setattr(pipeline, "shm_feed", feed)
+    evt = VAELTelemetry(hub_id="h", device_id="V" * 300, ts=datetime.now(timezone.utc), battery_pct=50)
+    assert asyncio.run(pipeline.accept_telemetry(evt)) == "accepted"
+    assert feed.oversize == 1
+
+
+def test_reader_sees_close(feed):
+    r = ShmFeedReader(feed.name)
+    feed.publish(sample(0))
+    name = feed.name
+    feed.close()
+    assert r.closed
+    # what was published before the close is still delivered, then follow() ends
+    assert [x["seq"] for x in r.follow(reconnect=False)] == [0]
+    r.close()
+    with pytest.raises(FileNotFoundError):
+        ShmFeedReader(name)
+
+
+def test_reader_follows_a_hub_that_restarted_without_closing(feed, monkeypatch):
+    r = ShmFeedReader(feed.name)
+    monkeypatch.setattr(r, "replaced_check_s", 0.0)
+    feed.publish(sample(0))
+    it = r.follow(idle_s=0.001)
+    assert next(it)["seq"] == 0
+    assert not r.replaced()
+
+    # the hub crashed: its segment is never marked closed; the next hub replaces it
+    restarted = ShmFeedWriter()
+    restarted.open(feed.name, slots=16, slot_size=128)
+    assert restarted.generation != feed.generation
+    assert not r.closed and r.replaced()
+    restarted.publish(sample(7))
+    assert next(it)["seq"] == 7
+    assert r.generation == restarted.generation
+    r.close()
+    # `feed` now maps an unlinked segment; the fixture still releases it
+    feed._shm.unlink = lambda: None
+    restarted.close()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from app.store import RingBuffer
+
+
+def s(t: float) -> dict:
+    return {"ts": t}
+
+
+def ts(rb: RingBuffer) -> list:
+    return [x["ts"] for x in rb.to_list()]
+
+
+def test_reorders_within_window():
+    rb = RingBuffer(maxlen=10, reorder_window_s=5.0)
+    for t in (10.0, 12.0, 11.0, 7.5, 13.0):
+        assert rb.push(s(t))
+    assert ts(rb) == [7.5, 10.0, 11.0, 12.0, 13.0]
+
+
+def test_late_and_duplicate_samples_are_counted_and_dropped():
+    rb = RingBuffer(maxlen=10, reorder_window_s=5.0)
+    rb.push(s(100.0))
+    assert not rb.push(s(94.9))         # older than newest - window
+    assert rb.push(s(95.0))             # exactly at the edge still goes in
+    assert not rb.push(s(100.0))
+    assert not rb.push(s(95.0))
+    assert (rb.late, rb.duplicates) == (1, 2)
+    assert ts(rb) == [95.0, 100.0]
+
+
+def test_capacity_evicts_oldest_and_compacts():
+    rb = RingBuffer(maxlen=100, reorder_window_s=5.0)
+    for i in range(1000):
+        rb.push(s(float(i)))
+    assert len(rb) == 100
+    assert ts(rb) == [float(i) for i in range(900, 1000)]
+    assert len(rb._ts) < 200                     # evicted entries don't pile up
+    assert rb.push(s(996.5))                     # late insert after compaction
+    assert ts(rb)[-5:] == [996.0, 996.5, 997.0, 998.0, 999.0]
+
+
+def test_range_tail_and_latest_at():
+    rb = RingBuffer(maxlen=5, reorder_window_s=5.0)
+    for i in range(8):
+        rb.push(s(float(i)))
+    assert [x["ts"] for x in rb.range(4.0, 6.0)] == [4.0, 5.0, 6.0]
+    assert [x["ts"] for x in rb.range(None, 3.5)] == [3.0]       # 0..2 evicted
+    assert [x["ts"] for x in rb.range(6.5)] == [7.0]
+    assert [x["ts"] for x in rb.tail(2)] == [6.0, 7.0]
+    assert len(rb.tail(50)) == 5
+    assert rb.latest_at(5.5)["ts"] == 5.0
+    assert rb.latest_at(2.9) is None
+
+
+def test_pop_older_respects_min_count():
+    rb = RingBuffer(maxlen=10, reorder_window_s=5.0)
+    for i in range(6):
+        rb.push(s(float(i)))
+    assert rb.pop_older(3.0, min_count=4) == []
+    assert [x["ts"] for x in rb.pop_older(3.0, min_count=3)] == [0.0, 1.0, 2.0]
+    assert ts(rb) == [3.0, 4.0, 5.0]
+
+
+def test_dropped_sample_does_not_change_the_device():
+    from datetime import datetime, timedelta, timezone
+
+    from app.models import VAELTelemetry
+    from app.store import HubStore
+
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    store = HubStore(hub_id="hub", max_samples=10, reorder_window_s=5.0)
+    store.upsert_telemetry(VAELTelemetry(hub_id="hub", device_id="V1", ts=t0, battery_pct=80))
+    before, seq, events = store.status["V1"], store.seq, store.counters.snapshot()["events_today"]
+
+    late = VAELTelemetry(hub_id="hub", device_id="V1", ts=t0 - timedelta(seconds=60), battery_pct=10)
+    dup = VAELTelemetry(hub_id="hub", device_id="V1", ts=t0, battery_pct=10)
+    assert store.upsert_telemetry(late) is None and store.upsert_telemetry(dup) is None
+    assert store.status["V1"] is before and store.seq == seq
+    assert store.counters.snapshot()["events_today"] == events
+    assert [x["battery_pct"] for x in store.get_device_tail("V1", 10)] == [80]
+
+    # it still proves the device is alive
+    store.mark_stale_devices(stale_after_s=0)
+    assert not store.status["V1"].connected and store.status["V1"].issues
+    store.upsert_telemetry(late)
+    assert store.status["V1"].connected and store.status["V1"].issues == []
+    assert store.status["V1"].battery_pct == 80
+
+
+def test_concurrent_ingest_keeps_devices_consistent():
+    import sys
+    import threading
+    from datetime import datetime, timedelta, timezone
+
+    from app.models import SNUUTelemetry, VAELTelemetry
+    from app.store import HubStore
+    from app.timeutil import ts_epoch
+
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # the writers can drift far apart; a wide window keeps drops to the duplicates
+    store = HubStore(hub_id="hub", max_samples=1000, reorder_window_s=3600.0)
+    devices = {f"V{i}": VAELTelemetry for i in range(3)} | {f"S{i}": SNUUTelemetry for i in range(3)}
+    n = 300
+    accepted = {d: 0 for d in devices}
+    counts_lock = threading.Lock()
+    published: list = []
+    done = threading.Event()
+
+    def writer(device_id: str, offset: int) -> None:
+        cls = devices[device_id]
+        for i in range(n):
+            # two writers per device: interleaved timestamps plus some exact duplicates
+            k = 2 * i + offset if i % 10 else 2 * i
+            extra = {"fsr": [float(k % 7)] * 6} if cls is SNUUTelemetry else {}
+            evt = cls(hub_id="hub", device_id=device_id, ts=t0 + timedelta(milliseconds=10 * k),
+                      battery_pct=k % 100, **extra)
+            if store.upsert_telemetry(evt) is not None:
+                with counts_lock:
+                    accepted[device_id] += 1
+
+    def reader() -> None:
+        while not done.is_set():
+            for s in store.status.values():
+                published.append((s, s.model_dump()))
+            store.find_devices(connected=True)
+
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        threads = [threading.Thread(target=writer, args=(d, o)) for d in devices for o in (0, 1)]
+        r = threading.Thread(target=reader)
+        r.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        done.set()
+        r.join()
+    finally:
+        sys.setswitchinterval(old)
+
+    status = store.status
+    assert sorted(status) == sorted(devices)
+    assert store.index.select(connected=True) == sorted(devices)
+    assert store.index.select(device_type="SNUU") == ["S0", "S1", "S2"]
+    assert store.counters.snapshot()["events_today"] == sum(accepted.values())
+    for device_id, s in status.items():
+        buffered = store.get_device_series(device_id)
+        ts = [x["ts"] for x in buffered]
+        assert len(buffered) == accepted[device_id] == 2 * n - n // 10      # only the duplicates went
+        assert ts == sorted(ts) and len(set(ts)) == len(ts)
+        assert ts_epoch(s.last_seen) == ts_epoch(ts[-1])
+        assert s.battery_pct in {x["battery_pct"] for x in buffered}
+        assert store.buffer_stats(device_id)["duplicates"] == n // 10
+
+    # every status handed out was replaced, never modified in place
+    assert published
+    for s, dumped in published:
+        assert s.model_dump() == dumped
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.middleware import TracingMiddleware
+from app.tracing import BUCKET_MS, RouteStats, RouteTracer, Trace
+
+
+@pytest.fixture
+def traced(tmp_path):
+    (tmp_path / "app.js").write_text("x" * 100)
+    api = FastAPI()
+
+    @api.get("/api/device/{device_id}")
+    def device(device_id: str):
+        return {"device_id": device_id}
+
+    @api.get("/api/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    @api.get("/api/stream")
+    def stream():
+        return StreamingResponse(iter(["data: 1\n\n", "data: 2\n\n"]), media_type="text/event-stream")
+
+    @api.websocket("/ws/echo")
+    async def echo(ws: WebSocket):
+        await ws.accept()
+        await ws.send_text(await ws.receive_text())
+        await ws.close()
+
+    api.mount("/static", StaticFiles(directory=tmp_path), name="static")
+    tracer = RouteTracer(sample_rate=1.0)
+    api.add_middleware(TracingMiddleware, tracer=tracer)
+    return TestClient(api, raise_server_exceptions=False), tracer
+
+
+def test_routes_are_keyed_on_templates(traced):
+    client, tracer = traced
+    for d in ("V1", "V2", "N1"):
+        assert client.get(f"/api/device/{d}").status_code == 200
+    client.get("/static/app.js")
+    client.get("/static/missing.js")
+    client.get("/nope")
+    assert client.get("/api/boom").status_code == 500
+
+    routes = tracer.stats()["routes"]
+    assert routes["GET /api/device/{device_id}"]["count"] == 3
+    assert routes["GET /static/*"]["count"] == 2
+    assert routes["GET <unmatched>"]["count"] == 1
+    assert routes["GET /api/boom"]["errors"] == 1
+    assert routes["GET /static/*"]["resp_bytes"] >= 100
+    # sampled: every request left a timeline
+    assert len(tracer.traces) == 7 and tracer.traces[0].events[-1][1] == "http.response.body"
+
+
+def test_streams_are_kept_apart_and_bytes_are_utf8(traced):
+    client, tracer = traced
+    assert client.get("/api/stream").text == "data: 1\n\ndata: 2\n\n"
+    with client.websocket_connect("/ws/echo") as ws:
+        ws.send_text("héllo ✓")
+        assert ws.receive_text() == "héllo ✓"
+    stats = tracer.stats()
+    assert stats["routes"] == {}
+    assert stats["streams"]["GET /api/stream"]["resp_bytes"] == 18
+    ws_stats = stats["streams"]["WS /ws/echo"]
+    assert ws_stats["req_bytes"] == ws_stats["resp_bytes"] == len("héllo ✓".encode("utf-8")) == 10
+    assert tracer.slowest() == []               # streams never count as slow requests
+
+
+def trace(ms: float, route: str = "GET /x") -> Trace:
+    return Trace(route=route, method="GET", path="/x", status=200, started_at=0.0,
+                 total_ms=ms, app_ms=ms, send_ms=0.0, req_bytes=0, resp_bytes=0)
+
+
+def test_histogram_percentiles():
+    st = RouteStats()
+    for ms in [0.1] * 50 + [3.0] * 45 + [100.0] * 4 + [50_000.0]:
+        st.add(ms, 200, 0, 0)
+    assert st.percentile(0.50) == 0.25
+    assert st.percentile(0.95) == 4.0          # bucket upper bound
+    assert st.percentile(0.99) == 128.0
+    assert st.percentile(1.0) == 50_000.0      # overflow bucket reports the max
+    d = st.as_dict()
+    assert d["histogram"] == {"<=0.25": 50, "<=4": 45, "<=128": 4, f">{BUCKET_MS[-1]:g}": 1}
+    assert RouteStats().percentile(0.5) is None
+
+
+def test_slowest_window_rotation(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(tracing.time, "monotonic", lambda: clock[0])
+    tracer = RouteTracer(slowest=2, window_s=60)
+    for ms in (5, 50, 20, 1):
+        tracer.record(trace(ms))
+    assert [t["total_ms"] for t in tracer.slowest()] == [50, 20]
+
+    clock[0] += 61                      # new window: previous one still reported
+    tracer.record(trace(7))
+    assert [t["total_ms"] for t in tracer.slowest()] == [50, 20]
+    clock[0] += 61                      # ... until it is two windows old
+    tracer.record(trace(3))
+    assert [t["total_ms"] for t in tracer.slowest()] == [7, 3]
+
+    clock[0] += 50                      # reset late in a window starts a fresh one
+    tracer.reset()
+    assert tracer.slowest() == [] and tracer.stats()["routes"] == {}
+    clock[0] += 20                      # the old window would have ended here
+    tracer.record(trace(9))
+    clock[0] += 50                      # 70 s after reset: first rotation
+    tracer.record(trace(2))
+    clock[0] += 60                      # second rotation drops the 9
+    tracer.record(trace(4))
+    assert [t["total_ms"] for t in tracer.slowest()] == [4, 2]
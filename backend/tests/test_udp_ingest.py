@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+
+import pytest
+
+from app import udp_ingest
+from app.udp_ingest import DatagramError, UdpIngestServer, decode_datagram, encode_datagram, encode_records
+
+FULL = {
+    "ts": 1767225600.25,
+    "battery_pct": 80.5,
+    "rssi_dbm": -61,
+    "imu": {"ax": 0.1, "ay": -0.2, "az": 1.0, "gx": 0.0, "gy": 0.5, "gz": -0.5},
+    "mic": {"rms": 0.25, "peak": 0.75, "zcr": 0.125},
+    "fsr": [1.0, 2.0, 3.0, 4.0],
+    "fall_event": True,
+    "fall_confidence": 0.5,
+}
+
+
+def test_round_trip_all_fields():
+    data = encode_datagram("NOOH", "NOOH-1", 41, [FULL, {"ts": 1767225601.0}])
+    device_id, seq0, samples, flags = decode_datagram(data, "", "hub")
+    assert (device_id, seq0, len(samples)) == ("NOOH-1", 41, 2)
+    x = samples[0]
+    assert x["ts"].timestamp() == FULL["ts"]
+    assert x["device_type"] == "NOOH" and x["hub_id"] == "hub"
+    assert x["rssi_dbm"] == -61 and x["fsr"] == FULL["fsr"] and x["fall_event"] is True
+    assert x["imu"] == pytest.approx(FULL["imu"])
+    assert x["mic"] == pytest.approx(FULL["mic"])
+    assert set(samples[1]) == {"hub_id", "device_id", "device_type", "ts"}
+
+
+def test_token_tag_checked():
+    data = encode_datagram("VAEL", "V1", 0, [FULL], token="secret")
+    assert decode_datagram(data, "secret", "h")[0] == "V1"
+    with pytest.raises(PermissionError):
+        decode_datagram(data, "other", "h")
+    with pytest.raises(PermissionError):
+        decode_datagram(data[:-1] + bytes([data[-1] ^ 1]), "secret", "h")
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda d: d[:5],                    # short header
+    lambda d: b"XX" + d[2:],            # bad magic
+    lambda d: d[:-3],                   # truncated record
+    lambda d: d + b"\0",                # trailing bytes
+    lambda d: d[:3] + b"\x09" + d[4:],  # unknown device type
+])
+def test_malformed(mutate):
+    with pytest.raises(DatagramError):
+        decode_datagram(mutate(encode_datagram("VAEL", "V1", 0, [FULL])), "", "h")
+
+
+@pytest.mark.parametrize("ts", [float("nan"), float("inf"), 1e20, -1e20])
+def test_unrepresentable_timestamp(ts):
+    with pytest.raises(DatagramError):
+        decode_datagram(encode_datagram("VAEL", "V1", 0, [{"ts": ts}]), "", "h")
+
+
+def test_oversized_records():
+    # the fsr count is one byte, so longer lists can't be encoded...
+    with pytest.raises(struct.error):
+        encode_records([{"ts": 0.0, "fsr": [0.0] * 256}])
+    # ...and a count claiming more data than the datagram holds is rejected
+    data = bytearray(encode_datagram("SNUU", "S1", 0, [{"ts": 0.0, "fsr": [1.0]}]))
+    data[data.index(b"\x01\x00\x00\x80?")] = 200
+    with pytest.raises(DatagramError):
+        decode_datagram(bytes(data), "", "h")
+    # sample count larger than the records present
+    data = bytearray(encode_datagram("VAEL", "V1", 0, [{"ts": 0.0}]))
+    struct.pack_into("<H", data, 6, 5)
+    with pytest.raises(DatagramError):
+        decode_datagram(bytes(data), "", "h")
+
+
+def test_worker_survives_bad_input(monkeypatch):
+    from app import pipeline
+
+    applied = []
+
+    async def accept(evt, nbytes=0, **kw):
+        if evt.device_id == "boom":
+            raise RuntimeError("pipeline failure")
+        applied.append((evt.device_id, evt.seq))
+        return "accepted"
+
+    monkeypatch.setattr(pipeline, "accept_telemetry", accept)
+    monkeypatch.setattr(udp_ingest.log, "exception", lambda *a, **k: None)
+
+    async def run():
+        server = UdpIngestServer()
+        server.queue = asyncio.Queue()
+        for d in (
+            b"junk",
+            encode_datagram("VAEL", "V1", 0, [{"ts": float("nan")}]),
+            encode_datagram("VAEL", "boom", 0, [{"ts": 1767225600.0}]),
+            encode_datagram("VAEL", "V1", 7, [{"ts": 1767225600.0}, {"ts": 1767225601.0}]),
+        ):
+            server.queue.put_nowait(d)
+        worker = asyncio.create_task(server._drain())
+        for _ in range(100):
+            if len(applied) == 2:
+                break
+            await asyncio.sleep(0.01)
+        worker.cancel()
+        return server
+
+    server = asyncio.run(run())
+    assert applied == [("V1", 7), ("V1", 8)]
+    assert server.bad_datagrams == 2
+    assert server.errors == 1
+
+
+def test_replayed_datagrams_are_not_taken_for_a_reboot(monkeypatch):
+    from app import pipeline
+    from app.ingest_guard import IngestGuard
+    from app.store import HubStore
+
+    guard = IngestGuard(window=8)
+    monkeypatch.setattr(pipeline, "ingest_guard", guard)
+    monkeypatch.setattr(pipeline, "store", HubStore(hub_id="hub", max_samples=100))
+    t0 = 1767225600.0
+
+    def dgram(seq0, ts0, n=1, flags=0):
+        return encode_datagram("VAEL", "V1", seq0, [{"ts": ts0 + i} for i in range(n)], token="k", flags=flags)
+
+    async def send(server, data):
+        device_id, seq0, samples, flags = decode_datagram(data, "k", "hub")
+        await server._apply(device_id, seq0, samples, len(data), pipeline.accept_telemetry, flags)
+
+    async def run():
+        server = UdpIngestServer()
+        captured = dgram(0, t0, n=4)
+        await send(server, captured)
+        await send(server, dgram(4, t0 + 4, n=20))
+        await send(server, captured)                    # far behind, old ts: a replay
+        assert guard.stats()["V1"]["replays"] == 4
+        await send(server, dgram(0, t0 + 100))          # rebooted, clock kept running
+        await send(server, dgram(30, t0 + 200))
+        await send(server, dgram(0, 5.0, flags=udp_ingest.F_SEQ_RESET))   # clock restarted too
+        await send(server, dgram(0, 3.0))               # same seq again: duplicate, not a reset
+        await send(server, dgram(1, 6.0))
+
+    asyncio.run(run())
+    c = guard.stats()["V1"]
+    assert c["accepted"] == 4 + 20 + 1 + 1 + 1 + 1
+    assert c["replays"] == 4 and c["duplicates"] == 1 and c["seq_resets"] == 2
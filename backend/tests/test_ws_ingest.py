@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app import pipeline
+from app.config import settings
+from app.ingest_guard import IngestGuard
+from app.routers import ws
+from app.store import HubStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(pipeline, "store", HubStore(hub_id="hub", max_samples=100))
+    monkeypatch.setattr(pipeline, "ingest_guard", IngestGuard(window=64))
+    monkeypatch.setattr(settings, "ingest_token", "")
+    monkeypatch.setattr(settings, "ws_ingest_ack_every", 1000)
+    monkeypatch.setattr(settings, "ws_ingest_ack_interval_s", 0.05)
+    app = FastAPI()
+    app.include_router(ws.router)
+    return TestClient(app)
+
+
+def sample(seq: int) -> dict:
+    return {"seq": seq, "ts": 1767225600 + seq / 50, "battery_pct": 80}
+
+
+def test_ack_is_sent_without_further_messages(client):
+    with client.websocket_connect("/ws/ingest/vael?device_id=V1") as conn:
+        conn.send_json(sample(0))
+        ack = conn.receive_json()   # no second message: the interval timer has to fire
+    assert ack["type"] == "ack"
+    assert ack["seq"] == 0 and ack["accepted"] == 1
+
+
+def test_ack_seq_is_contiguous(client):
+    with client.websocket_connect("/ws/ingest/vael?device_id=V1") as conn:
+        conn.send_json([sample(0), sample(1), sample(3), sample(4)])
+        assert conn.receive_json()["seq"] == 1      # 2 missing
+        conn.send_json(sample(2))
+        ack = conn.receive_json()
+    assert ack["seq"] == 4 and ack["rejected"] == []
+
+
+def test_rate_limited_seqs_are_reported(client, monkeypatch):
+    monkeypatch.setattr(pipeline, "ingest_guard", IngestGuard(window=64, rate_per_s=0.001, burst=2))
+    with client.websocket_connect("/ws/ingest/vael?device_id=V1") as conn:
+        conn.send_json([sample(i) for i in range(5)] + [{"seq": 5, "battery_pct": "x"}])
+        ack = conn.receive_json()
+    assert ack["seq"] == 1
+    assert ack["rejected"] == [2, 3, 4, 5]
+    assert ack["rate_limited"] == 3 and ack["invalid"] == 1
+
+
+def test_ack_state_resets_and_skips_unfilled_gaps():
+    acks = ws._AckState(window=4)
+    for seq in (10, 11, 13, 14, 15, 16):
+        acks.settled(seq)
+    assert acks.top == 11
+    acks.settled(17)                # 12 never came: give up on it
+    assert acks.top == 17 and not acks.held
+    acks.settled(0)                 # counter went back
+    assert acks.top == 0
+
+
+@pytest.mark.parametrize("hello", [{"token": "s3cret"}, {"token": "wrong"}, {"token": 123}, {"token": "s3crét"}, []])
+def test_token_from_the_first_message(client, monkeypatch, hello):
+    monkeypatch.setattr(settings, "ingest_token", "s3cret")
+    with client.websocket_connect("/ws/ingest/vael?device_id=V1") as c:
+        c.send_json(hello)
+        if hello == {"token": "s3cret"}:
+            c.send_json(sample(0))
+            assert c.receive_json()["type"] == "ack"
+        else:
+            with pytest.raises(WebSocketDisconnect) as e:
+                c.receive_json()
+            assert e.value.code == 4401